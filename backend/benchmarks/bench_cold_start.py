@@ -0,0 +1,104 @@
+"""
+Cold-start time of the API process: `import main` in fresh interpreters,
+the slowest imports (python -X importtime), and the startup warm-up.
+
+    cd backend
+    python -m benchmarks.bench_cold_start                    # 5 runs, budget COLD_START_BUDGET_MS
+    python -m benchmarks.bench_cold_start --runs 10 --budget-ms 600 --top 25
+
+Exits non-zero when the median import time is over budget or a module that
+must stay lazy (boto3, asyncpg) is imported by `import main`, so it can
+gate CI. The warm-up (utils/warmup.py) is timed separately: it runs during
+FastAPI startup, after the import, and is what the first request no
+longer pays for.
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+# Measured ~450ms on a 1-vCPU container, ~300ms of it FastAPI/pydantic itself
+COLD_START_BUDGET_MS = float(os.getenv("COLD_START_BUDGET_MS", "800"))
+# Deferred to first use (utils/bedrock_client.py, utils/pg.py); importing them eagerly is a regression
+LAZY_MODULES = ("boto3", "botocore.client", "asyncpg")
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import main
+import_ms = (time.perf_counter() - started) * 1000
+result = {"import_ms": import_ms, "eager": [m for m in %r if m in sys.modules]}
+if %r:
+    from utils.warmup import warm_up
+    started = time.perf_counter()
+    result["warmup_steps_ms"] = warm_up()
+    result["warmup_ms"] = (time.perf_counter() - started) * 1000
+print("COLD_START " + json.dumps(result))
+"""
+
+
+def _probe(warmup: bool, importtime=False):
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ["-X", "importtime"]
+    proc = subprocess.run(cmd + ["-c", _PROBE % (LAZY_MODULES, warmup)], capture_output=True, text=True)
+    line = next((l for l in proc.stdout.splitlines() if l.startswith("COLD_START ")), None)
+    if line is None:
+        raise RuntimeError(f"probe failed:\n{proc.stderr[-2000:]}")
+    return json.loads(line[len("COLD_START "):]), proc.stderr
+
+
+def slowest_imports(stderr: str, top: int) -> list:
+    """(module, cumulative ms) from -X importtime output, slowest first."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), round(int(cumulative_us) / 1000, 1)))
+    rows.sort(key=lambda row: -row[1])
+    return rows[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=COLD_START_BUDGET_MS, help="median `import main` budget")
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list")
+    parser.add_argument("--no-warmup", action="store_true", help="skip timing the startup warm-up")
+    args = parser.parse_args()
+
+    # first run only fills __pycache__; later runs match a deployed image
+    _probe(warmup=False)
+    runs = [_probe(warmup=not args.no_warmup)[0] for _ in range(args.runs)]
+    _, importtime = _probe(warmup=False, importtime=True)
+
+    import_ms = [run["import_ms"] for run in runs]
+    eager = sorted({module for run in runs for module in run["eager"]})
+    median = statistics.median(import_ms)
+    results = {
+        "runs": args.runs,
+        "import_ms": {
+            "median": round(median, 1),
+            "min": round(min(import_ms), 1),
+            "max": round(max(import_ms), 1),
+        },
+        "budget_ms": args.budget_ms,
+        "within_budget": median <= args.budget_ms and not eager,
+        "eager_lazy_modules": eager,
+        "slowest_imports": [{"module": m, "cumulative_ms": ms} for m, ms in slowest_imports(importtime, args.top)],
+    }
+    if not args.no_warmup:
+        results["warmup_ms"] = round(statistics.median(run["warmup_ms"] for run in runs), 1)
+        results["warmup_steps_ms"] = runs[-1]["warmup_steps_ms"]
+    print(json.dumps(results, indent=2))
+    if not results["within_budget"]:
+        reason = f"imports {eager} eagerly" if eager else f"median import {median:.0f}ms > {args.budget_ms:.0f}ms budget"
+        print(f"Cold start over budget: {reason}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
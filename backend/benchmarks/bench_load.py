@@ -0,0 +1,260 @@
+"""
+Throughput and p50/p95/p99 latency of the API under load, against a local
+Bedrock stand-in (benchmarks/fake_bedrock.py) so no AWS account is needed.
+
+    cd backend
+    python -m benchmarks.bench_load                                   # triage, pipeline, ask
+    python -m benchmarks.bench_load --scenario triage --requests 500 --concurrency 32 --latency-ms 600
+    python -m benchmarks.bench_load --throttle-rate 0.05 --out results.json
+    python -m benchmarks.bench_load --baseline baseline.json          # adds deltas vs an earlier run
+    python -m benchmarks.bench_load --scenario ingest --files 200     # needs DATABASE_URL
+
+Requests go through the FastAPI app in-process (httpx ASGI transport), so
+the numbers cover routing, agents, retrieval and the Bedrock executor but
+not the network. /ask searches an in-memory local index of --docs
+synthetic chunks. Agent, embedding and answer caches and the rule fast
+path are off unless exported otherwise, so every request reaches the fake
+Bedrock. Results are printed as JSON (and written to --out).
+"""
+import os
+
+# measure the uncached path; export any of these as true to benchmark warm paths
+for _flag in ("AGENT_CACHE_ENABLED", "AGENT_RULES_ENABLED", "EMBED_CACHE_ENABLED", "ANSWER_CACHE_ENABLED"):
+    os.environ.setdefault(_flag, "false")
+
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import platform
+import tempfile
+import httpx
+import numpy as np
+from benchmarks.fake_bedrock import FakeBedrockRuntime, install, fake_embedding
+
+SCENARIOS = ("triage", "pipeline", "ask", "ingest")
+DEFAULT_SCENARIOS = ("triage", "pipeline", "ask")
+
+SIGNALS = [
+    "bank server down", "card flagged as stolen", "gateway timeout", "none", "network error",
+    "3 declined attempts", "server error but merchant confirmed", "unusual amount",
+]
+STATUSES = ["PENDING", "FAILED", "SUCCEEDED"]
+
+
+# === Workloads ===
+def _transaction(i: int) -> dict:
+    rng = random.Random(i)
+    return {
+        "sender_id": f"user{i}",
+        "receiver_id": f"merchant{rng.randint(1, 50)}",
+        "amount": round(rng.uniform(5, 5000), 2),
+        "transaction_id": f"0x{rng.getrandbits(256):064x}",
+        "status": rng.choice(STATUSES),
+        "currency": "USD",
+        "metadata": {"error_detection_signal": rng.choice(SIGNALS)},
+    }
+
+
+def _question(i: int) -> str:
+    txn = _transaction(i)
+    return f"Why is transaction {txn['transaction_id'][:10]} for {txn['amount']} USD {txn['status'].lower()}?"
+
+
+def _document(i: int) -> str:
+    txn = _transaction(i)
+    return (
+        f"Incident {i}: transaction {txn['transaction_id']} from {txn['sender_id']} to {txn['receiver_id']} "
+        f"for {txn['amount']} USD is {txn['status']}. Signal: {txn['metadata']['error_detection_signal']}. "
+        "Operators retried through the failover gateway and reconciled with the bank ledger."
+    )
+
+
+def _requests_for(scenario: str, count: int) -> list:
+    if scenario == "triage":
+        return [("/run-triage", _transaction(i)) for i in range(count)]
+    if scenario == "pipeline":
+        return [("/run-pipeline", _transaction(i)) for i in range(count)]
+    return [("/ask", {"question": _question(i)}) for i in range(count)]
+
+
+def _use_local_index(docs: int):
+    """Points /ask at an in-memory local index of synthetic chunks embedded by the fake Titan."""
+    import utils.retrieval as retrieval
+    from utils.local_index import LocalVectorIndex
+
+    index = LocalVectorIndex(path=tempfile.mkdtemp())
+    rows = []
+    for i in range(docs):
+        content = _document(i)
+        rows.append((f"incidents/{i // 20}.log", i % 20, content, f"h{i}", fake_embedding(content)))
+    index.add(rows)
+    retrieval._retriever = retrieval.LocalIndexRetriever(index)
+
+
+# === Load Driver ===
+def _summary(latencies_ms, errors, duration) -> dict:
+    arr = np.asarray(latencies_ms) if latencies_ms else np.zeros(1)
+    return {
+        "requests": len(latencies_ms) + errors,
+        "ok": len(latencies_ms),
+        "errors": errors,
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(len(latencies_ms) / duration, 2) if duration > 0 else 0.0,
+        "mean_ms": round(float(arr.mean()), 2),
+        "p50_ms": round(float(np.percentile(arr, 50)), 2),
+        "p95_ms": round(float(np.percentile(arr, 95)), 2),
+        "p99_ms": round(float(np.percentile(arr, 99)), 2),
+        "max_ms": round(float(arr.max()), 2),
+    }
+
+
+async def drive(client, requests, concurrency, warmup=0) -> dict:
+    """
+    Sends `requests` [(path, json)] with at most `concurrency` in flight
+    (closed loop: each worker sends its next request when one returns).
+    The first `warmup` requests are sent one by one and not measured.
+    Non-2xx responses and exceptions count as errors, not latencies.
+    """
+    for path, body in requests[:warmup]:
+        await client.post(path, json=body)
+
+    queue = list(reversed(requests[warmup:]))
+    latencies, errors = [], 0
+
+    async def worker():
+        nonlocal errors
+        while queue:
+            path, body = queue.pop()
+            start = time.perf_counter()
+            try:
+                response = await client.post(path, json=body)
+                response.raise_for_status()
+                latencies.append((time.perf_counter() - start) * 1e3)
+            except Exception as e:
+                errors += 1
+                logging.debug(f"{path} failed: {e}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(min(concurrency, len(queue)), 1))))
+    return _summary(latencies, errors, time.perf_counter() - started)
+
+
+async def bench_api(scenarios, count, concurrency, docs, warmup) -> dict:
+    from main import app
+
+    if "ask" in scenarios:
+        _use_local_index(docs)
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for scenario in scenarios:
+            requests = _requests_for(scenario, count + warmup)
+            results[scenario] = {
+                "concurrency": concurrency,
+                **await drive(client, requests, concurrency, warmup=warmup),
+            }
+            logging.info(f"{scenario}: {results[scenario]}")
+    return results
+
+
+async def bench_ingest(files, concurrency) -> dict:
+    """embed_all_files over a temp dataset of synthetic incident logs; needs Postgres."""
+    from utils.db import embed_all_files
+    from utils.pg import close_pool
+
+    root = tempfile.mkdtemp()
+    for f in range(files):
+        with open(os.path.join(root, f"incidents_{f}.log"), "w", encoding="utf-8") as out:
+            out.write("\n".join(_document(f * 20 + i) for i in range(20)))
+    try:
+        stats = await embed_all_files(root=root, concurrency=concurrency)
+    finally:
+        await close_pool()
+    elapsed = stats.elapsed()
+    return {
+        "files": stats.read,
+        "chunks": stats.chunks,
+        "embedded": stats.embedded,
+        "written": stats.written,
+        "failed": stats.failed,
+        "duration_s": round(elapsed, 3),
+        "throughput_rows_s": round(stats.written / elapsed, 2) if elapsed > 0 else 0.0,
+    }
+
+
+# === Baseline Comparison ===
+def compare(results: dict, baseline: dict) -> dict:
+    """Relative change per scenario; positive throughput / negative latency deltas are improvements."""
+    deltas = {}
+    for scenario, current in results["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(scenario)
+        if not before:
+            continue
+        deltas[scenario] = {
+            key: round((current[key] - before[key]) / before[key], 4)
+            for key in ("throughput_rps", "throughput_rows_s", "p50_ms", "p95_ms", "p99_ms")
+            if before.get(key) and key in current
+        }
+    return deltas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="repeatable; default triage, pipeline, ask")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=5, help="unmeasured requests before each scenario")
+    parser.add_argument("--docs", type=int, default=2000, help="chunks in the local index /ask searches")
+    parser.add_argument("--files", type=int, default=100, help="files written for the ingest scenario")
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="fake Claude latency")
+    parser.add_argument("--jitter-ms", type=float, default=100.0)
+    parser.add_argument("--embed-latency-ms", type=float, default=None, help="fake Titan latency (default latency/4)")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction of Bedrock calls throttled")
+    parser.add_argument("--max-in-flight", type=int, default=None, help="throttle Bedrock calls beyond this concurrency")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="also write the JSON results here")
+    parser.add_argument("--baseline", help="earlier --out file to compare against")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    fake = install(FakeBedrockRuntime(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, throttle_rate=args.throttle_rate,
+        max_in_flight=args.max_in_flight, embed_latency_ms=args.embed_latency_ms, seed=args.seed,
+    ))
+    scenarios = args.scenario or list(DEFAULT_SCENARIOS)
+    api_scenarios = [s for s in scenarios if s != "ingest"]
+
+    async def _run():
+        results = {}
+        if api_scenarios:
+            results.update(await bench_api(api_scenarios, args.requests, args.concurrency, args.docs, args.warmup))
+        if "ingest" in scenarios:
+            results["ingest"] = await bench_ingest(args.files, args.concurrency)
+        return results
+
+    results = {
+        "config": {
+            key: getattr(args, key) for key in (
+                "requests", "concurrency", "docs", "files", "latency_ms", "jitter_ms",
+                "embed_latency_ms", "throttle_rate", "max_in_flight", "seed",
+            )
+        },
+        "env": {"python": platform.python_version(), "cpus": os.cpu_count()},
+        "scenarios": asyncio.run(_run()),
+        "bedrock": fake.get_stats(),
+    }
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            results["vs_baseline"] = compare(results, json.load(f))
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
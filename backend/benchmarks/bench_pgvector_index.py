@@ -0,0 +1,88 @@
+"""
+Recall@k vs latency of the GrabData vector index across probe settings.
+
+    cd backend
+    python -m benchmarks.bench_pgvector_index                      # sweep the current index
+    python -m benchmarks.bench_pgvector_index --rebuild hnsw       # rebuild first, then sweep
+
+Ground truth is the exact top-k from the same query with index scans
+disabled (SET LOCAL enable_indexscan = off). Queries are stored vectors
+plus a little noise. For ivfflat the sweep varies ivfflat.probes, for
+hnsw it varies hnsw.ef_search.
+"""
+import json
+import time
+import asyncio
+import argparse
+import numpy as np
+from utils.retrieval import SIMILARITY_SQL
+from benchmarks.bench_retrievers import _percentiles
+
+IVFFLAT_PROBES = [1, 5, 10, 20, 40, 80]
+HNSW_EF_SEARCH = [20, 40, 80, 160, 320]
+
+
+async def _sample_queries(conn, count, seed=0) -> list:
+    rows = await conn.fetch(
+        "SELECT embedding FROM GrabData WHERE embedding IS NOT NULL ORDER BY random() LIMIT $1", count
+    )
+    rng = np.random.default_rng(seed)
+    return [
+        np.asarray(r["embedding"], dtype=np.float32) + rng.normal(scale=0.02, size=len(r["embedding"])).astype(np.float32)
+        for r in rows
+    ]
+
+
+async def _exact_ids(conn, query, k) -> set:
+    async with conn.transaction():
+        await conn.execute("SET LOCAL enable_indexscan = off")
+        rows = await conn.fetch(SIMILARITY_SQL, query, k)
+    return {r["id"] for r in rows}
+
+
+async def _sweep(conn, setting, values, queries, truths, k) -> list:
+    results = []
+    for value in values:
+        latencies, recalls = [], []
+        for query, truth in zip(queries, truths):
+            start = time.perf_counter()
+            async with conn.transaction():
+                await conn.execute(f"SET LOCAL {setting} = {int(value)}")
+                rows = await conn.fetch(SIMILARITY_SQL, query, k)
+            latencies.append((time.perf_counter() - start) * 1e3)
+            recalls.append(len({r["id"] for r in rows} & truth) / k)
+        results.append({setting: value, **_percentiles(latencies), f"recall@{k}": round(float(np.mean(recalls)), 4)})
+    return results
+
+
+async def bench(queries_count, k, rebuild) -> dict:
+    from utils.pg import get_pool, close_pool
+    from utils.pg_index import ensure_vector_index, _current_index
+
+    try:
+        pool = await get_pool()
+        index = await ensure_vector_index(pool, kind=rebuild, force=True) if rebuild else None
+        async with pool.acquire() as conn:
+            indexdef = await _current_index(conn) or ""
+            queries = await _sample_queries(conn, queries_count)
+            truths = [await _exact_ids(conn, q, k) for q in queries]
+            if "USING hnsw" in indexdef:
+                sweep = await _sweep(conn, "hnsw.ef_search", HNSW_EF_SEARCH, queries, truths, k)
+            else:
+                sweep = await _sweep(conn, "ivfflat.probes", IVFFLAT_PROBES, queries, truths, k)
+        return {"index": indexdef or "none (exact scan)", "build": index, "sweep": sweep}
+    finally:
+        await close_pool()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("-k", type=int, default=15)
+    parser.add_argument("--rebuild", choices=["ivfflat", "hnsw"], default=None, help="rebuild the index before sweeping")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(bench(args.queries, args.k, args.rebuild)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
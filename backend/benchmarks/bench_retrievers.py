@@ -0,0 +1,117 @@
+"""
+Latency and recall@k of the retriever backends.
+
+    cd backend
+    python -m benchmarks.bench_retrievers --synthetic 20000    # local index only, random vectors
+    python -m benchmarks.bench_retrievers --db                 # pgvector vs local, built from GrabData
+
+Ground truth is exact cosine top-k over the same vectors (NumPy brute
+force). Queries are stored vectors plus a little noise, so each has a
+meaningful neighbourhood.
+"""
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import numpy as np
+from utils.local_index import LocalVectorIndex, build_from_db, _normalize
+
+
+def _percentiles(samples_ms) -> dict:
+    arr = np.asarray(samples_ms)
+    return {
+        "p50_ms": round(float(np.percentile(arr, 50)), 3),
+        "p95_ms": round(float(np.percentile(arr, 95)), 3),
+        "p99_ms": round(float(np.percentile(arr, 99)), 3),
+    }
+
+
+def _exact_topk(matrix, keys, query, k):
+    scores = matrix @ _normalize(query)
+    top = np.argsort(-scores)[:k]
+    return {keys[i] for i in top}
+
+
+def _queries(matrix, count, seed=0):
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(matrix), size=count)
+    return matrix[picks] + rng.normal(scale=0.02, size=(count, matrix.shape[1])).astype(np.float32)
+
+
+async def _measure(search, queries, truths, k, key_fn) -> dict:
+    latencies, recalls = [], []
+    for query, truth in zip(queries, truths):
+        start = time.perf_counter()
+        rows = await search(query, k)
+        latencies.append((time.perf_counter() - start) * 1e3)
+        recalls.append(len({key_fn(r) for r in rows} & truth) / k)
+    return {**_percentiles(latencies), f"recall@{k}": round(float(np.mean(recalls)), 4)}
+
+
+async def bench_synthetic(n, queries_count, k, engine) -> dict:
+    rng = np.random.default_rng(42)
+    matrix = _normalize(rng.normal(size=(n, 1024)).astype(np.float32))
+    index = LocalVectorIndex(path=tempfile.mkdtemp(), engine=engine)
+    index.add([(f"f{i}", 0, "", str(i), matrix[i]) for i in range(n)])
+    keys = [(f"f{i}", str(i)) for i in range(n)]
+    queries = _queries(matrix, queries_count)
+    truths = [_exact_topk(matrix, keys, q, k) for q in queries]
+
+    async def local_search(q, limit):
+        return index.search(q, limit)
+
+    return {
+        "rows": n,
+        f"local_{'faiss' if index.use_faiss else 'numpy'}": await _measure(
+            local_search, queries, truths, k, lambda r: (r["filepath"], r["content_hash"])
+        ),
+    }
+
+
+async def bench_db(queries_count, k, engine) -> dict:
+    from utils.pg import get_pool, close_pool
+    from utils.retrieval import PgVectorRetriever
+
+    try:
+        pool = await get_pool()
+        index = await build_from_db(pool, LocalVectorIndex(path=tempfile.mkdtemp(), engine=engine))
+        index._consolidate()
+        alive = index._alive
+        matrix = np.asarray(index._vectors)[alive]
+        keys = [(index._meta[i]["filepath"], index._meta[i]["content_hash"]) for i in index._ids[alive].tolist()]
+        queries = _queries(matrix, queries_count)
+        truths = [_exact_topk(matrix, keys, q, k) for q in queries]
+        key_fn = lambda r: (r["filepath"], r["content_hash"])
+
+        async def local_search(q, limit):
+            return index.search(q, limit)
+
+        pg = PgVectorRetriever()
+        return {
+            "rows": len(keys),
+            "pgvector": await _measure(pg.search, queries, truths, k, key_fn),
+            f"local_{'faiss' if index.use_faiss else 'numpy'}": await _measure(local_search, queries, truths, k, key_fn),
+        }
+    finally:
+        await close_pool()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--synthetic", type=int, default=0, help="rows of random vectors for an offline run")
+    parser.add_argument("--db", action="store_true", help="compare pgvector and local on GrabData")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=15)
+    parser.add_argument("--engine", default="auto", choices=["auto", "faiss", "numpy"])
+    args = parser.parse_args()
+
+    if args.db:
+        results = asyncio.run(bench_db(args.queries, args.k, args.engine))
+    else:
+        results = asyncio.run(bench_synthetic(args.synthetic or 10000, args.queries, args.k, args.engine))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
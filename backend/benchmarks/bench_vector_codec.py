@@ -0,0 +1,89 @@
+"""
+Micro-benchmark: pgvector text literal vs binary codec.
+
+    cd backend
+    python -m benchmarks.bench_vector_codec            # client-side encode/decode only
+    python -m benchmarks.bench_vector_codec --db       # plus round trips against DATABASE_URL
+
+The text path is what the code did before: "[" + ",".join(str(x)) + "]" on
+the way in and parsing "[...]" on the way out. The binary path is
+utils.pg.encode_vector / decode_vector, registered as the asyncpg codec.
+"""
+import json
+import time
+import random
+import asyncio
+import argparse
+from utils.pg import encode_vector, decode_vector
+
+DIM = 1024
+
+
+def _text_encode(vector) -> str:
+    return "[" + ",".join(str(x) for x in vector) + "]"
+
+
+def _text_decode(value: str) -> list:
+    return json.loads(value)
+
+
+def _time_per_call(fn, arg, iterations) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(arg)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def bench_client(iterations: int) -> dict:
+    vector = [random.uniform(-1, 1) for _ in range(DIM)]
+    text = _text_encode(vector)
+    binary = encode_vector(vector)
+    return {
+        "text_encode_us": _time_per_call(_text_encode, vector, iterations),
+        "binary_encode_us": _time_per_call(encode_vector, vector, iterations),
+        "text_decode_us": _time_per_call(_text_decode, text, iterations),
+        "binary_decode_us": _time_per_call(decode_vector, binary, iterations),
+        "text_bytes": len(text.encode()),
+        "binary_bytes": len(binary),
+    }
+
+
+async def bench_db(iterations: int) -> dict:
+    import asyncpg
+    from utils.pg import DB_URL, _init_connection
+
+    vector = [random.uniform(-1, 1) for _ in range(DIM)]
+    plain = await asyncpg.connect(DB_URL)
+    coded = await asyncpg.connect(DB_URL)
+    await _init_connection(coded)
+    results = {}
+    try:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            await plain.fetchval("SELECT $1::vector::text", _text_encode(vector))
+        results["text_roundtrip_ms"] = (time.perf_counter() - start) / iterations * 1e3
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            await coded.fetchval("SELECT $1::vector", vector)
+        results["binary_roundtrip_ms"] = (time.perf_counter() - start) / iterations * 1e3
+    finally:
+        await plain.close()
+        await coded.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--db", action="store_true", help="also time round trips against DATABASE_URL")
+    args = parser.parse_args()
+
+    results = bench_client(args.iterations)
+    if args.db:
+        results.update(asyncio.run(bench_db(max(args.iterations // 10, 10))))
+    print(json.dumps({k: round(v, 2) for k, v in results.items()}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+Local stand-in for the bedrock-runtime client, for offline benchmarks.
+
+    from benchmarks.fake_bedrock import FakeBedrockRuntime, install
+    fake = install(FakeBedrockRuntime(latency_ms=400, jitter_ms=150, throttle_rate=0.02))
+
+install() swaps the shared client in utils/bedrock_client.py, so every
+agent, embedding and /ask call goes through the fake. Calls block their
+thread for the simulated latency like a real HTTP call, return the Claude
+Messages / Titan embedding response shapes (token counts in the response
+headers and stream metrics included) and raise ThrottlingException on
+demand. Responses are deterministic per request body.
+"""
+import io
+import json
+import time
+import random
+import hashlib
+import threading
+import numpy as np
+from botocore.exceptions import ClientError
+
+EMBED_DIM = 1024
+
+TRIAGE_DECISIONS = ["fraud", "healing", "healing_and_fraud", "approved", "failed"]
+FRAUD_RESULTS = ["fraud", "not_fraud", "uncertain"]
+
+
+def _digest(text: str) -> int:
+    return int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+
+
+def _approx_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def fake_embedding(text: str, dim=EMBED_DIM) -> list:
+    """Unit vector seeded by the text, so equal texts embed equally."""
+    vector = np.random.default_rng(_digest(text)).normal(size=dim)
+    return (vector / np.linalg.norm(vector)).astype(np.float32).tolist()
+
+
+def _claude_text(prompt: str) -> str:
+    pick = _digest(prompt)
+    if "payments triage" in prompt:
+        decision = TRIAGE_DECISIONS[pick % len(TRIAGE_DECISIONS)]
+        return json.dumps({
+            "triage_decision": decision,
+            "reason": f"Simulated triage: {decision}",
+            "suggested_resolution": "Simulated next step",
+        })
+    if "fraud_result" in prompt:
+        return json.dumps({"fraud_result": FRAUD_RESULTS[pick % len(FRAUD_RESULTS)], "reason": "Simulated fraud check"})
+    if "healing_needed" in prompt:
+        return json.dumps({"healing_needed": bool(pick % 2), "recommended_action": "Retry via failover gateway"})
+    words = ["The", "transaction", "was", "retried", "after", "the", "gateway", "timeout", "and", "settled."]
+    return " ".join(words[i % len(words)] for i in range(40 + pick % 80))
+
+
+class FakeBedrockRuntime:
+    """
+    latency_ms/jitter_ms: per-call delay, uniform in latency ± jitter.
+    throttle_rate: fraction of calls rejected with ThrottlingException.
+    max_in_flight: calls beyond this many concurrent ones are throttled too,
+    like a per-account concurrency quota. embed_latency_ms defaults to a
+    quarter of latency_ms; stream_chunk_ms spaces streamed text deltas.
+    """
+
+    def __init__(self, latency_ms=300.0, jitter_ms=100.0, throttle_rate=0.0, max_in_flight=None,
+                 embed_latency_ms=None, stream_chunk_ms=15.0, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.throttle_rate = throttle_rate
+        self.max_in_flight = max_in_flight
+        self.embed_latency_ms = latency_ms / 4 if embed_latency_ms is None else embed_latency_ms
+        self.stream_chunk_ms = stream_chunk_ms
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.stats = {"calls": 0, "throttled": 0, "peak_in_flight": 0, "input_tokens": 0, "output_tokens": 0}
+
+    # === Simulation ===
+    def _admit(self, operation):
+        with self._lock:
+            self.stats["calls"] += 1
+            throttled = self._random.random() < self.throttle_rate or (
+                self.max_in_flight is not None and self._in_flight >= self.max_in_flight
+            )
+            if throttled:
+                self.stats["throttled"] += 1
+            else:
+                self._in_flight += 1
+                self.stats["peak_in_flight"] = max(self.stats["peak_in_flight"], self._in_flight)
+        if throttled:
+            raise ClientError(
+                {"Error": {"Code": "ThrottlingException", "Message": "Too many requests, please wait before trying again."},
+                 "ResponseMetadata": {"HTTPStatusCode": 429}},
+                operation,
+            )
+
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def _sleep(self, base_ms):
+        with self._lock:
+            jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms)
+        time.sleep(max(base_ms + jitter, 0.0) / 1000)
+
+    def _count(self, input_tokens, output_tokens):
+        with self._lock:
+            self.stats["input_tokens"] += input_tokens
+            self.stats["output_tokens"] += output_tokens
+
+    @staticmethod
+    def _response(payload: dict, input_tokens: int, output_tokens: int) -> dict:
+        return {
+            "body": io.BytesIO(json.dumps(payload).encode("utf-8")),
+            "contentType": "application/json",
+            "ResponseMetadata": {"HTTPStatusCode": 200, "HTTPHeaders": {
+                "x-amzn-bedrock-input-token-count": str(input_tokens),
+                "x-amzn-bedrock-output-token-count": str(output_tokens),
+            }},
+        }
+
+    @staticmethod
+    def _prompt(request: dict) -> str:
+        messages = request.get("messages") or [{"content": request.get("prompt", "")}]
+        content = messages[-1]["content"]
+        if isinstance(content, list):
+            content = " ".join(part.get("text", "") for part in content)
+        return content
+
+    # === bedrock-runtime API ===
+    def invoke_model(self, modelId, body, **kwargs) -> dict:
+        self._admit("InvokeModel")
+        try:
+            request = json.loads(body)
+            if "inputText" in request:
+                self._sleep(self.embed_latency_ms)
+                tokens = _approx_tokens(request["inputText"])
+                self._count(tokens, 0)
+                return self._response(
+                    {"embedding": fake_embedding(request["inputText"]), "inputTextTokenCount": tokens}, tokens, 0
+                )
+            self._sleep(self.latency_ms)
+            prompt = self._prompt(request)
+            text = _claude_text(prompt)
+            input_tokens, output_tokens = _approx_tokens(prompt), _approx_tokens(text)
+            self._count(input_tokens, output_tokens)
+            return self._response({
+                "id": f"msg_{_digest(prompt):016x}",
+                "type": "message",
+                "role": "assistant",
+                "model": modelId,
+                "content": [{"type": "text", "text": text}],
+                "stop_reason": "end_turn",
+                "usage": {"input_tokens": input_tokens, "output_tokens": output_tokens},
+            }, input_tokens, output_tokens)
+        finally:
+            self._release()
+
+    def invoke_model_with_response_stream(self, modelId, body, **kwargs) -> dict:
+        self._admit("InvokeModelWithResponseStream")
+        prompt = self._prompt(json.loads(body))
+        text = _claude_text(prompt)
+        input_tokens, output_tokens = _approx_tokens(prompt), _approx_tokens(text)
+
+        def events():
+            # time to first token is most of the latency; the rest is spread over the deltas
+            self._sleep(self.latency_ms)
+            yield {"type": "message_start", "message": {"model": modelId, "usage": {"input_tokens": input_tokens}}}
+            yield {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}}
+            words = text.split(" ")
+            for i in range(0, len(words), 4):
+                time.sleep(self.stream_chunk_ms / 1000)
+                delta = " ".join(words[i:i + 4]) + (" " if i + 4 < len(words) else "")
+                yield {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": delta}}
+            yield {"type": "content_block_stop", "index": 0}
+            yield {"type": "message_delta", "delta": {"stop_reason": "end_turn"}, "usage": {"output_tokens": output_tokens}}
+            self._count(input_tokens, output_tokens)
+            yield {"type": "message_stop", "amazon-bedrock-invocationMetrics": {
+                "inputTokenCount": input_tokens, "outputTokenCount": output_tokens,
+            }}
+
+        return {"body": _EventStream(events(), on_close=self._release)}
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return dict(self.stats)
+
+
+class _EventStream:
+    """Iterable of {"chunk": {"bytes": ...}} events with close(), like botocore's EventStream."""
+
+    def __init__(self, events, on_close):
+        self._events = events
+        self._on_close = on_close
+        self._closed = False
+
+    def __iter__(self):
+        try:
+            for event in self._events:
+                yield {"chunk": {"bytes": json.dumps(event).encode("utf-8")}}
+        finally:
+            self.close()
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._events.close()
+            self._on_close()
+
+
+def install(fake: FakeBedrockRuntime = None) -> FakeBedrockRuntime:
+    """Routes utils/bedrock_client.py through `fake` (a default one if omitted)."""
+    import utils.bedrock_client as bedrock_client
+
+    fake = fake or FakeBedrockRuntime()
+    bedrock_client._client = fake
+    return fake
@@ -1,16 +1,34 @@
+import time
+import asyncio
+import logging
 from fastapi import FastAPI, Request, Body
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse
+from pydantic import BaseModel, field_validator
 from typing import Optional
 from fastapi.middleware.cors import CORSMiddleware
-from utils.query import ask_question_from_db
+from utils.query import ask_question_from_db, stream_question_from_db
+from utils.lexical import normalize_filters
+from utils.bedrock_client import get_pool_stats, run_blocking, close_replay_log
+from utils.pg import init_pool, close_pool, get_pool_stats as get_pg_pool_stats
+from utils.embeddings import get_cache_stats as get_embedding_cache_stats
+from utils.answer_cache import get_cache_stats as get_answer_cache_stats
+from utils.result_cache import get_cache_stats as get_agent_cache_stats
+from utils.rules import get_rule_stats
+from utils.context_packer import get_packer_stats
+from utils.batch import run_bounded, clamp_concurrency, ndjson_line, sse_event
+from utils.pipeline import Stage, run_dag
+from utils.dispatch import transaction_summary, triage_and_dispatch
+from utils.incident_queue import QueueFull, existing_incident_queue, get_incident_queue
+from utils.incident_worker import INCIDENT_WORKER_ENABLED, IncidentWorker, queue_metrics
+from utils.rate_governor import governor_metrics
+from utils import metrics
 
-from src.TriageAgent import TriageAgent
-from src.FraudAgent import FraudAgent
-from src.HealingAgent import HealingAgent
+from utils.warmup import WARMUP_ON_STARTUP, warm_up, get_startup_stats
 
-fraud_detector = FraudAgent()
-healing_agent = HealingAgent()
-triage_agent = TriageAgent()
+# Agents share the process-wide Bedrock client; each is built once, on first use
+from src.TriageAgent import get_triage_agent
+from src.FraudAgent import get_fraud_detector
+from src.HealingAgent import get_healing_agent
 
 
 
@@ -25,6 +43,109 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route latency, in-flight requests and an X-Trace-Id on every response (see utils/metrics.py)
+@app.middleware("http")
+async def observe_requests(request: Request, call_next):
+    if metrics.TRACE_IDS_ENABLED:
+        trace_id = metrics.new_trace_id(request.headers.get(metrics.TRACE_HEADER))
+    start = time.perf_counter()
+    metrics.http_in_flight.inc()
+
+    def finish(status):
+        metrics.http_in_flight.dec()
+        # templated path (/run-agent/{agent_name}) keeps label cardinality bounded;
+        # unmatched paths (404 scans) share one label instead of one each
+        matched = request.scope.get("route")
+        route = getattr(matched, "path", "unmatched")
+        metrics.http_request_seconds.observe(
+            time.perf_counter() - start, route=route, method=request.method, status=status
+        )
+
+    try:
+        response = await call_next(request)
+    except Exception:
+        finish(500)
+        raise
+    # call_next returns once headers are ready; streamed bodies (/ask-stream,
+    # /run-triage-batch) are still being produced, so finish when the body ends
+    body = response.body_iterator
+
+    async def observed_body():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            finish(response.status_code)
+
+    response.body_iterator = observed_body()
+    if metrics.TRACE_IDS_ENABLED:
+        response.headers[metrics.TRACE_HEADER] = trace_id
+    return response
+
+def _stats_metrics():
+    """Exposes the /stats counters of the caches, rules and packer at /metrics."""
+    samples = {}
+
+    def add(name, kind, help_text, value, **labels):
+        key = (name, kind, help_text)
+        samples.setdefault(key, {})[tuple(sorted((k, str(v)) for k, v in labels.items()))] = value
+
+    embedding = get_embedding_cache_stats()
+    caches = {
+        "embedding": (embedding["memory_hits"] + embedding["disk_hits"], embedding["misses"]),
+        "answer": get_answer_cache_stats(),
+        "agent": get_agent_cache_stats(),
+    }
+    for cache, stats in caches.items():
+        if isinstance(stats, dict):
+            if stats.get("enabled") is False:
+                continue
+            stats = (stats["hits"], stats["misses"])
+        add("cache_hits_total", "counter", "Cache hits by cache", stats[0], cache=cache)
+        add("cache_misses_total", "counter", "Cache misses by cache", stats[1], cache=cache)
+
+    rules = get_rule_stats()
+    if rules.get("enabled") is not False:
+        add("rule_evaluations_total", "counter", "Payloads checked by the rule engine", rules["evaluated"])
+        add("rule_fallthrough_total", "counter", "Payloads the rules left to the LLM", rules["fallthrough"])
+        for rule, hits in rules["rules"].items():
+            add("rule_hits_total", "counter", "Payloads answered by each rule", hits, rule=rule)
+
+    packer = get_packer_stats()
+    if packer.get("enabled") is not False:
+        add("context_tokens_packed_total", "counter", "Context tokens sent to Claude", packer["tokens_packed"])
+        add("context_tokens_saved_total", "counter", "Context tokens saved by packing", packer["tokens_saved"])
+
+    pool = get_pool_stats()
+    add("bedrock_pool_peak_in_flight", "gauge", "Peak concurrent Bedrock calls", pool["peak_in_flight"])
+    return samples
+
+metrics.register_collector(_stats_metrics)
+metrics.register_collector(queue_metrics)
+metrics.register_collector(governor_metrics)
+
+# One asyncpg pool for the app lifetime, shared by /ask and ingestion helpers
+@app.on_event("startup")
+async def startup():
+    if WARMUP_ON_STARTUP:
+        await run_blocking(warm_up)
+    try:
+        await init_pool()
+    except Exception as e:
+        # Triage routes and the local retriever do not need Postgres; /ask retries the pool lazily
+        logging.error(f"PG pool init failed: {e}")
+    if INCIDENT_WORKER_ENABLED:
+        app.state.incident_worker = IncidentWorker()
+        app.state.incident_worker_task = asyncio.create_task(app.state.incident_worker.run())
+
+@app.on_event("shutdown")
+async def shutdown():
+    if INCIDENT_WORKER_ENABLED:
+        app.state.incident_worker.stop()
+        await app.state.incident_worker_task
+    await close_pool()
+    close_replay_log()
+
 class PaymentRequest(BaseModel):
     sender_id: str
     receiver_id: str
@@ -69,6 +190,26 @@ def run_consistency_reviewer(data: PaymentRequest, agent_outputs: dict):
 def root():
     return {"message": "Grab Agent App is running"}
 
+@app.get("/stats")
+def stats():
+    # reading the stats must not create the queue file when nothing uses the queue
+    queue = existing_incident_queue()
+    return {
+        "bedrock_pool": get_pool_stats(),
+        "pg_pool": get_pg_pool_stats(),
+        "embedding_cache": get_embedding_cache_stats(),
+        "answer_cache": get_answer_cache_stats(),
+        "agent_cache": get_agent_cache_stats(),
+        "rules": get_rule_stats(),
+        "context_packer": get_packer_stats(),
+        "startup": get_startup_stats(),
+        "incident_queue": queue.stats() if queue is not None else {"enabled": False},
+    }
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
 @app.post("/run-agent/{agent_name}")
 def run_single_agent(agent_name: str, payload: dict = Body(...)):
     mock_request = PaymentRequest(
@@ -91,32 +232,104 @@ def run_single_agent(agent_name: str, payload: dict = Body(...)):
     else:
         return {"error": "Unknown agent"}
 
+# Only the reviewer needs the other agents' outputs; the rest run concurrently
+PAYMENT_PIPELINE = [
+    Stage("fraud", lambda data: run_fraud_agent(data, pipeline_mode=True)),
+    Stage("reconciliation", run_reconciliation_agent),
+    Stage("routing", run_routing_agent),
+    Stage("healing", run_self_healing_agent),
+    Stage("review", run_consistency_reviewer, deps=("fraud", "reconciliation", "routing", "healing")),
+]
+
 @app.post("/run-pipeline")
-def run_pipeline(payload: PaymentRequest):
-    response = {}
-    response["fraud"] = run_fraud_agent(payload, pipeline_mode=True)
-    response["reconciliation"] = run_reconciliation_agent(payload)
-    response["routing"] = run_routing_agent(payload)
-    response["healing"] = run_self_healing_agent(payload)
-    response["review"] = run_consistency_reviewer(payload, response)
+async def run_pipeline(payload: PaymentRequest):
+    response, timings = await run_dag(PAYMENT_PIPELINE, payload)
+    response["timings"] = timings
     return response
 
 @app.post("/run-triage")
-def run_triage(payload: dict = Body(...)):
-    summary = f"Transaction of {payload}"
-    result = triage_agent.route_request(summary, payload)
+async def run_triage(payload: dict = Body(...)):
+    summary = transaction_summary(payload)
+    result = await get_triage_agent().aroute_request(summary, payload)
     return result
 
+async def _triage_one(payload: dict):
+    return await get_triage_agent().aroute_request(transaction_summary(payload), payload)
+
+@app.post("/run-triage-batch")
+async def run_triage_batch(payload: list = Body(...), concurrency: Optional[int] = None, format: str = "ndjson"):
+    """
+    Triages a list of transactions (IncidentData.json shape) concurrently and
+    streams one record per transaction as soon as it is done, then a final
+    {"done": true, ...} record. ?format=sse switches NDJSON to Server-Sent Events.
+    """
+    limit = clamp_concurrency(concurrency)
+
+    async def stream():
+        start = time.perf_counter()
+        failed = 0
+        async for index, result, error in run_bounded(_triage_one, payload, limit):
+            item = payload[index] if isinstance(payload[index], dict) else {}
+            record = {"index": index, "transaction_id": item.get("transaction_id") or item.get("id")}
+            if error is not None:
+                failed += 1
+                record["error"] = str(error)
+            else:
+                record["result"] = result
+            yield sse_event(record) if format == "sse" else ndjson_line(record)
+        summary = {
+            "done": True, "count": len(payload), "failed": failed, "concurrency": limit,
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+        }
+        yield sse_event(summary, event="done") if format == "sse" else ndjson_line(summary)
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(stream(), media_type=media_type)
+
+@app.post("/run-triage-dispatch")
+async def run_triage_dispatch(payload: dict = Body(...)):
+    """Triage plus only the fraud/healing agents the decision needs (see utils/dispatch.py)."""
+    return await triage_and_dispatch(payload)
+
+@app.post("/incidents")
+async def enqueue_incidents(payload=Body(...)):
+    """
+    Queues one transaction or a list for the incident worker and returns
+    their queue ids straight away. A full queue answers 503 with Retry-After
+    so producers back off instead of piling onto the API workers; items that
+    are not JSON objects are refused with 422 since no retry could run them.
+    """
+    items = payload if isinstance(payload, list) else [payload]
+    invalid = [index for index, item in enumerate(items) if not isinstance(item, dict)]
+    if invalid:
+        return JSONResponse(
+            {"error": "Each incident must be a JSON object", "invalid_items": invalid}, status_code=422
+        )
+    queue = get_incident_queue()
+    try:
+        ids = await run_blocking(queue.put, items)
+    except QueueFull as e:
+        return JSONResponse({"error": str(e)}, status_code=503, headers={"Retry-After": "30"})
+    return {"queued": len(ids), "ids": ids}
+
+@app.get("/incidents/{incident_id}")
+async def incident_status(incident_id: int):
+    queue = existing_incident_queue()
+    status = await run_blocking(queue.get, incident_id) if queue is not None else None
+    if status is None:
+        return JSONResponse({"error": "Unknown incident"}, status_code=404)
+    return status
+
 @app.post("/run-fraud-agent")
-def run_fraud(payload: dict = Body(...)):
-    summary = f"Transaction of {payload}"
-    result = fraud_detector.analyze_data(summary, payload)
+async def run_fraud(payload: dict = Body(...)):
+    summary = transaction_summary(payload)
+    result = await get_fraud_detector().aanalyze_data(summary, payload)
     return {"status": "fraud_detected" if result["fraud_detected"] else "clear", "result": result}
 
 @app.post("/run-healing-agent")
-def run_healing(payload: dict = Body(...)):
-    summary = f"Transaction of {payload}"
-    result = healing_agent.analyze_failure(summary, payload)
+async def run_healing(payload: dict = Body(...)):
+    summary = transaction_summary(payload)
+    result = await get_healing_agent().aanalyze_failure(summary, payload)
     return {"status": "healing_needed" if result["healing_needed"] else "ok", "result": result}
 
 
@@ -133,13 +346,32 @@ def chat_message(payload: dict = Body(...)):
 
 class AskRequest(BaseModel):
     question: str
+    # e.g. {"file_types": ["json"], "modified_after": "2025-07-01"}
+    filters: Optional[dict] = None
+
+    @field_validator("filters")
+    @classmethod
+    def check_filters(cls, filters):
+        # a bad date or file type is the client's fault: 422, not a 500 from the retriever
+        normalize_filters(filters)
+        return filters
 
 @app.post("/ask")
 async def ask_endpoint(request: AskRequest):
-    response = await ask_question_from_db(request.question)
+    response = await ask_question_from_db(request.question, request.filters)
     return {"response": response}
 
 
+@app.post("/ask-stream")
+async def ask_stream_endpoint(request: AskRequest):
+    """Server-Sent Events: a metadata event, token events as they arrive, then done or error."""
+    async def stream():
+        async for event in stream_question_from_db(request.question, request.filters):
+            yield sse_event(event, event=event["type"])
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
 @app.post("/ask-context")
 async def ask_with_context(body: AskRequest):
     return await ask_question_with_context(body.question)
@@ -1,41 +1,23 @@
 # fraudAgent.py
 
-import os
-import boto3
 import json
+import logging
+from utils.bedrock_client import invoke_model, ainvoke_model
+from utils.result_cache import cached_call, acached_call
+from utils.rules import AGENT_RULES_ENABLED, rule_engine
+from utils.metrics import stage, parse_failures
 
 CLAUDE_MODEL_ID = "anthropic.claude-3-5-sonnet-20240620-v1:0"
-AWS_REGION = os.getenv("AWS_REGION")
-AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
-AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
-AWS_SESSION_TOKEN = os.getenv("AWS_SESSION_TOKEN")
+# Bump whenever the prompt or parsing changes so cached results are not reused
+PROMPT_VERSION = "1"
 
 VALID_FRAUD_RESULTS = {"fraud", "not_fraud", "uncertain"}
 
 class FraudAgent:
     def __init__(self):
-        self.client = boto3.client(
-            "bedrock-runtime",
-            region_name=AWS_REGION,
-            aws_access_key_id=AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-            aws_session_token=AWS_SESSION_TOKEN,
-        )
         self.model_id = CLAUDE_MODEL_ID
 
-    def analyze_data(self, summary: str, payload: dict) -> dict:
-        print("[FraudAgent] Fraud Agent running...")  # Log to console
-        """
-        Calls Claude via Bedrock to assess the transaction for fraud.
-        Returns: {
-            fraud_detected: bool,
-            fraud_result: "fraud"|"not_fraud"|"uncertain",
-            reason: string,
-            resolution: string,         # NEW: For frontend display
-            updated_status: string,     # NEW: For frontend display
-            raw: string (optional, only on error)
-        }
-        """
+    def _request_body(self, summary: str, payload: dict) -> str:
         prompt = (
             "You are a payment fraud detection AI. Analyze the transaction below and reply ONLY with a JSON object in this format:\n"
             '{\n'
@@ -60,71 +42,132 @@ class FraudAgent:
             "top_p": 1.0,
             "messages": messages,
         }
+        return json.dumps(request_body)
 
+    def _parse_response(self, response) -> dict:
+        response_body = response["body"].read().decode("utf-8")
+        response_json = json.loads(response_body)
+        result_text = response_json["content"][0]["text"]
         try:
-            response = self.client.invoke_model(
-                modelId=self.model_id,
-                body=json.dumps(request_body),
-                contentType="application/json"
-            )
-            response_body = response["body"].read().decode("utf-8")
-            response_json = json.loads(response_body)
-            result_text = response_json["content"][0]["text"]
-            try:
-                model_result = json.loads(result_text)
-                result_val = str(model_result.get("fraud_result", "")).lower()
-                fraud_detected = (result_val == "fraud")
-                # ==== NEW LOGIC FOR RESOLUTION AND UPDATED STATUS ====
-                if result_val == "fraud":
-                    resolution = "Fraud detected"
-                    updated_status = "FRAUD"
-                elif result_val == "not_fraud":
-                    resolution = "No fraud detected"
-                    updated_status = "CLEAN"
-                elif result_val == "uncertain":
-                    resolution = "Fraud status uncertain"
-                    updated_status = "UNCERTAIN"
-                else:
-                    # If invalid output from Claude, mark as error.
-                    resolution = "Fraud analysis error"
-                    updated_status = "ERROR"
-                    return {
-                        "fraud_detected": False,
-                        "fraud_result": "uncertain",
-                        "reason": f"Invalid output from Claude: {result_val}",
-                        "raw": result_text,
-                        "resolution": resolution,      # NEW KEY
-                        "updated_status": updated_status,  # NEW KEY
-                        "agent": "Fraud Agent running"
-                    }
-                # ==== END NEW LOGIC ====
-                return {
-                    "fraud_detected": fraud_detected,
-                    "fraud_result": result_val,
-                    "reason": model_result.get("reason", ""),
-                    "resolution": resolution,      # NEW KEY
-                    "updated_status": updated_status,  # NEW KEY
-                    "agent": "Fraud Agent running"
-                }
-            except Exception:
+            model_result = json.loads(result_text)
+            result_val = str(model_result.get("fraud_result", "")).lower()
+            fraud_detected = (result_val == "fraud")
+            # ==== NEW LOGIC FOR RESOLUTION AND UPDATED STATUS ====
+            if result_val == "fraud":
+                resolution = "Fraud detected"
+                updated_status = "FRAUD"
+            elif result_val == "not_fraud":
+                resolution = "No fraud detected"
+                updated_status = "CLEAN"
+            elif result_val == "uncertain":
+                resolution = "Fraud status uncertain"
+                updated_status = "UNCERTAIN"
+            else:
+                # If invalid output from Claude, mark as error.
+                resolution = "Fraud analysis error"
+                updated_status = "ERROR"
                 return {
                     "fraud_detected": False,
                     "fraud_result": "uncertain",
-                    "reason": "LLM output parsing failed",
+                    "reason": f"Invalid output from Claude: {result_val}",
                     "raw": result_text,
-                    "resolution": "Fraud analysis failed",    # NEW KEY
-                    "updated_status": "ERROR",                # NEW KEY
+                    "resolution": resolution,      # NEW KEY
+                    "updated_status": updated_status,  # NEW KEY
                     "agent": "Fraud Agent running"
                 }
-        except Exception as e:
+            # ==== END NEW LOGIC ====
+            return {
+                "fraud_detected": fraud_detected,
+                "fraud_result": result_val,
+                "reason": model_result.get("reason", ""),
+                "resolution": resolution,      # NEW KEY
+                "updated_status": updated_status,  # NEW KEY
+                "agent": "Fraud Agent running"
+            }
+        except Exception:
+            parse_failures.inc(agent="fraud")
             return {
                 "fraud_detected": False,
                 "fraud_result": "uncertain",
-                "reason": f"Exception in Bedrock call: {e}",
-                "raw": "",
-                "resolution": "Fraud analysis failed",        # NEW KEY
-                "updated_status": "ERROR",                    # NEW KEY
+                "reason": "LLM output parsing failed",
+                "raw": result_text,
+                "resolution": "Fraud analysis failed",    # NEW KEY
+                "updated_status": "ERROR",                # NEW KEY
                 "agent": "Fraud Agent running"
             }
 
-fraud_detector = FraudAgent()
+    def _failure(self, e: Exception) -> dict:
+        return {
+            "fraud_detected": False,
+            "fraud_result": "uncertain",
+            "reason": f"Exception in Bedrock call: {e}",
+            "raw": "",
+            "resolution": "Fraud analysis failed",        # NEW KEY
+            "updated_status": "ERROR",                    # NEW KEY
+            "agent": "Fraud Agent running"
+        }
+
+    def _fast_path(self, payload: dict):
+        """Rule answer for a clear-cut signal (utils/rules.py), else None."""
+        return rule_engine.fraud(payload) if AGENT_RULES_ENABLED else None
+
+    def _invoke_kwargs(self, summary: str, payload: dict) -> dict:
+        return {
+            "modelId": self.model_id,
+            "body": self._request_body(summary, payload),
+            "contentType": "application/json",
+        }
+
+    def _result(self, response) -> dict:
+        with stage("parse"):
+            return self._parse_response(response)
+
+    async def aanalyze_data(self, summary: str, payload: dict) -> dict:
+        """
+        Calls Claude via Bedrock to assess the transaction for fraud.
+        Returns: {
+            fraud_detected: bool,
+            fraud_result: "fraud"|"not_fraud"|"uncertain",
+            reason: string,
+            resolution: string,         # NEW: For frontend display
+            updated_status: string,     # NEW: For frontend display
+            raw: string (optional, only on error)
+        }
+        The Bedrock call runs on the shared Bedrock executor.
+        """
+        logging.info("[FraudAgent] Fraud Agent running...")
+        fast = self._fast_path(payload)
+        if fast is not None:
+            return fast
+
+        async def compute():
+            try:
+                return self._result(await ainvoke_model(**self._invoke_kwargs(summary, payload)))
+            except Exception as e:
+                return self._failure(e)
+
+        return await acached_call("fraud", self.model_id, PROMPT_VERSION, summary, payload, compute)
+
+    def analyze_data(self, summary: str, payload: dict) -> dict:
+        """Blocking aanalyze_data, for scripts and worker threads; same rules, prompt, parsing and cache."""
+        logging.info("[FraudAgent] Fraud Agent running...")
+        fast = self._fast_path(payload)
+        if fast is not None:
+            return fast
+
+        def compute():
+            try:
+                return self._result(invoke_model(**self._invoke_kwargs(summary, payload)))
+            except Exception as e:
+                return self._failure(e)
+
+        return cached_call("fraud", self.model_id, PROMPT_VERSION, summary, payload, compute)
+
+_fraud_detector = None
+
+def get_fraud_detector() -> FraudAgent:
+    """Process-wide FraudAgent, built on first use (see utils/warmup.py)."""
+    global _fraud_detector
+    if _fraud_detector is None:
+        _fraud_detector = FraudAgent()
+    return _fraud_detector
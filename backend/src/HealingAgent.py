@@ -1,38 +1,21 @@
 # healingAgent.py
 
-import os
-import boto3
 import json
+import logging
+from utils.bedrock_client import invoke_model, ainvoke_model
+from utils.result_cache import cached_call, acached_call
+from utils.rules import AGENT_RULES_ENABLED, rule_engine
+from utils.metrics import stage, parse_failures
 
 CLAUDE_MODEL_ID = "anthropic.claude-3-5-sonnet-20240620-v1:0"
-AWS_REGION = os.getenv("AWS_REGION")
-AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
-AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
-AWS_SESSION_TOKEN = os.getenv("AWS_SESSION_TOKEN")
+# Bump whenever the prompt or parsing changes so cached results are not reused
+PROMPT_VERSION = "1"
 
 class HealingAgent:
     def __init__(self):
-        self.client = boto3.client(
-            "bedrock-runtime",
-            region_name=AWS_REGION,
-            aws_access_key_id=AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-            aws_session_token=AWS_SESSION_TOKEN,
-        )
         self.model_id = CLAUDE_MODEL_ID
 
-    def analyze_failure(self, summary: str, payload: dict) -> dict:
-        print("[HealingAgent] Healing Agent running...")  # Log to console
-        """
-        Calls Claude via Bedrock to assess if healing/self-healing/system intervention is needed.
-        Returns:
-            {
-                healing_needed: bool,
-                reason: str,
-                recommended_action: str,
-                raw: str (optional, only on error)
-            }
-        """
+    def _request_body(self, summary: str, payload: dict) -> str:
         prompt = (
             "You are a payment infrastructure healing agent. Given the transaction summary and system data, "
             "analyze if healing (such as retry, failover, self-healing, or manual intervention) is needed. "
@@ -57,49 +40,109 @@ class HealingAgent:
             "top_p": 1.0,
             "messages": messages,
         }
+        return json.dumps(request_body)
 
+    def _parse_response(self, response) -> dict:
+        response_body = response["body"].read().decode("utf-8")
+        response_json = json.loads(response_body)
+        result_text = response_json["content"][0]["text"]
         try:
-            response = self.client.invoke_model(
-                modelId=self.model_id,
-                body=json.dumps(request_body),
-                contentType="application/json"
+            model_result = json.loads(result_text)
+            healing_needed = bool(model_result.get("healing_needed", False))
+            resolution = (
+                "Healing is successful" if healing_needed else "No healing required"
             )
-            response_body = response["body"].read().decode("utf-8")
-            response_json = json.loads(response_body)
-            result_text = response_json["content"][0]["text"]
-            try:
-                model_result = json.loads(result_text)
-                healing_needed = bool(model_result.get("healing_needed", False))
-                resolution = (
-                    "Healing is successful" if healing_needed else "No healing required"
-                )
-                updated_status = (
-                    "PENDING_REVIEW" if healing_needed else "NO_ACTION"
-                )
-                return {
-                    "healing_needed": healing_needed,
-                    "recommended_action": model_result.get("recommended_action", ""),
-                    "resolution": f"Recommended action: {model_result.get('recommended_action', '')}",
-                    "updated_status": updated_status,
-                    "agent": "Healing Agent running"
-                }
-            except Exception:
-                return {
-                    "healing_needed": False,
-                    "reason": "LLM output parsing failed",
-                    "recommended_action": "",
-                    "resolution": "Healing failed",  # Always include
-                    "updated_status": "ERROR",       # Always include
-                    "agent": "Healing Agent running"
-                }
-        except Exception as e:
+            updated_status = (
+                "PENDING_REVIEW" if healing_needed else "NO_ACTION"
+            )
+            return {
+                "healing_needed": healing_needed,
+                "recommended_action": model_result.get("recommended_action", ""),
+                "resolution": f"Recommended action: {model_result.get('recommended_action', '')}",
+                "updated_status": updated_status,
+                "agent": "Healing Agent running"
+            }
+        except Exception:
+            parse_failures.inc(agent="healing")
             return {
                 "healing_needed": False,
-                "reason": f"Exception in Bedrock call: {e}",
+                "reason": "LLM output parsing failed",
                 "recommended_action": "",
-                "resolution": "Healing failed",      # Always include
-                "updated_status": "ERROR",           # Always include
+                "resolution": "Healing failed",  # Always include
+                "updated_status": "ERROR",       # Always include
                 "agent": "Healing Agent running"
             }
 
-healing_agent = HealingAgent()
+    def _failure(self, e: Exception) -> dict:
+        return {
+            "healing_needed": False,
+            "reason": f"Exception in Bedrock call: {e}",
+            "recommended_action": "",
+            "resolution": "Healing failed",      # Always include
+            "updated_status": "ERROR",           # Always include
+            "agent": "Healing Agent running"
+        }
+
+    def _fast_path(self, payload: dict):
+        """Rule answer for a clear-cut signal (utils/rules.py), else None."""
+        return rule_engine.healing(payload) if AGENT_RULES_ENABLED else None
+
+    def _invoke_kwargs(self, summary: str, payload: dict) -> dict:
+        return {
+            "modelId": self.model_id,
+            "body": self._request_body(summary, payload),
+            "contentType": "application/json",
+        }
+
+    def _result(self, response) -> dict:
+        with stage("parse"):
+            return self._parse_response(response)
+
+    async def aanalyze_failure(self, summary: str, payload: dict) -> dict:
+        """
+        Calls Claude via Bedrock to assess if healing/self-healing/system intervention is needed.
+        Returns:
+            {
+                healing_needed: bool,
+                reason: str,
+                recommended_action: str,
+                raw: str (optional, only on error)
+            }
+        The Bedrock call runs on the shared Bedrock executor.
+        """
+        logging.info("[HealingAgent] Healing Agent running...")
+        fast = self._fast_path(payload)
+        if fast is not None:
+            return fast
+
+        async def compute():
+            try:
+                return self._result(await ainvoke_model(**self._invoke_kwargs(summary, payload)))
+            except Exception as e:
+                return self._failure(e)
+
+        return await acached_call("healing", self.model_id, PROMPT_VERSION, summary, payload, compute)
+
+    def analyze_failure(self, summary: str, payload: dict) -> dict:
+        """Blocking aanalyze_failure, for scripts and worker threads; same rules, prompt, parsing and cache."""
+        logging.info("[HealingAgent] Healing Agent running...")
+        fast = self._fast_path(payload)
+        if fast is not None:
+            return fast
+
+        def compute():
+            try:
+                return self._result(invoke_model(**self._invoke_kwargs(summary, payload)))
+            except Exception as e:
+                return self._failure(e)
+
+        return cached_call("healing", self.model_id, PROMPT_VERSION, summary, payload, compute)
+
+_healing_agent = None
+
+def get_healing_agent() -> HealingAgent:
+    """Process-wide HealingAgent, built on first use (see utils/warmup.py)."""
+    global _healing_agent
+    if _healing_agent is None:
+        _healing_agent = HealingAgent()
+    return _healing_agent
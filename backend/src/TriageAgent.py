@@ -1,32 +1,22 @@
 # triageAgent.py
 
-import os
-import boto3
 import json
+from utils.bedrock_client import invoke_model, ainvoke_model
+from utils.result_cache import cached_call, acached_call
+from utils.rules import AGENT_RULES_ENABLED, rule_engine
+from utils.metrics import stage, parse_failures
 
 CLAUDE_MODEL_ID = "anthropic.claude-3-5-sonnet-20240620-v1:0"
-AWS_REGION = os.getenv("AWS_REGION")
-AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
-AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
-AWS_SESSION_TOKEN = os.getenv("AWS_SESSION_TOKEN")
+# Bump whenever the prompt or parsing changes so cached results are not reused
+PROMPT_VERSION = "1"
 
 VALID_DECISIONS = {"fraud", "healing", "failed", "approved", "healing_and_fraud"}
 
 class TriageAgent:
     def __init__(self):
-        self.client = boto3.client(
-            "bedrock-runtime",
-            region_name=AWS_REGION,
-            aws_access_key_id=AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-            aws_session_token=AWS_SESSION_TOKEN,
-        )
+        self.model_id = CLAUDE_MODEL_ID
 
-    def route_request(self, summary: str, payload: dict):
-        """
-        Calls Claude via Bedrock to triage the transaction.
-        Ensures triage_decision is only one of: fraud, healing, failed, approved.
-        """
+    def _request_body(self, payload: dict) -> str:
         prompt = (
             "You are a payments triage AI. Your job is to assess the following transaction and decide ONE of the following (or BOTH if both are needed):\n"
             "- fraud (suspicious or fraudulent)\n"
@@ -58,13 +48,9 @@ class TriageAgent:
             "top_p": 1.0,
             "messages": messages,
         }
+        return json.dumps(request_body)
 
-        response = self.client.invoke_model(
-            modelId=CLAUDE_MODEL_ID,
-            body=json.dumps(request_body),
-            contentType="application/json"
-        )
-
+    def _parse_response(self, response) -> dict:
         response_body = response["body"].read().decode("utf-8")
         response_json = json.loads(response_body)
         result_text = response_json["content"][0]["text"]
@@ -86,6 +72,7 @@ class TriageAgent:
                         "raw": result_text
                     }
         except Exception:
+            parse_failures.inc(agent="triage")
             result = {
                 "triage_decision": "failed",
                 "reason": "LLM output parsing failed",
@@ -94,4 +81,54 @@ class TriageAgent:
 
         return result
 
-triage_agent = TriageAgent()
+    def _fast_path(self, payload: dict):
+        """Rule answer for a clear-cut signal (utils/rules.py), else None."""
+        return rule_engine.triage(payload) if AGENT_RULES_ENABLED else None
+
+    def _invoke_kwargs(self, payload: dict) -> dict:
+        return {
+            "modelId": self.model_id,
+            "body": self._request_body(payload),
+            "contentType": "application/json",
+        }
+
+    def _result(self, response) -> dict:
+        with stage("parse"):
+            return self._parse_response(response)
+
+    async def aroute_request(self, summary: str, payload: dict):
+        """
+        Calls Claude via Bedrock to triage the transaction.
+        Ensures triage_decision is only one of: fraud, healing, failed, approved.
+        Clear-cut signals are answered by utils/rules.py without Bedrock;
+        identical payloads are served from the agent result cache.
+        """
+        fast = self._fast_path(payload)
+        if fast is not None:
+            return fast
+
+        async def compute():
+            return self._result(await ainvoke_model(**self._invoke_kwargs(payload)))
+
+        # the triage prompt only sees the payload, so the summary stays out of the cache key
+        return await acached_call("triage", self.model_id, PROMPT_VERSION, None, payload, compute)
+
+    def route_request(self, summary: str, payload: dict):
+        """Blocking aroute_request, for scripts and worker threads; same rules, prompt, parsing and cache."""
+        fast = self._fast_path(payload)
+        if fast is not None:
+            return fast
+
+        def compute():
+            return self._result(invoke_model(**self._invoke_kwargs(payload)))
+
+        return cached_call("triage", self.model_id, PROMPT_VERSION, None, payload, compute)
+
+_triage_agent = None
+
+def get_triage_agent() -> TriageAgent:
+    """Process-wide TriageAgent, built on first use (see utils/warmup.py)."""
+    global _triage_agent
+    if _triage_agent is None:
+        _triage_agent = TriageAgent()
+    return _triage_agent
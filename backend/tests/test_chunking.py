@@ -0,0 +1,16 @@
+from utils.chunking import chunk_document, count_tokens
+
+
+def test_long_section_is_split_into_overlapping_windows():
+    words = " ".join(f"w{i}" for i in range(2000))
+    chunks = chunk_document("notes.md", "# Title\n" + words, max_tokens=512, overlap_tokens=64)
+    assert all(count_tokens(chunk) <= 512 for chunk in chunks)
+    for first, second in zip(chunks, chunks[1:]):
+        assert set(first.split()) & set(second.split())
+
+
+def test_text_without_whitespace_is_split_by_characters():
+    chunks = chunk_document("blob.txt", "x" * 200000, max_tokens=512, overlap_tokens=64)
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 512 for chunk in chunks)
+    assert "".join(chunks) == "x" * 200000
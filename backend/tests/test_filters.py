@@ -0,0 +1,19 @@
+import pytest
+from utils.lexical import normalize_filters
+
+
+def test_filters_are_normalized():
+    filters = normalize_filters({"file_types": ".JSON", "modified_after": "2025-07-01"})
+    assert filters["file_types"] == ["json"]
+    assert filters["modified_after"] > 0
+    assert normalize_filters(None) == {"file_types": None, "modified_after": None}
+
+
+@pytest.mark.parametrize("filters", [
+    {"modified_after": "last tuesday"},
+    {"modified_after": ["2025-07-01"]},
+    {"file_types": [1, 2]},
+])
+def test_malformed_filters_raise_value_error(filters):
+    with pytest.raises(ValueError):
+        normalize_filters(filters)
@@ -0,0 +1,79 @@
+import asyncio
+import time
+from utils.rate_governor import RateGovernor
+
+
+def _half_open(governor, model_id="m"):
+    state = governor._model(model_id)
+    state.open_until = time.monotonic() - 1  # cooldown over, next call probes
+    return state
+
+
+def test_cancelled_probe_lets_the_breaker_recover():
+    async def scenario():
+        governor = RateGovernor(limits={}, default_rps=0, deadline=5)
+        state = _half_open(governor)
+        release = asyncio.Event()
+
+        async def slow():
+            await release.wait()
+            return "late"
+
+        probe = asyncio.ensure_future(governor.arun("m", slow))
+        await asyncio.sleep(0)
+        probe.cancel()
+        await asyncio.sleep(0)
+        # the abandoned attempt keeps its slot until it really ends
+        assert state.in_flight == 1
+        release.set()
+        await asyncio.sleep(0.01)
+        assert state.in_flight == 0
+
+        async def ok():
+            return "ok"
+
+        assert await governor.arun("m", ok) == "ok"
+        assert governor.get_stats()["m"]["circuit"] == "closed"
+
+    asyncio.run(scenario())
+
+
+def test_probe_cancelled_while_queued_is_cleared():
+    async def scenario():
+        governor = RateGovernor(limits={}, default_rps=0, deadline=5)
+        state = _half_open(governor)
+        state.limit = 1
+        state.in_flight = 1  # no slot free, the probe waits in line
+
+        async def ok():
+            return "ok"
+
+        probe = asyncio.ensure_future(governor.arun("m", ok))
+        await asyncio.sleep(0.01)
+        probe.cancel()
+        await asyncio.sleep(0.01)
+        assert state.probing is None
+        state.release()
+        assert await governor.arun("m", ok) == "ok"
+
+    asyncio.run(scenario())
+
+
+def test_held_result_of_cancelled_call_is_discarded():
+    async def scenario():
+        governor = RateGovernor(limits={}, default_rps=0, deadline=5)
+        release, discarded = asyncio.Event(), []
+
+        async def open_stream():
+            await release.wait()
+            return "stream"
+
+        call = asyncio.ensure_future(governor.arun("m", open_stream, hold=True, discard=discarded.append))
+        await asyncio.sleep(0)
+        call.cancel()
+        release.set()
+        await asyncio.sleep(0.01)
+        assert discarded == ["stream"]
+        assert governor._model("m").in_flight == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,29 @@
+import pytest
+from utils.rules import RuleEngine
+
+
+def _payload(signal, status="FAILED", amount=100):
+    return {"transaction_id": "t1", "status": status, "amount": amount, "metadata": {"error_detection_signal": signal}}
+
+
+@pytest.mark.parametrize("signal", [
+    "amount 5000 above limit",
+    "no fraud indicators",
+    "not suspicious, customer retried",
+    "retried without timeout",
+    "never flagged before",
+])
+def test_negated_or_non_matching_signals_fall_through(signal):
+    rule, _ = RuleEngine().match(_payload(signal))
+    assert rule is None
+
+
+@pytest.mark.parametrize("signal, decision", [
+    ("card ending 5123 reported stolen", "fraud"),
+    ("upstream returned 503", "healing"),
+    ("gateway timeout on card stolen last week", "healing_and_fraud"),
+    ("fraudulent chargeback", "fraud"),
+])
+def test_clear_signals_match(signal, decision):
+    rule, _ = RuleEngine().match(_payload(signal))
+    assert rule is not None and rule.decision == decision
@@ -0,0 +1,123 @@
+import os
+import math
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+# === Answer Cache Config ===
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+
+
+def _normalize(vector) -> list:
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+def context_signature(rows) -> str:
+    """Identifies a retrieved context by the ids and content hashes of its rows."""
+    parts = [f"{row['id']}:{row['content_hash']}" for row in rows]
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+
+# === Semantic Answer Cache ===
+class SemanticAnswerCache:
+    """
+    Reuses a /ask answer when a new question embeds within `threshold` cosine
+    similarity of a cached one AND retrieval returned the same GrabData rows
+    with the same content hashes. Entries are grouped by that context
+    signature, so a lookup only compares against questions that saw the
+    same context. Bounded by TTL and LRU size; entries are dropped when the
+    files behind them are re-indexed or removed.
+    """
+
+    def __init__(self, threshold=ANSWER_CACHE_THRESHOLD, ttl=ANSWER_CACHE_TTL, max_entries=ANSWER_CACHE_MAX_ENTRIES):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # entry_id -> entry dict
+        self._by_context = {}          # context signature -> set(entry_id)
+        self._by_file = {}             # filepath -> set(entry_id)
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def _drop(self, entry_id):
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        ids = self._by_context.get(entry["context"])
+        if ids is not None:
+            ids.discard(entry_id)
+            if not ids:
+                del self._by_context[entry["context"]]
+        for filepath in entry["files"]:
+            ids = self._by_file.get(filepath)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del self._by_file[filepath]
+
+    def lookup(self, question_embedding, rows):
+        signature = context_signature(rows)
+        query = _normalize(question_embedding)
+        now = time.time()
+        with self._lock:
+            for entry_id in list(self._by_context.get(signature, ())):
+                entry = self._entries[entry_id]
+                if now - entry["created"] > self.ttl:
+                    self._drop(entry_id)
+                    self.stats["expirations"] += 1
+                    continue
+                similarity = sum(a * b for a, b in zip(query, entry["vector"]))
+                if similarity >= self.threshold:
+                    self._entries.move_to_end(entry_id)
+                    self.stats["hits"] += 1
+                    return entry["answer"]
+            self.stats["misses"] += 1
+        return None
+
+    def store(self, question_embedding, rows, answer: str):
+        signature = context_signature(rows)
+        files = {row["filepath"] for row in rows}
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = {
+                "vector": _normalize(question_embedding),
+                "context": signature,
+                "files": files,
+                "answer": answer,
+                "created": time.time(),
+            }
+            self._by_context.setdefault(signature, set()).add(entry_id)
+            for filepath in files:
+                self._by_file.setdefault(filepath, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.stats["evictions"] += 1
+
+    def invalidate_files(self, filepaths):
+        with self._lock:
+            for filepath in filepaths:
+                for entry_id in list(self._by_file.get(filepath, ())):
+                    self._drop(entry_id)
+                    self.stats["invalidations"] += 1
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._entries)
+        stats["threshold"] = self.threshold
+        return stats
+
+
+answer_cache = SemanticAnswerCache()
+
+
+def get_cache_stats() -> dict:
+    return answer_cache.get_stats() if ANSWER_CACHE_ENABLED else {"enabled": False}
@@ -1,19 +1,7 @@
 # claude_test.py
-import boto3
 import os
 import json
-from dotenv import load_dotenv
-
-load_dotenv()
-
-# === Setup Bedrock Client ===
-client = boto3.client(
-    "bedrock-runtime",
-    region_name=os.getenv("AWS_REGION"),
-    aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-    aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-    aws_session_token=os.getenv("AWS_SESSION_TOKEN")
-)
+from utils.bedrock_client import invoke_model
 
 def test_claude():
     try:
@@ -27,7 +15,7 @@ def test_claude():
 
         prompt = """\n\nHuman: What is the capital of Japan?\n\nAssistant:"""
 
-        response = client.invoke_model(
+        response = invoke_model(
             modelId=model_id,
             body=json.dumps({
                 "prompt": prompt,
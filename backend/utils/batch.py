@@ -0,0 +1,48 @@
+import os
+import json
+import asyncio
+
+# === Batch Config ===
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+# Hard ceiling for a request's ?concurrency=; keep at or below BEDROCK_EXECUTOR_THREADS
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "32"))
+
+
+def clamp_concurrency(requested=None) -> int:
+    return max(1, min(int(requested or BATCH_CONCURRENCY), BATCH_MAX_CONCURRENCY))
+
+
+# === Bounded Fan-out ===
+async def run_bounded(fn, items, concurrency=None):
+    """
+    Awaits the coroutine fn(item) for every item with at most `concurrency`
+    calls in flight and yields (index, result, error) in completion order.
+    One failing item does not stop the batch. If the consumer goes away
+    (client disconnect) the items that have not started are cancelled.
+    """
+    semaphore = asyncio.Semaphore(clamp_concurrency(concurrency))
+
+    async def _one(index, item):
+        async with semaphore:
+            try:
+                return index, await fn(item), None
+            except Exception as e:
+                return index, None, e
+
+    tasks = [asyncio.create_task(_one(i, item)) for i, item in enumerate(items)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+# === Wire Formats ===
+def ndjson_line(record: dict) -> str:
+    return json.dumps(record, default=str) + "\n"
+
+
+def sse_event(record: dict, event: str = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(record, default=str)}\n\n"
@@ -1,91 +1,19 @@
-import os
-import json
-import asyncpg
-import boto3
+from utils.embeddings import aget_titan_embedding
+from utils.retrieval import get_retriever
+# Claude calls live in utils/query.py; re-exported for callers of this module
+from utils.query import CLAUDE_MODEL_ID, call_claude, acall_claude
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# === AWS + DB CONFIG ===
-AWS_REGION = os.getenv("AWS_REGION")
-AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
-AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
-AWS_SESSION_TOKEN = os.getenv("AWS_SESSION_TOKEN")
-CLAUDE_MODEL_ID = "anthropic.claude-3-5-sonnet-20240620-v1:0"
-DB_URL = os.getenv("DATABASE_URL")
-
-# === Bedrock Claude Client ===
-def get_bedrock_client():
-    return boto3.client(
-        "bedrock-runtime",
-        region_name=AWS_REGION,
-        aws_access_key_id=AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-        aws_session_token=AWS_SESSION_TOKEN,
-    )
-
-# === Get Titan Embedding for user query ===
-def get_titan_embedding(text: str) -> list:
-    try:
-        client = get_bedrock_client()
-        body = {"inputText": text[:2000]}
-        response = client.invoke_model(
-            modelId="amazon.titan-embed-text-v2:0",
-            body=json.dumps(body),
-            accept="application/json",
-            contentType="application/json",
-        )
-        result = json.loads(response["body"].read())
-        return result["embedding"]
-    except Exception as e:
-        print(f"[ERROR] Embedding failed: {e}")
-        return []
-
 # === Search similar context from DB ===
 async def fetch_similar_chunks(query_embedding: list, limit=15):
-    # PGVector expects the embedding as an array-string
-    embedding_str = "[" + ",".join(str(x) for x in query_embedding) + "]"
-    pool = await asyncpg.create_pool(dsn=DB_URL)
-    try:
-        async with pool.acquire() as conn:
-            rows = await conn.fetch(
-                "SELECT content FROM GrabData ORDER BY embedding <-> $1::vector LIMIT $2",
-                embedding_str, limit
-            )
-        return [row['content'] for row in rows]
-    finally:
-        await pool.close()
-
-# === Call Claude to answer using retrieved context ===
-def call_claude(context: str, question: str) -> str:
-    try:
-        client = get_bedrock_client()
-        body = {
-            "messages": [
-                {
-                    "role": "user",
-                    "content": f"Use the following context to answer:\n\n{context}\n\nQuestion: {question}"
-                }
-            ],
-            "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 1024
-        }
-        response = client.invoke_model(
-            modelId=CLAUDE_MODEL_ID,
-            body=json.dumps(body),
-            contentType="application/json",
-            accept="application/json"
-        )
-        result = json.loads(response["body"].read())
-        # Bedrock Claude returns a 'content' list with dicts containing 'text'
-        return result["content"][0]["text"]
-    except Exception as e:
-        print(f"[ERROR] Claude call failed: {e}")
-        return "❌ Claude model failed to respond."
+    rows = await get_retriever().search(query_embedding, limit)
+    return [row['content'] for row in rows]
 
 # === Unified function for RAG-based answer ===
 async def ask_question_from_db(question: str) -> str:
-    query_embedding = get_titan_embedding(question)
+    query_embedding = await aget_titan_embedding(question)
     if not query_embedding:
         return "❌ Could not generate embedding for your question."
 
@@ -94,7 +22,7 @@ async def ask_question_from_db(question: str) -> str:
         return "❌ No relevant information found in the database."
 
     combined_context = "\n---\n".join(chunks)
-    return call_claude(combined_context, question)
+    return await acall_claude(combined_context, question)
 
 # === Simple CLI test ===
 def test_invoke_claude():
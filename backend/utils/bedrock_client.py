@@ -0,0 +1,325 @@
+import io
+import os
+import json
+import asyncio
+import logging
+import threading
+import time
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from utils import metrics
+from utils import rate_governor
+from utils.bedrock_replay import ReplayClient, wrap_client
+
+load_dotenv()
+
+# === AWS Config ===
+AWS_REGION = os.getenv("AWS_REGION")
+AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
+AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
+AWS_SESSION_TOKEN = os.getenv("AWS_SESSION_TOKEN")
+
+# === Connection Pool Config ===
+BEDROCK_MAX_POOL_CONNECTIONS = int(os.getenv("BEDROCK_MAX_POOL_CONNECTIONS", "50"))
+BEDROCK_CONNECT_TIMEOUT = float(os.getenv("BEDROCK_CONNECT_TIMEOUT", "5"))
+BEDROCK_READ_TIMEOUT = float(os.getenv("BEDROCK_READ_TIMEOUT", "60"))
+BEDROCK_TCP_KEEPALIVE = os.getenv("BEDROCK_TCP_KEEPALIVE", "true").lower() in ("1", "true", "yes")
+# botocore's own retries; with the rate governor on it retries instead (utils/rate_governor.py)
+BEDROCK_MAX_ATTEMPTS = int(os.getenv("BEDROCK_MAX_ATTEMPTS", "3"))
+# Threads behind ainvoke_model; one per pooled connection, raise both together
+BEDROCK_EXECUTOR_THREADS = int(os.getenv("BEDROCK_EXECUTOR_THREADS", str(BEDROCK_MAX_POOL_CONNECTIONS)))
+
+_client = None
+_client_lock = threading.Lock()
+_executor = None
+
+# === Pool Usage Stats ===
+_stats_lock = threading.Lock()
+_stats = {
+    "in_flight": 0,
+    "peak_in_flight": 0,
+    "total_calls": 0,
+    "saturated_calls": 0,
+}
+
+
+# === Shared Bedrock Runtime Client ===
+def get_bedrock_client():
+    """
+    Returns the process-wide bedrock-runtime client, creating it on first use.
+    boto3 clients are thread-safe, so every agent and util shares this one
+    client and its urllib3 connection pool.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                # boto3 takes ~150ms to import; deferred so startup and reloads skip it
+                import boto3
+                from botocore.config import Config
+
+                config = Config(
+                    max_pool_connections=BEDROCK_MAX_POOL_CONNECTIONS,
+                    connect_timeout=BEDROCK_CONNECT_TIMEOUT,
+                    read_timeout=BEDROCK_READ_TIMEOUT,
+                    tcp_keepalive=BEDROCK_TCP_KEEPALIVE,
+                    # the governor has to see each throttle to adapt, so botocore must not hide them
+                    retries={
+                        "max_attempts": 1 if rate_governor.BEDROCK_GOVERNOR_ENABLED else BEDROCK_MAX_ATTEMPTS,
+                        "mode": "standard",
+                    },
+                )
+                # BEDROCK_REPLAY_MODE=record|replay wraps the client (utils/bedrock_replay.py)
+                _client = wrap_client(boto3.client(
+                    "bedrock-runtime",
+                    region_name=AWS_REGION,
+                    aws_access_key_id=AWS_ACCESS_KEY_ID,
+                    aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+                    aws_session_token=AWS_SESSION_TOKEN,
+                    config=config,
+                ))
+                logging.info(
+                    f"Bedrock client created (pool={BEDROCK_MAX_POOL_CONNECTIONS}, "
+                    f"keepalive={BEDROCK_TCP_KEEPALIVE})"
+                )
+    return _client
+
+
+# === Tracked invoke_model ===
+def invoke_model(**kwargs) -> dict:
+    """
+    Calls invoke_model on the shared client through the rate governor and
+    tracks how many calls hold a pooled connection. The body is read here
+    so the connection goes back to the pool as soon as the call finishes;
+    callers still get a readable body.
+    """
+    model_id = kwargs.get("modelId", "")
+    try:
+        # rate limit, adaptive concurrency, retries and circuit breaker per model
+        response = rate_governor.governed_call(model_id, partial(_invoke_once, kwargs))
+    except Exception:
+        metrics.bedrock_errors.inc(model=model_id)
+        raise
+    _record_tokens(model_id, response)
+    return response
+
+
+def _invoke_once(kwargs) -> dict:
+    model_id = kwargs.get("modelId", "")
+    _track_start()
+    start = time.perf_counter()
+    try:
+        response = get_bedrock_client().invoke_model(**kwargs)
+        response["body"] = io.BytesIO(response["body"].read())
+        return response
+    finally:
+        metrics.bedrock_seconds.observe(time.perf_counter() - start, model=model_id)
+        _track_end()
+
+
+def _record_tokens(model_id, response):
+    # Bedrock reports token usage in response headers for every model
+    headers = response.get("ResponseMetadata", {}).get("HTTPHeaders", {})
+    metrics.record_bedrock_tokens(
+        model_id, headers.get("x-amzn-bedrock-input-token-count"), headers.get("x-amzn-bedrock-output-token-count")
+    )
+
+
+def _track_start():
+    metrics.bedrock_in_flight.inc()
+    with _stats_lock:
+        _stats["in_flight"] += 1
+        _stats["total_calls"] += 1
+        in_flight = _stats["in_flight"]
+        _stats["peak_in_flight"] = max(_stats["peak_in_flight"], in_flight)
+        saturated = in_flight > BEDROCK_MAX_POOL_CONNECTIONS
+        if saturated:
+            _stats["saturated_calls"] += 1
+    if saturated:
+        logging.warning(
+            f"Bedrock pool saturated: {in_flight} calls in flight, "
+            f"{BEDROCK_MAX_POOL_CONNECTIONS} connections available"
+        )
+
+
+def _track_end():
+    metrics.bedrock_in_flight.dec()
+    with _stats_lock:
+        _stats["in_flight"] -= 1
+
+
+# === Tracked Response Stream ===
+def invoke_model_stream(**kwargs):
+    """
+    Calls invoke_model_with_response_stream on the shared client and yields
+    each decoded event payload (a dict). The call holds its pooled
+    connection, and counts as in flight, until the stream is exhausted or
+    the generator is closed.
+    """
+    model_id = kwargs.get("modelId", "")
+    start = time.perf_counter()
+    try:
+        # only opening the stream is retried; the governor slot is held until the stream ends
+        response = rate_governor.governed_call(model_id, partial(_open_stream, kwargs), hold=True)
+    except Exception:
+        metrics.bedrock_errors.inc(model=model_id)
+        metrics.bedrock_seconds.observe(time.perf_counter() - start, model=model_id)
+        raise
+    yield from _read_stream(model_id, response, start)
+
+
+def _open_stream(kwargs):
+    _track_start()
+    try:
+        return get_bedrock_client().invoke_model_with_response_stream(**kwargs)
+    except Exception:
+        _track_end()
+        raise
+
+
+def _discard_stream(response):
+    """Closes a stream that finished opening after its caller was cancelled."""
+    try:
+        close = getattr(response["body"], "close", None)
+        if close:
+            close()
+    finally:
+        _track_end()
+
+
+def _read_stream(model_id, response, start):
+    """Yields decoded events of an opened stream, then frees its connection and governor slot."""
+    try:
+        stream = response["body"]
+        try:
+            for event in stream:
+                chunk = event.get("chunk")
+                if chunk:
+                    payload = json.loads(chunk["bytes"])
+                    usage = payload.get("amazon-bedrock-invocationMetrics")
+                    if usage:
+                        metrics.record_bedrock_tokens(model_id, usage.get("inputTokenCount"), usage.get("outputTokenCount"))
+                    yield payload
+        finally:
+            close = getattr(stream, "close", None)
+            if close:
+                close()
+    except Exception:
+        metrics.bedrock_errors.inc(model=model_id)
+        raise
+    finally:
+        metrics.bedrock_seconds.observe(time.perf_counter() - start, model=model_id)
+        _track_end()
+        rate_governor.release(model_id)
+
+
+# === Async Access ===
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _client_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=BEDROCK_EXECUTOR_THREADS, thread_name_prefix="bedrock")
+    return _executor
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """
+    Runs a blocking Bedrock-bound call on the dedicated executor so async
+    routes never stall the event loop or compete with Starlette's threadpool.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), partial(fn, *args, **kwargs))
+
+
+async def ainvoke_model(**kwargs) -> dict:
+    """
+    Async invoke_model with the same tracking. Waiting for the governor and
+    retry backoff happen on the event loop; only the call itself takes a
+    Bedrock executor thread.
+    """
+    model_id = kwargs.get("modelId", "")
+    try:
+        response = await rate_governor.agoverned_call(model_id, partial(run_blocking, _invoke_once, kwargs))
+    except Exception:
+        metrics.bedrock_errors.inc(model=model_id)
+        raise
+    _record_tokens(model_id, response)
+    return response
+
+
+async def ainvoke_model_stream(**kwargs):
+    """
+    Async iterator over invoke_model_stream events. The stream is opened
+    through the governor on the event loop, then read on the Bedrock
+    executor and handed back through a queue, so each event is yielded as
+    soon as Bedrock sends it. Closing the iterator early (client gone)
+    stops the reader after its next event; a caller cancelled while the
+    stream is still opening leaves it to be closed once it opens.
+    """
+    model_id = kwargs.get("modelId", "")
+    start = time.perf_counter()
+    try:
+        response = await rate_governor.agoverned_call(
+            model_id, partial(run_blocking, _open_stream, kwargs), hold=True, discard=_discard_stream
+        )
+    except Exception:
+        metrics.bedrock_errors.inc(model=model_id)
+        metrics.bedrock_seconds.observe(time.perf_counter() - start, model=model_id)
+        raise
+
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    stop = threading.Event()
+    done = object()
+
+    def _put(item):
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+        except RuntimeError:
+            stop.set()  # event loop already closed
+
+    def _reader():
+        events = _read_stream(model_id, response, start)
+        try:
+            for event in events:
+                if stop.is_set():
+                    break
+                _put(event)
+            _put(done)
+        except Exception as e:
+            _put(e)
+        finally:
+            events.close()
+
+    loop.run_in_executor(_get_executor(), _reader)
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+def get_pool_stats() -> dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["max_pool_connections"] = BEDROCK_MAX_POOL_CONNECTIONS
+    stats["executor_threads"] = BEDROCK_EXECUTOR_THREADS
+    stats["utilization"] = round(stats["in_flight"] / BEDROCK_MAX_POOL_CONNECTIONS, 3)
+    stats["peak_utilization"] = round(stats["peak_in_flight"] / BEDROCK_MAX_POOL_CONNECTIONS, 3)
+    stats["governor"] = rate_governor.get_governor_stats()
+    if isinstance(_client, ReplayClient):
+        stats["replay"] = _client.get_stats()
+    return stats
+
+
+def close_replay_log():
+    """Closes the record/replay log, if any, so a gzip log gets its end marker. Call on shutdown."""
+    if isinstance(_client, ReplayClient):
+        _client.log.close()
@@ -0,0 +1,348 @@
+import io
+import os
+import gzip
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import defaultdict
+
+# === Record/Replay Config ===
+# off | record (call Bedrock and log every call) | replay (serve calls from the log)
+BEDROCK_REPLAY_MODE = os.getenv("BEDROCK_REPLAY_MODE", "off").lower()
+# gzip JSONL when the path ends in .gz, plain JSONL otherwise. Plain by default:
+# a killed process leaves a gzip log without its end marker (readable up to the cut)
+BEDROCK_REPLAY_PATH = os.getenv(
+    "BEDROCK_REPLAY_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".cache", "bedrock_replay.jsonl"),
+)
+# Replayed latency is recorded latency / speed: 10 replays at 10x, 0 skips the waits
+BEDROCK_REPLAY_SPEED = float(os.getenv("BEDROCK_REPLAY_SPEED", "1"))
+# On a replay miss: error (raise) or live (call Bedrock)
+BEDROCK_REPLAY_MISS = os.getenv("BEDROCK_REPLAY_MISS", "error").lower()
+
+TOKEN_HEADERS = ("x-amzn-bedrock-input-token-count", "x-amzn-bedrock-output-token-count")
+
+
+def request_key(model_id: str, body) -> str:
+    if isinstance(body, bytes):
+        body = body.decode("utf-8")
+    return hashlib.sha256(f"{model_id}\n{body}".encode("utf-8")).hexdigest()
+
+
+def _client_error(code, message, operation):
+    from botocore.exceptions import ClientError
+
+    return ClientError({"Error": {"Code": code, "Message": message}}, operation)
+
+
+def _open(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def _read_records(path: str):
+    """
+    Records of a log in order. A log cut off by a killed process is read up
+    to the cut: a gzip stream without its end marker raises EOFError, and
+    the last line may be half written.
+    """
+    with _open(path, "r") as f:
+        try:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    logging.warning(f"Skipping truncated record in {path}")
+        except EOFError:
+            logging.warning(f"{path} ends without a gzip end marker; keeping the records before it")
+
+
+# === Log ===
+class ReplayLog:
+    """
+    Append-only log of Bedrock calls, one JSON record per line:
+    {"key", "op", "model", "request", "latency_ms", "headers", then
+    "body" | "events" [[offset_ms, event], ...] | "error" {"code", "message"}}.
+    Records are flushed as they are written, so a crash keeps earlier calls;
+    close() the log on shutdown to also finish a gzip stream.
+    """
+
+    def __init__(self, path=BEDROCK_REPLAY_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._writer = None
+        self._records = None
+        self._cursors = defaultdict(int)
+
+    def append(self, record: dict):
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._writer is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._writer = _open(self.path, "a")
+            self._writer.write(line)
+            self._writer.flush()
+
+    def load(self) -> dict:
+        """key -> recorded calls in log order; read once, on the first replayed call."""
+        with self._lock:
+            if self._records is None:
+                records = defaultdict(list)
+                if os.path.exists(self.path):
+                    for record in _read_records(self.path):
+                        records[record["key"]].append(record)
+                self._records = dict(records)
+                logging.info(f"Bedrock replay log loaded: {sum(map(len, records.values()))} calls from {self.path}")
+            return self._records
+
+    def next_for(self, key: str):
+        """
+        The recorded call for this request. Repeats of one request are served
+        in the order they were recorded, cycling once exhausted, so a replay
+        of the same traffic gets the same responses every run.
+        """
+        calls = self.load().get(key)
+        if not calls:
+            return None
+        with self._lock:
+            cursor = self._cursors[key]
+            self._cursors[key] = cursor + 1
+        return calls[cursor % len(calls)]
+
+    def close(self):
+        with self._lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+
+# === Recording / Replaying Client ===
+class ReplayClient:
+    """
+    Wraps a bedrock-runtime client at the transport boundary used by
+    utils/bedrock_client.py (invoke_model, invoke_model_with_response_stream),
+    so every agent, embedding and call_claude request is captured or served
+    without changes to the callers.
+    """
+
+    def __init__(self, client, mode=BEDROCK_REPLAY_MODE, log: ReplayLog = None,
+                 speed=BEDROCK_REPLAY_SPEED, on_miss=BEDROCK_REPLAY_MISS):
+        self.client = client
+        self.mode = mode
+        self.log = log or ReplayLog()
+        self.speed = speed
+        self.on_miss = on_miss
+        self._stats_lock = threading.Lock()
+        self.stats = {"recorded": 0, "replayed": 0, "misses": 0}
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def _wait(self, latency_ms):
+        if self.speed > 0 and latency_ms:
+            time.sleep(latency_ms / self.speed / 1000)
+
+    def _miss(self, key, model_id):
+        self._count("misses")
+        if self.on_miss != "live":
+            raise LookupError(f"No recorded Bedrock call for {model_id} (key {key[:12]}) in {self.log.path}")
+
+    @staticmethod
+    def _record_base(op, key, kwargs, started) -> dict:
+        body = kwargs.get("body")
+        return {
+            "key": key,
+            "op": op,
+            "model": kwargs.get("modelId", ""),
+            "request": body.decode("utf-8") if isinstance(body, bytes) else body,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+
+    def _record_error(self, op, key, kwargs, started, error):
+        record = self._record_base(op, key, kwargs, started)
+        if isinstance(getattr(error, "response", None), dict) and "Error" in error.response:
+            record["error"] = {"code": error.response["Error"].get("Code"), "message": error.response["Error"].get("Message")}
+        else:
+            record["error"] = {"code": type(error).__name__, "message": str(error)}
+        self.log.append(record)
+        self._count("recorded")
+
+    @staticmethod
+    def _raise_recorded(record, op):
+        error = record["error"]
+        raise _client_error(error["code"], error["message"], op)
+
+    # === invoke_model ===
+    def invoke_model(self, **kwargs) -> dict:
+        key = request_key(kwargs.get("modelId", ""), kwargs.get("body", ""))
+        if self.mode == "replay":
+            record = self.log.next_for(key)
+            if record is not None:
+                self._count("replayed")
+                self._wait(record["latency_ms"])
+                if "error" in record:
+                    self._raise_recorded(record, "InvokeModel")
+                return {
+                    "body": io.BytesIO(record["body"].encode("utf-8")),
+                    "contentType": "application/json",
+                    "ResponseMetadata": {"HTTPStatusCode": 200, "HTTPHeaders": dict(record.get("headers", {}))},
+                }
+            self._miss(key, kwargs.get("modelId", ""))
+            return self.client.invoke_model(**kwargs)
+
+        started = time.perf_counter()
+        try:
+            response = self.client.invoke_model(**kwargs)
+            body = response["body"].read()
+        except Exception as e:
+            if self.mode == "record":
+                self._record_error("InvokeModel", key, kwargs, started, e)
+            raise
+        response["body"] = io.BytesIO(body)
+        if self.mode == "record":
+            headers = response.get("ResponseMetadata", {}).get("HTTPHeaders", {})
+            record = self._record_base("InvokeModel", key, kwargs, started)
+            record["headers"] = {h: headers[h] for h in TOKEN_HEADERS if h in headers}
+            record["body"] = body.decode("utf-8")
+            self.log.append(record)
+            self._count("recorded")
+        return response
+
+    # === invoke_model_with_response_stream ===
+    def invoke_model_with_response_stream(self, **kwargs) -> dict:
+        key = request_key(kwargs.get("modelId", ""), kwargs.get("body", ""))
+        if self.mode == "replay":
+            record = self.log.next_for(key)
+            if record is not None:
+                self._count("replayed")
+                if "error" in record:
+                    self._wait(record["latency_ms"])
+                    self._raise_recorded(record, "InvokeModelWithResponseStream")
+                return {"body": _ReplayedStream(record["events"], self.speed)}
+            self._miss(key, kwargs.get("modelId", ""))
+            return self.client.invoke_model_with_response_stream(**kwargs)
+
+        started = time.perf_counter()
+        try:
+            response = self.client.invoke_model_with_response_stream(**kwargs)
+        except Exception as e:
+            if self.mode == "record":
+                self._record_error("InvokeModelWithResponseStream", key, kwargs, started, e)
+            raise
+        if self.mode == "record":
+            response["body"] = _RecordingStream(response["body"], self, key, kwargs, started)
+        return response
+
+    def get_stats(self) -> dict:
+        with self._stats_lock:
+            return {"mode": self.mode, "path": self.log.path, **self.stats}
+
+    def __getattr__(self, name):
+        # anything else (converse, meta, ...) goes straight to the real client
+        return getattr(self.client, name)
+
+
+class _RecordingStream:
+    """Passes stream events through and logs them with their offsets once the stream ends."""
+
+    def __init__(self, stream, owner: ReplayClient, key, kwargs, started):
+        self._stream = stream
+        self._owner = owner
+        self._key = key
+        self._kwargs = kwargs
+        self._started = started
+        self._events = []
+        self._logged = False
+
+    def __iter__(self):
+        try:
+            for event in self._stream:
+                chunk = event.get("chunk")
+                if chunk:
+                    offset = round((time.perf_counter() - self._started) * 1000, 2)
+                    self._events.append([offset, json.loads(chunk["bytes"])])
+                yield event
+        finally:
+            self.close()
+
+    def close(self):
+        close = getattr(self._stream, "close", None)
+        if close:
+            close()
+        if not self._logged:
+            self._logged = True
+            record = ReplayClient._record_base("InvokeModelWithResponseStream", self._key, self._kwargs, self._started)
+            record["events"] = self._events
+            self._owner.log.append(record)
+            self._owner._count("recorded")
+
+
+class _ReplayedStream:
+    """Replays recorded stream events at their recorded offsets / speed."""
+
+    def __init__(self, events, speed):
+        self._events = events
+        self._speed = speed
+
+    def __iter__(self):
+        started = time.perf_counter()
+        for offset_ms, event in self._events:
+            if self._speed > 0:
+                delay = offset_ms / self._speed / 1000 - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            yield {"chunk": {"bytes": json.dumps(event).encode("utf-8")}}
+
+    def close(self):
+        pass
+
+
+def wrap_client(client):
+    """The client itself when BEDROCK_REPLAY_MODE=off, else a recording or replaying wrapper."""
+    if BEDROCK_REPLAY_MODE not in ("record", "replay"):
+        if BEDROCK_REPLAY_MODE != "off":
+            logging.warning(f"Unknown BEDROCK_REPLAY_MODE={BEDROCK_REPLAY_MODE}; calling Bedrock directly")
+        return client
+    logging.info(f"Bedrock {BEDROCK_REPLAY_MODE} mode: {BEDROCK_REPLAY_PATH} (speed={BEDROCK_REPLAY_SPEED}x)")
+    return ReplayClient(client)
+
+
+# === CLI ===
+def summarize(path=BEDROCK_REPLAY_PATH) -> dict:
+    """Calls, errors, tokens and latency per model in a replay log."""
+    models = defaultdict(lambda: {"calls": 0, "errors": 0, "input_tokens": 0, "output_tokens": 0, "latency_ms": 0.0})
+    for record in _read_records(path):
+        stats = models[record["model"]]
+        stats["calls"] += 1
+        stats["errors"] += "error" in record
+        stats["latency_ms"] += record["latency_ms"]
+        headers = record.get("headers", {})
+        stats["input_tokens"] += int(headers.get(TOKEN_HEADERS[0], 0))
+        stats["output_tokens"] += int(headers.get(TOKEN_HEADERS[1], 0))
+        for _, event in record.get("events", []):
+            usage = event.get("amazon-bedrock-invocationMetrics")
+            if usage:
+                stats["input_tokens"] += usage.get("inputTokenCount", 0)
+                stats["output_tokens"] += usage.get("outputTokenCount", 0)
+    for stats in models.values():
+        stats["avg_latency_ms"] = round(stats.pop("latency_ms") / stats["calls"], 2)
+    return dict(models)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarize a Bedrock record/replay log")
+    parser.add_argument("path", nargs="?", default=BEDROCK_REPLAY_PATH)
+    args = parser.parse_args(argv)
+    print(json.dumps(summarize(args.path), indent=2))
+
+
+if __name__ == "__main__":
+    main()
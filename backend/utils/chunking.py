@@ -0,0 +1,146 @@
+import os
+import re
+import json
+import hashlib
+
+# === Chunking Config ===
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "512"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "64"))
+
+# Rough stand-in for the Titan tokenizer: words and punctuation each count as
+# one token, which tracks BPE counts closely enough for sizing chunks. Long
+# unbroken runs (hashes, base64) are split by BPE too: ~4 chars per token.
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_LONG_WORD_CHARS = 16
+_MD_HEADING_RE = re.compile(r"^#{1,6}\s", re.MULTILINE)
+
+
+def count_tokens(text: str) -> int:
+    return sum(1 if len(t) <= _LONG_WORD_CHARS else -(-len(t) // 4) for t in _TOKEN_RE.findall(text))
+
+
+def chunk_hash(text: str) -> str:
+    """Hash of the whitespace-normalized chunk, used to dedupe embeddings."""
+    normalized = " ".join(text.split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+# === Structural Units ===
+def _json_units(content: str) -> list:
+    try:
+        data = json.loads(content)
+    except ValueError:
+        # JSON lines: one record per line
+        return [line for line in content.splitlines() if line.strip()]
+    if isinstance(data, list):
+        return [json.dumps(item, ensure_ascii=False) for item in data]
+    if isinstance(data, dict):
+        return [json.dumps({key: value}, ensure_ascii=False) for key, value in data.items()]
+    return [content]
+
+
+def _markdown_units(content: str) -> list:
+    """One unit per heading section; the heading stays with its body."""
+    starts = [m.start() for m in _MD_HEADING_RE.finditer(content)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    starts.append(len(content))
+    return [content[a:b].strip() for a, b in zip(starts, starts[1:]) if content[a:b].strip()]
+
+
+def _line_units(content: str) -> list:
+    return [line for line in content.splitlines() if line.strip()]
+
+
+def _fit_span(text: str, start: int, end: int, max_tokens: int) -> list:
+    """(start, end, tokens) spans of at most max_tokens; a word longer than that is cut by characters."""
+    tokens = count_tokens(text[start:end]) or 1
+    if tokens <= max_tokens:
+        return [(start, end, tokens)]
+    step = max((end - start) * max_tokens // tokens, 1)
+    spans = []
+    for a in range(start, end, step):
+        spans.extend(_fit_span(text, a, min(a + step, end), max_tokens))
+    return spans
+
+
+def _split_long_unit(unit: str, max_tokens: int, overlap_tokens: int) -> list:
+    """
+    Sliding windows of up to max_tokens over a single unit larger than a
+    chunk; each window starts with the last ~overlap_tokens of the previous
+    one. Text without whitespace (base64, minified blobs) is cut by characters.
+    """
+    spans = []
+    for match in re.finditer(r"\S+", unit):
+        spans.extend(_fit_span(unit, match.start(), match.end(), max_tokens))
+    pieces, i = [], 0
+    while i < len(spans):
+        j, tokens = i, 0
+        while j < len(spans) and (j == i or tokens + spans[j][2] <= max_tokens):
+            tokens += spans[j][2]
+            j += 1
+        pieces.append(unit[spans[i][0]:spans[j - 1][1]])
+        if j == len(spans):
+            break
+        # step back so the next window repeats the tail of this one
+        k, back = j, 0
+        while k - 1 > i and back + spans[k - 1][2] <= overlap_tokens:
+            k -= 1
+            back += spans[k][2]
+        i = k
+    return pieces
+
+
+# === Chunker ===
+def chunk_document(path: str, content: str, max_tokens: int = None, overlap_tokens: int = None) -> list:
+    """
+    Splits a dataset file into overlapping chunks of at most `max_tokens`.
+    Units follow the file's structure (JSON records, markdown sections, log
+    or CSV lines) so chunks break on record boundaries; the last units of
+    each chunk, up to `overlap_tokens`, are repeated at the start of the next.
+    CSV chunks repeat the header row.
+    """
+    max_tokens = max_tokens or CHUNK_MAX_TOKENS
+    overlap_tokens = CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+    if not content.strip():
+        return []
+
+    prefix = ""
+    if path.endswith(".json"):
+        units = _json_units(content)
+    elif path.endswith(".md"):
+        units = _markdown_units(content)
+    else:
+        units = _line_units(content)
+        if path.endswith(".csv") and len(units) > 1:
+            prefix, units = units[0] + "\n", units[1:]
+
+    budget = max(max_tokens - count_tokens(prefix), 1)
+    sized = []
+    for unit in units:
+        tokens = count_tokens(unit)
+        if tokens > budget:
+            # the windows overlap each other already; packing only adds overlap between units
+            sized.extend(
+                (piece, count_tokens(piece)) for piece in _split_long_unit(unit, budget, min(overlap_tokens, budget // 2))
+            )
+        else:
+            sized.append((unit, tokens))
+
+    chunks, current, current_tokens = [], [], 0
+    for unit, tokens in sized:
+        if current and current_tokens + tokens > budget:
+            chunks.append(prefix + "\n".join(u for u, _ in current))
+            # carry the tail of this chunk over as overlap
+            carry, carry_tokens = [], 0
+            for prev, prev_tokens in reversed(current):
+                if carry_tokens + prev_tokens > overlap_tokens or carry_tokens + prev_tokens + tokens > budget:
+                    break
+                carry.insert(0, (prev, prev_tokens))
+                carry_tokens += prev_tokens
+            current, current_tokens = carry, carry_tokens
+        current.append((unit, tokens))
+        current_tokens += tokens
+    if current:
+        chunks.append(prefix + "\n".join(u for u, _ in current))
+    return chunks
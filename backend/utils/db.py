@@ -1,10 +1,11 @@
 import os
-import json
-import asyncio
-import asyncpg
-import boto3
 import logging
 from dotenv import load_dotenv
+from utils.embeddings import get_titan_embedding
+from utils.pg import get_pool
+from utils.chunking import chunk_hash
+from utils.answer_cache import answer_cache
+from utils.metrics import stage
 
 # === Logging Config ===
 logging.basicConfig(
@@ -15,48 +16,9 @@ logging.basicConfig(
 # === Load .env variables ===
 load_dotenv()
 
-# === AWS Config ===
-AWS_REGION = os.getenv("AWS_REGION")
-AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
-AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
-AWS_SESSION_TOKEN = os.getenv("AWS_SESSION_TOKEN")
-MODEL_ID = "amazon.titan-embed-text-v2:0"
+# === Embedding Config ===
 EMBED_DIM = 1024  
 
-# === PG DB Config ===
-DB_URL = os.getenv("DATABASE_URL")
-
-# === AWS Bedrock Client ===
-def get_bedrock_client():
-    return boto3.client(
-        "bedrock-runtime",
-        region_name=AWS_REGION,
-        aws_access_key_id=AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-        aws_session_token=AWS_SESSION_TOKEN
-    )
-
-# === Embedding Function ===
-def get_titan_embedding(text: str) -> list:
-    try:
-        client = get_bedrock_client()
-        body = {"inputText": text[:2000]}
-        response = client.invoke_model(
-            modelId=MODEL_ID,
-            body=json.dumps(body),
-            accept="application/json",
-            contentType="application/json"
-        )
-        result = json.loads(response["body"].read())
-        return result["embedding"]
-    except Exception as e:
-        logging.error(f"Embedding failed: {e}")
-        return []
-
-# === DB Pool Setup ===
-async def get_pool():
-    return await asyncpg.create_pool(dsn=DB_URL)
-
 # === Initialize DB ===
 async def init_db(pool):
     async with pool.acquire() as conn:
@@ -66,81 +28,233 @@ async def init_db(pool):
         await conn.execute(f"""
             CREATE TABLE IF NOT EXISTS GrabData (
                 id SERIAL PRIMARY KEY,
-                filepath TEXT UNIQUE,
+                filepath TEXT NOT NULL,
+                chunk_index INT NOT NULL DEFAULT 0,
                 content TEXT,
+                content_hash TEXT,
                 embedding VECTOR({EMBED_DIM})
             );
         """)
-        await conn.execute("DROP INDEX IF EXISTS idx_grabdata_embedding;")
-        await conn.execute(f"""
-            CREATE INDEX IF NOT EXISTS idx_grabdata_embedding
-            ON GrabData USING ivfflat (embedding vector_cosine_ops)
-            WITH (lists = 100);
+        # Tables created before chunking had one row per file (UNIQUE filepath)
+        await conn.execute("ALTER TABLE GrabData ADD COLUMN IF NOT EXISTS chunk_index INT NOT NULL DEFAULT 0;")
+        await conn.execute("ALTER TABLE GrabData ADD COLUMN IF NOT EXISTS content_hash TEXT;")
+        await conn.execute("ALTER TABLE GrabData DROP CONSTRAINT IF EXISTS grabdata_filepath_key;")
+        await conn.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_grabdata_filepath_chunk
+            ON GrabData (filepath, chunk_index);
+        """)
+        await conn.execute("ALTER TABLE GrabData ADD COLUMN IF NOT EXISTS file_mtime DOUBLE PRECISION;")
+        await conn.execute("CREATE INDEX IF NOT EXISTS idx_grabdata_content_hash ON GrabData (content_hash);")
+        # Full-text side of hybrid retrieval (utils/lexical.py); 'simple' keeps ids and codes intact
+        await conn.execute("""
+            ALTER TABLE GrabData ADD COLUMN IF NOT EXISTS content_tsv tsvector
+            GENERATED ALWAYS AS (to_tsvector('simple', coalesce(content, ''))) STORED;
         """)
+        await conn.execute("CREATE INDEX IF NOT EXISTS idx_grabdata_content_tsv ON GrabData USING gin (content_tsv);")
+        # One row per indexed file, used by incremental sync to skip unchanged files
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS GrabFiles (
+                filepath TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                mtime DOUBLE PRECISION NOT NULL,
+                size BIGINT NOT NULL,
+                chunk_count INT NOT NULL,
+                indexed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            );
+        """)
+        # the vector index is built after loading, see utils/pg_index.py
         logging.info("✅ DB initialized.")
+    # connections opened before CREATE EXTENSION have no vector codec yet
+    await pool.expire_connections()
 
 # === Insert Chunk ===
-async def insert_chunk(pool, filepath, content, embedding):
-    if not embedding:
-        logging.warning(f"Skipping {filepath} due to empty embedding.")
-        return
-    if len(embedding) != EMBED_DIM:
-        logging.error(f"Insert failed for {filepath}: expected {EMBED_DIM} dimensions, got {len(embedding)}")
-        return
+INSERT_CHUNK_SQL = """
+    INSERT INTO GrabData (filepath, chunk_index, content, content_hash, embedding)
+    VALUES ($1, $2, $3, $4, $5::vector)
+    ON CONFLICT (filepath, chunk_index) DO UPDATE
+    SET content = EXCLUDED.content,
+        content_hash = EXCLUDED.content_hash,
+        embedding = EXCLUDED.embedding;
+"""
+
+async def insert_chunk(pool, filepath, content, embedding, chunk_index=0):
+    try:
+        written = await insert_chunks(pool, [(filepath, chunk_index, content, chunk_hash(content), embedding)])
+        if written:
+            logging.info(f"Inserted: {filepath}#{chunk_index}")
+    except Exception as e:
+        logging.error(f"Insert failed for {filepath}#{chunk_index}: {e}")
 
-    embedding_str = "[" + ",".join(str(x) for x in embedding) + "]"
+# === Insert Chunks (batched) ===
+async def insert_chunks(pool, rows):
+    """
+    Bulk upsert of (filepath, chunk_index, content, content_hash, embedding)
+    rows in one executemany round trip. Rows with a missing or wrong-sized
+    embedding are skipped. Returns the number of rows sent to the database.
+    """
+    records = []
+    for filepath, chunk_index, content, content_hash, embedding in rows:
+        dims = 0 if embedding is None else len(embedding)
+        if dims != EMBED_DIM:
+            logging.warning(f"Skipping {filepath}#{chunk_index}: bad embedding ({dims} dims)")
+            continue
+        records.append((filepath, chunk_index, content, content_hash, embedding))
+    if not records:
+        return 0
+    with stage("db"):
+        async with pool.acquire() as conn:
+            await conn.executemany(INSERT_CHUNK_SQL, records)
+    answer_cache.invalidate_files({record[0] for record in records})
+    return len(records)
 
+# === Incremental Sync Helpers ===
+async def load_file_manifest(pool) -> dict:
+    """filepath -> (content_hash, mtime, size) for every indexed file."""
     async with pool.acquire() as conn:
-        try:
-            await conn.execute("""
-                INSERT INTO GrabData (filepath, content, embedding)
-                VALUES ($1, $2, $3::vector)
-                ON CONFLICT (filepath) DO NOTHING;
-            """, filepath, content, embedding_str)
-            logging.info(f"Inserted: {filepath}")
-        except Exception as e:
-            logging.error(f"Insert failed for {filepath}: {e}")
+        rows = await conn.fetch("SELECT filepath, content_hash, mtime, size FROM GrabFiles")
+    return {r["filepath"]: (r["content_hash"], r["mtime"], r["size"]) for r in rows}
 
-# === Fetch Similar ===
-async def fetch_similar(pool, embedding, limit=5):
-    embedding_str = "[" + ",".join(str(x) for x in embedding) + "]"
+async def fetch_chunk_hashes(pool, filepath) -> dict:
+    """chunk_index -> content_hash currently stored for one file."""
     async with pool.acquire() as conn:
         rows = await conn.fetch(
-            "SELECT filepath, content FROM GrabData ORDER BY embedding <-> $1::vector LIMIT $2",
-            embedding_str, limit
+            "SELECT chunk_index, content_hash FROM GrabData WHERE filepath = $1", filepath
         )
-        return rows
+    return {r["chunk_index"]: r["content_hash"] for r in rows}
+
+async def fetch_embeddings_by_hash(pool, content_hashes) -> dict:
+    """content_hash -> embedding already stored for an identical chunk, in one round trip."""
+    if not content_hashes:
+        return {}
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(
+            """
+            SELECT DISTINCT ON (content_hash) content_hash, embedding FROM GrabData
+            WHERE content_hash = ANY($1::text[]) AND embedding IS NOT NULL
+            """,
+            list(content_hashes)
+        )
+    return {r["content_hash"]: r["embedding"] for r in rows}
+
+async def finalize_files(pool, entries):
+    """
+    Records (filepath, content_hash, mtime, size, chunk_count) for files whose
+    chunks were all written, and drops chunk rows past the new chunk count.
+    """
+    if not entries:
+        return
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            await conn.executemany(
+                "DELETE FROM GrabData WHERE filepath = $1 AND chunk_index >= $2",
+                [(path, count) for path, _, _, _, count in entries]
+            )
+            await conn.executemany(
+                "UPDATE GrabData SET file_mtime = $2 WHERE filepath = $1",
+                [(path, mtime) for path, _, mtime, _, _ in entries]
+            )
+            await conn.executemany("""
+                INSERT INTO GrabFiles (filepath, content_hash, mtime, size, chunk_count)
+                VALUES ($1, $2, $3, $4, $5)
+                ON CONFLICT (filepath) DO UPDATE
+                SET content_hash = EXCLUDED.content_hash,
+                    mtime = EXCLUDED.mtime,
+                    size = EXCLUDED.size,
+                    chunk_count = EXCLUDED.chunk_count,
+                    indexed_at = now();
+            """, entries)
+    # trailing chunks may have been trimmed
+    answer_cache.invalidate_files([path for path, _, _, _, _ in entries])
+
+async def touch_files(pool, entries):
+    """Updates mtime/size for (filepath, mtime, size) whose content did not change."""
+    if not entries:
+        return
+    async with pool.acquire() as conn:
+        await conn.executemany(
+            "UPDATE GrabFiles SET mtime = $2, size = $3 WHERE filepath = $1", entries
+        )
+
+async def delete_files(pool, filepaths):
+    """Removes every chunk and the manifest row for files gone from disk."""
+    if not filepaths:
+        return
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            await conn.execute("DELETE FROM GrabData WHERE filepath = ANY($1::text[])", list(filepaths))
+            await conn.execute("DELETE FROM GrabFiles WHERE filepath = ANY($1::text[])", list(filepaths))
+    answer_cache.invalidate_files(filepaths)
+    logging.info(f"Removed {len(filepaths)} deleted files from the index.")
+
+# === Fetch Similar ===
+async def fetch_similar(pool, embedding, limit=5):
+    with stage("db"):
+        async with pool.acquire() as conn:
+            rows = await conn.fetch(
+                "SELECT filepath, content FROM GrabData ORDER BY embedding <=> $1::vector LIMIT $2",
+                embedding, limit
+            )
+            return rows
 
 # === Load Dataset Files ===
-def load_all_files(root=None):
-    if root is None:
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        root = os.path.abspath(os.path.join(script_dir, "../../datasets"))
+DATASET_EXTENSIONS = (".txt", ".md", ".log", ".json", ".csv")
+
+def default_dataset_root():
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.abspath(os.path.join(script_dir, "../../datasets"))
 
+def list_dataset_files(root=None):
+    if root is None:
+        root = default_dataset_root()
     for dirpath, _, filenames in os.walk(root):
         for filename in filenames:
             path = os.path.join(dirpath, filename)
-            if path.endswith((".txt", ".md", ".log", ".json", ".csv")):
-                try:
-                    with open(path, "r", encoding="utf-8", errors="ignore") as f:
-                        yield path, f.read()
-                except Exception as e:
-                    logging.error(f"Reading failed for {path}: {e}")
+            if path.endswith(DATASET_EXTENSIONS):
+                yield path
+
+def read_file(path):
+    try:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            return f.read()
+    except Exception as e:
+        logging.error(f"Reading failed for {path}: {e}")
+        return None
+
+def load_all_files(root=None):
+    for path in list_dataset_files(root):
+        content = read_file(path)
+        if content is not None:
+            yield path, content
 
 # === Embed All Files ===
-async def embed_all_files():
+async def embed_all_files(root=None, concurrency=None, batch_size=None, incremental=False, local_index=None,
+                          prepare=True):
+    """
+    Indexes the dataset through the streaming pipeline in utils/ingest.py
+    (concurrent reads and embeddings, batched upserts). With incremental=True
+    only new or changed files and chunks are re-embedded. The vector index
+    is created or resized once the rows are in.
+
+    prepare=False skips init_db and only re-checks the vector index when the
+    pass wrote rows; watch mode prepares once and then syncs this way.
+    """
+    from utils.ingest import run_ingestion
+    from utils.pg_index import ensure_vector_index
+
     pool = await get_pool()
-    await init_db(pool)
-    total = 0
-    for filepath, content in load_all_files():
-        logging.info(f"Processing: {filepath}")
-        short_content = content[:2000]
-        embedding = get_titan_embedding(short_content)
-        await insert_chunk(pool, filepath, short_content, embedding)
-        total += 1
-    logging.info(f"Embedding complete. Total files processed: {total}")
-    await pool.close()
+    if prepare:
+        await init_db(pool)
+    stats = await run_ingestion(
+        pool, root=root, concurrency=concurrency, batch_size=batch_size,
+        incremental=incremental, local_index=local_index,
+    )
+    logging.info(f"Embedding complete. {stats.summary()}")
+    # ivfflat centroids are trained on existing rows, so (re)build after the load
+    if prepare or stats.written:
+        await ensure_vector_index(pool)
+    return stats
 
 # === Entry Point ===
 if __name__ == "__main__":
-    asyncio.run(embed_all_files())
+    from utils.ingest import main
+    main()
@@ -0,0 +1,50 @@
+import json
+import asyncio
+from src.TriageAgent import get_triage_agent
+from src.FraudAgent import get_fraud_detector
+from src.HealingAgent import get_healing_agent
+
+# Downstream agents each triage decision needs
+TRIAGE_DISPATCH = {
+    "fraud": ("fraud",),
+    "healing": ("healing",),
+    "healing_and_fraud": ("fraud", "healing"),
+    "approved": (),
+    "failed": (),
+}
+# Fields downstream agents reason about; ids and timestamps only pad the prompt
+DOWNSTREAM_FIELDS = ("transaction_id", "sender_id", "receiver_id", "amount", "currency", "status", "metadata")
+
+
+def transaction_summary(payload) -> str:
+    """Agent summary for a raw transaction; canonical JSON so key order does not change the prompt or cache key."""
+    return f"Transaction of {json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)}"
+
+
+# === Triage + Dispatch ===
+async def triage_and_dispatch(payload: dict) -> dict:
+    """
+    Triages once, then runs only the agents the decision calls for (fraud,
+    healing, both or none) concurrently. Downstream prompts get the triage
+    reason as their summary and a trimmed payload instead of the full dump.
+    Shared by /run-triage-dispatch and the incident worker.
+    """
+    triage = await get_triage_agent().aroute_request(transaction_summary(payload), payload)
+    decision = str(triage.get("triage_decision", "")).lower()
+    agents = TRIAGE_DISPATCH.get(decision, ())
+
+    summary = f"Triage decision: {decision}. Reason: {triage.get('reason', '')}"
+    trimmed = {key: payload[key] for key in DOWNSTREAM_FIELDS if key in payload}
+    calls = {
+        "fraud": lambda: get_fraud_detector().aanalyze_data(summary, trimmed),
+        "healing": lambda: get_healing_agent().aanalyze_failure(summary, trimmed),
+    }
+    outputs = await asyncio.gather(*(calls[name]() for name in agents))
+
+    response = {"triage": triage, "dispatched": list(agents), "fraud": None, "healing": None}
+    for name, result in zip(agents, outputs):
+        if name == "fraud":
+            response["fraud"] = {"status": "fraud_detected" if result["fraud_detected"] else "clear", "result": result}
+        else:
+            response["healing"] = {"status": "healing_needed" if result["healing_needed"] else "ok", "result": result}
+    return response
@@ -0,0 +1,230 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict
+from utils.bedrock_client import invoke_model, ainvoke_model, run_blocking
+
+# === Titan Config ===
+TITAN_MODEL_ID = "amazon.titan-embed-text-v2:0"
+# Titan v2 accepts up to 8k tokens; chunks are far smaller, this is a guard only
+TITAN_MAX_CHARS = 30000
+
+# === Cache Config ===
+EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+EMBED_CACHE_MEMORY_MB = float(os.getenv("EMBED_CACHE_MEMORY_MB", "64"))
+EMBED_CACHE_DISK_ENABLED = os.getenv("EMBED_CACHE_DISK_ENABLED", "true").lower() in ("1", "true", "yes")
+EMBED_CACHE_DISK_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_DISK_MAX_ENTRIES", "500000"))
+EMBED_CACHE_PATH = os.getenv(
+    "EMBED_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".cache", "embeddings.sqlite"),
+)
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(model_id: str, text: str) -> str:
+    return hashlib.sha256(f"{model_id}\n{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+# === Two-tier Cache ===
+class EmbeddingCache:
+    """
+    In-memory LRU (bounded by bytes) in front of a local SQLite store. Both
+    tiers hold vectors as packed float32, keyed by model ID + normalized text
+    hash, so a restarted process or a re-run ingestion keeps its embeddings.
+    """
+
+    def __init__(self, path=EMBED_CACHE_PATH, memory_bytes=None, disk_enabled=EMBED_CACHE_DISK_ENABLED,
+                 disk_max_entries=EMBED_CACHE_DISK_MAX_ENTRIES):
+        self.path = os.path.abspath(path)
+        self.memory_bytes = memory_bytes or int(EMBED_CACHE_MEMORY_MB * 1024 * 1024)
+        self.disk_enabled = disk_enabled
+        self.disk_max_entries = disk_max_entries
+        self._memory = OrderedDict()
+        self._memory_used = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._disk_writes = 0
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+            "disk_errors": 0,
+        }
+
+    # --- memory tier ---
+    def _count(self, name, amount=1):
+        # embed threads share the cache, so every counter moves under the lock
+        with self._lock:
+            self.stats[name] += amount
+
+    def _remember(self, key, blob: bytes):
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old is not None:
+                self._memory_used -= len(old)
+            self._memory[key] = blob
+            self._memory_used += len(blob)
+            while self._memory_used > self.memory_bytes and self._memory:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_used -= len(evicted)
+                self.stats["memory_evictions"] += 1
+
+    # --- disk tier ---
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, model TEXT, vec BLOB, last_used REAL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def _disk_get(self, key):
+        try:
+            conn = self._conn()
+            row = conn.execute("SELECT vec FROM embeddings WHERE key = ?", (key,)).fetchone()
+            if row:
+                conn.execute("UPDATE embeddings SET last_used = ? WHERE key = ?", (time.time(), key))
+                conn.commit()
+            return row[0] if row else None
+        except sqlite3.Error as e:
+            self._count("disk_errors")
+            logging.warning(f"Embedding cache read failed: {e}")
+            return None
+
+    def _disk_put(self, key, model_id, blob):
+        try:
+            conn = self._conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO embeddings (key, model, vec, last_used) VALUES (?, ?, ?, ?)",
+                (key, model_id, blob, time.time()),
+            )
+            conn.commit()
+            with self._lock:
+                self._disk_writes += 1
+                prune = self._disk_writes % 1000 == 0
+            if prune:
+                self._disk_prune(conn)
+        except sqlite3.Error as e:
+            self._count("disk_errors")
+            logging.warning(f"Embedding cache write failed: {e}")
+
+    def _disk_prune(self, conn):
+        (count,) = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        excess = count - self.disk_max_entries
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (excess,)
+            )
+            conn.commit()
+            self._count("disk_evictions", excess)
+
+    # --- public API ---
+    def get(self, model_id: str, text: str):
+        key = cache_key(model_id, text)
+        with self._lock:
+            blob = self._memory.get(key)
+            if blob is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+        if blob is None and self.disk_enabled:
+            blob = self._disk_get(key)
+            if blob is not None:
+                self._count("disk_hits")
+                self._remember(key, blob)
+        if blob is None:
+            self._count("misses")
+            return None
+        return array("f", blob).tolist()
+
+    def put(self, model_id: str, text: str, embedding: list):
+        key = cache_key(model_id, text)
+        blob = array("f", embedding).tobytes()
+        self._remember(key, blob)
+        if self.disk_enabled:
+            self._disk_put(key, model_id, blob)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["memory_entries"] = len(self._memory)
+            stats["memory_bytes"] = self._memory_used
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 3) if lookups else 0.0
+        return stats
+
+
+embedding_cache = EmbeddingCache()
+
+
+# === Titan Embedding ===
+def _titan_request(text: str) -> dict:
+    return {
+        "modelId": TITAN_MODEL_ID,
+        "body": json.dumps({"inputText": text[:TITAN_MAX_CHARS]}),
+        "accept": "application/json",
+        "contentType": "application/json",
+    }
+
+
+def _invoke_titan(text: str) -> list:
+    response = invoke_model(**_titan_request(text))
+    return json.loads(response["body"].read())["embedding"]
+
+
+def get_titan_embedding(text: str) -> list:
+    """Titan embedding for `text`, served from the cache when possible. Returns [] on failure."""
+    if EMBED_CACHE_ENABLED:
+        cached = embedding_cache.get(TITAN_MODEL_ID, text)
+        if cached is not None:
+            return cached
+    try:
+        embedding = _invoke_titan(text)
+    except Exception as e:
+        logging.error(f"Embedding failed: {e}")
+        return []
+    if EMBED_CACHE_ENABLED and embedding:
+        embedding_cache.put(TITAN_MODEL_ID, text, embedding)
+    return embedding
+
+
+async def aget_titan_embedding(text: str) -> list:
+    """
+    Async get_titan_embedding. Cache reads and writes run on the Bedrock
+    executor; the Titan call goes through ainvoke_model, so rate-limit
+    waits stay on the event loop instead of holding a thread.
+    """
+    if EMBED_CACHE_ENABLED:
+        cached = await run_blocking(embedding_cache.get, TITAN_MODEL_ID, text)
+        if cached is not None:
+            return cached
+    try:
+        response = await ainvoke_model(**_titan_request(text))
+        embedding = json.loads(response["body"].read())["embedding"]
+    except Exception as e:
+        logging.error(f"Embedding failed: {e}")
+        return []
+    if EMBED_CACHE_ENABLED and embedding:
+        await run_blocking(embedding_cache.put, TITAN_MODEL_ID, text, embedding)
+    return embedding
+
+
+def get_cache_stats() -> dict:
+    return embedding_cache.get_stats() if EMBED_CACHE_ENABLED else {"enabled": False}
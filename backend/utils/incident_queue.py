@@ -0,0 +1,241 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# === Incident Queue Config ===
+INCIDENT_QUEUE_PATH = os.getenv(
+    "INCIDENT_QUEUE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".cache", "incidents.sqlite"),
+)
+# Enqueue is refused past this many pending incidents (backpressure for producers)
+INCIDENT_QUEUE_MAX_DEPTH = int(os.getenv("INCIDENT_QUEUE_MAX_DEPTH", "100000"))
+# Deliveries before an incident is parked as dead instead of retried
+INCIDENT_MAX_ATTEMPTS = int(os.getenv("INCIDENT_MAX_ATTEMPTS", "5"))
+
+
+class QueueFull(Exception):
+    """Raised by put() when the queue is at max depth; producers should retry later."""
+
+
+class Delivery:
+    def __init__(self, id, payload, attempts, enqueued_at):
+        self.id = id
+        self.payload = payload
+        self.attempts = attempts
+        self.enqueued_at = enqueued_at
+
+
+# === Queue Interface ===
+class IncidentQueue:
+    """
+    At-least-once queue the incident worker consumes. claim() leases items
+    to one consumer; an item that is neither acked nor nacked before its
+    lease expires is delivered again, so a crashed worker loses nothing.
+    Implement these methods to back the worker with a real broker (SQS,
+    Kafka, Redis streams) instead of the local SQLite file.
+    """
+
+    max_attempts = INCIDENT_MAX_ATTEMPTS
+
+    def put(self, payloads) -> list:
+        """Enqueues payloads, returns their ids. Raises QueueFull at max depth."""
+        raise NotImplementedError
+
+    def claim(self, limit: int, lease_seconds: float) -> list:
+        """Leases up to `limit` deliverable items, oldest first, as Delivery objects."""
+        raise NotImplementedError
+
+    def ack(self, ids):
+        """Removes processed items. Call only after their results are persisted."""
+        raise NotImplementedError
+
+    def nack(self, ids, error: str, delay_seconds: float):
+        """Releases items for redelivery after `delay_seconds`; dead after max attempts."""
+        raise NotImplementedError
+
+    def dead_letter(self, ids, error: str):
+        """Parks items as dead at once, for failures a retry cannot fix."""
+        raise NotImplementedError
+
+    def store_results(self, results):
+        """Persists [(Delivery, result dict)]; must be idempotent for redeliveries."""
+        raise NotImplementedError
+
+    def get(self, id):
+        """{"status": "pending" | "dead" | "done", ...} for one item, or None."""
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        """depth, in_flight, dead, done and lag_seconds (age of the oldest pending item)."""
+        raise NotImplementedError
+
+
+# === SQLite Queue ===
+class SQLiteIncidentQueue(IncidentQueue):
+    """
+    Queue and result store in one local SQLite file (WAL), safe to share
+    between the API process (producer) and worker processes (consumers).
+    Leases are claimed in a write transaction, so two workers never get the
+    same item while its lease is live.
+    """
+
+    def __init__(self, path=INCIDENT_QUEUE_PATH, max_depth=INCIDENT_QUEUE_MAX_DEPTH,
+                 max_attempts=INCIDENT_MAX_ATTEMPTS):
+        self.path = os.path.abspath(path)
+        self.max_depth = max_depth
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS incidents ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, payload TEXT NOT NULL, enqueued_at REAL NOT NULL, "
+                "available_at REAL NOT NULL, lease_until REAL, attempts INTEGER NOT NULL DEFAULT 0, "
+                "dead INTEGER NOT NULL DEFAULT 0, last_error TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_incidents_ready ON incidents (dead, available_at, id)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS incident_results ("
+                "id INTEGER PRIMARY KEY, transaction_id TEXT, result TEXT NOT NULL, "
+                "enqueued_at REAL, processed_at REAL NOT NULL, attempts INTEGER)"
+            )
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so concurrent claims serialize
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def put(self, payloads) -> list:
+        now = time.time()
+        with self._transaction() as conn:
+            (depth,) = conn.execute("SELECT COUNT(*) FROM incidents WHERE dead = 0").fetchone()
+            if depth + len(payloads) > self.max_depth:
+                raise QueueFull(f"Incident queue is full ({depth}/{self.max_depth} pending)")
+            return [
+                conn.execute(
+                    "INSERT INTO incidents (payload, enqueued_at, available_at) VALUES (?, ?, ?)",
+                    (json.dumps(payload), now, now),
+                ).lastrowid
+                for payload in payloads
+            ]
+
+    def claim(self, limit: int, lease_seconds: float) -> list:
+        now = time.time()
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT id, payload, attempts, enqueued_at FROM incidents "
+                "WHERE dead = 0 AND available_at <= ? AND (lease_until IS NULL OR lease_until < ?) "
+                "ORDER BY id LIMIT ?",
+                (now, now, limit),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE incidents SET lease_until = ?, attempts = attempts + 1 WHERE id = ?",
+                [(now + lease_seconds, row[0]) for row in rows],
+            )
+        return [Delivery(id, json.loads(payload), attempts + 1, enqueued_at) for id, payload, attempts, enqueued_at in rows]
+
+    def ack(self, ids):
+        if ids:
+            with self._transaction() as conn:
+                conn.executemany("DELETE FROM incidents WHERE id = ?", [(id,) for id in ids])
+
+    def nack(self, ids, error: str, delay_seconds: float):
+        if not ids:
+            return
+        with self._transaction() as conn:
+            conn.executemany(
+                "UPDATE incidents SET lease_until = NULL, available_at = ?, last_error = ?, "
+                "dead = (attempts >= ?) WHERE id = ?",
+                [(time.time() + delay_seconds, error[:2000], self.max_attempts, id) for id in ids],
+            )
+
+    def dead_letter(self, ids, error: str):
+        if not ids:
+            return
+        with self._transaction() as conn:
+            conn.executemany(
+                "UPDATE incidents SET lease_until = NULL, last_error = ?, dead = 1 WHERE id = ?",
+                [(error[:2000], id) for id in ids],
+            )
+
+    def store_results(self, results):
+        if not results:
+            return
+        now = time.time()
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO incident_results "
+                "(id, transaction_id, result, enqueued_at, processed_at, attempts) VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (d.id, d.payload.get("transaction_id") or d.payload.get("id"), json.dumps(result),
+                     d.enqueued_at, now, d.attempts)
+                    for d, result in results
+                ],
+            )
+
+    def get(self, id):
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT result, transaction_id, processed_at, attempts FROM incident_results WHERE id = ?", (id,)
+        ).fetchone()
+        if row:
+            return {"status": "done", "result": json.loads(row[0]), "transaction_id": row[1],
+                    "processed_at": row[2], "attempts": row[3]}
+        row = conn.execute("SELECT dead, attempts, last_error FROM incidents WHERE id = ?", (id,)).fetchone()
+        if row:
+            return {"status": "dead" if row[0] else "pending", "attempts": row[1], "last_error": row[2]}
+        return None
+
+    def stats(self) -> dict:
+        conn = self._conn()
+        now = time.time()
+        depth, in_flight, oldest = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(lease_until >= ?), 0), MIN(enqueued_at) FROM incidents WHERE dead = 0",
+            (now,),
+        ).fetchone()
+        (dead,) = conn.execute("SELECT COUNT(*) FROM incidents WHERE dead = 1").fetchone()
+        (done,) = conn.execute("SELECT COUNT(*) FROM incident_results").fetchone()
+        return {
+            "depth": depth,
+            "in_flight": in_flight,
+            "dead": dead,
+            "done": done,
+            "max_depth": self.max_depth,
+            "lag_seconds": round(now - oldest, 3) if oldest else 0.0,
+        }
+
+
+_queue = None
+
+
+def get_incident_queue() -> IncidentQueue:
+    """Process-wide queue on INCIDENT_QUEUE_PATH."""
+    global _queue
+    if _queue is None:
+        _queue = SQLiteIncidentQueue()
+    return _queue
+
+
+def existing_incident_queue():
+    """The queue if this process uses it or its file exists, else None; never creates the file."""
+    if _queue is None and not os.path.exists(INCIDENT_QUEUE_PATH):
+        return None
+    return get_incident_queue()
@@ -0,0 +1,228 @@
+import os
+import json
+import time
+import signal
+import asyncio
+import logging
+import argparse
+from utils import metrics
+from utils.batch import BATCH_CONCURRENCY, run_bounded
+from utils.bedrock_client import run_blocking, close_replay_log
+from utils.incident_queue import existing_incident_queue, get_incident_queue
+
+# === Incident Worker Config ===
+# Run a worker inside the API process too (default: run `python -m utils.incident_worker` separately)
+INCIDENT_WORKER_ENABLED = os.getenv("INCIDENT_WORKER_ENABLED", "false").lower() in ("1", "true", "yes")
+WORKER_BATCH_SIZE = int(os.getenv("WORKER_BATCH_SIZE", "32"))
+# After a short batch, wait this long once for more incidents before processing
+WORKER_BATCH_WAIT_MS = float(os.getenv("WORKER_BATCH_WAIT_MS", "200"))
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", str(BATCH_CONCURRENCY)))
+WORKER_POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "0.5"))
+# Unacked incidents are redelivered after this; keep well above WORKER_ITEM_TIMEOUT
+WORKER_LEASE_SECONDS = float(os.getenv("WORKER_LEASE_SECONDS", "300"))
+WORKER_ITEM_TIMEOUT = float(os.getenv("WORKER_ITEM_TIMEOUT", "60"))
+# Retry delay doubles per attempt up to WORKER_RETRY_MAX_DELAY
+WORKER_RETRY_DELAY = float(os.getenv("WORKER_RETRY_DELAY", "5"))
+WORKER_RETRY_MAX_DELAY = float(os.getenv("WORKER_RETRY_MAX_DELAY", "300"))
+WORKER_PROGRESS_EVERY = float(os.getenv("WORKER_PROGRESS_EVERY", "10"))
+
+incidents_processed = metrics.register(
+    metrics.Counter("incidents_processed_total", "Incidents handled by the worker, by outcome (done/retry/dead)")
+)
+incident_batch_seconds = metrics.register(
+    metrics.Histogram("incident_batch_seconds", "Time to process and persist one micro-batch")
+)
+
+
+def _agent_errors(result) -> list:
+    """
+    Agents in a triage_and_dispatch result that returned no real answer:
+    fraud and healing turn Bedrock errors into updated_status ERROR, and
+    unparsable model output is kept under "raw".
+    """
+    if not isinstance(result, dict):
+        return []
+    results = {"triage": result.get("triage")}
+    for name in ("fraud", "healing"):
+        if isinstance(result.get(name), dict):
+            results[name] = result[name].get("result")
+    return [
+        name for name, r in results.items()
+        if isinstance(r, dict) and ("raw" in r or r.get("updated_status") == "ERROR")
+    ]
+
+
+class InvalidIncident(ValueError):
+    """A payload no retry can process; it goes straight to dead-letter."""
+
+
+def _default_handler():
+    # the agents pull in the whole triage stack; load it when a worker starts, not on import
+    from utils.dispatch import triage_and_dispatch
+    return triage_and_dispatch
+
+
+# === Worker ===
+class IncidentWorker:
+    """
+    Consumes the incident queue in micro-batches: claim up to batch_size
+    incidents, run `handler(payload)` on them with at most `concurrency`
+    in flight (the rule fast path, then triage and the fraud/healing agents
+    it dispatches), persist the results, then ack. A crash between persist
+    and ack redelivers the batch, so delivery is at-least-once and results
+    are stored idempotently by queue id. Failed incidents, including ones an
+    agent answered with an error or unparsable output, are retried with
+    backoff and parked as dead after INCIDENT_MAX_ATTEMPTS; invalid payloads
+    are parked as dead on their first delivery.
+
+    Only claimed incidents are in memory, so a storm grows the queue (see
+    lag_seconds) instead of the number of concurrent Bedrock calls.
+    """
+
+    def __init__(self, queue=None, handler=None, batch_size=WORKER_BATCH_SIZE, concurrency=WORKER_CONCURRENCY,
+                 batch_wait_ms=WORKER_BATCH_WAIT_MS, lease_seconds=WORKER_LEASE_SECONDS):
+        self.queue = queue or get_incident_queue()
+        self.handler = handler or _default_handler()
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.batch_wait_ms = batch_wait_ms
+        self.lease_seconds = lease_seconds
+        self._stopping = asyncio.Event()
+        self.stats = {"batches": 0, "done": 0, "retried": 0, "dead": 0}
+
+    async def _claim(self) -> list:
+        deliveries = await run_blocking(self.queue.claim, self.batch_size, self.lease_seconds)
+        if deliveries and len(deliveries) < self.batch_size and self.batch_wait_ms > 0:
+            await asyncio.sleep(self.batch_wait_ms / 1000)
+            deliveries += await run_blocking(self.queue.claim, self.batch_size - len(deliveries), self.lease_seconds)
+        return deliveries
+
+    async def _handle(self, delivery):
+        if not isinstance(delivery.payload, dict):
+            raise InvalidIncident("Incident payload must be a JSON object")
+        result = await asyncio.wait_for(self.handler(delivery.payload), WORKER_ITEM_TIMEOUT)
+        # an error result is not an answer: retry it instead of acking it as done
+        failed = _agent_errors(result)
+        if failed:
+            raise RuntimeError(f"Agent(s) returned no result: {', '.join(failed)}")
+        return result
+
+    async def process_batch(self, deliveries) -> dict:
+        started = time.perf_counter()
+        done, failed, invalid = [], [], []
+        async for index, result, error in run_bounded(self._handle, deliveries, self.concurrency):
+            delivery = deliveries[index]
+            if error is None:
+                done.append((delivery, result))
+            elif isinstance(error, InvalidIncident):
+                invalid.append((delivery, f"{type(error).__name__}: {error}"))
+            else:
+                failed.append((delivery, f"{type(error).__name__}: {error}"))
+
+        # persist before ack: a crash in between only causes a redelivery
+        await run_blocking(self.queue.store_results, done)
+        await run_blocking(self.queue.ack, [delivery.id for delivery, _ in done])
+        for delivery, error in failed:
+            delay = min(WORKER_RETRY_DELAY * 2 ** (delivery.attempts - 1), WORKER_RETRY_MAX_DELAY)
+            await run_blocking(self.queue.nack, [delivery.id], error, delay)
+            outcome = "dead" if delivery.attempts >= self.queue.max_attempts else "retry"
+            logging.warning(f"[worker] incident {delivery.id} attempt {delivery.attempts} failed ({outcome}): {error}")
+            incidents_processed.inc(outcome=outcome)
+            self.stats["dead" if outcome == "dead" else "retried"] += 1
+        for delivery, error in invalid:
+            await run_blocking(self.queue.dead_letter, [delivery.id], error)
+            logging.warning(f"[worker] incident {delivery.id} is invalid (dead): {error}")
+            incidents_processed.inc(outcome="dead")
+            self.stats["dead"] += 1
+
+        incidents_processed.inc(len(done), outcome="done")
+        incident_batch_seconds.observe(time.perf_counter() - started)
+        self.stats["batches"] += 1
+        self.stats["done"] += len(done)
+        return {"done": len(done), "failed": len(failed) + len(invalid)}
+
+    async def run(self):
+        logging.info(
+            f"[worker] consuming incidents (batch={self.batch_size}, concurrency={self.concurrency}, "
+            f"lease={self.lease_seconds}s)"
+        )
+        last_report = time.perf_counter()
+        while not self._stopping.is_set():
+            try:
+                deliveries = await self._claim()
+                if deliveries:
+                    await self.process_batch(deliveries)
+                else:
+                    try:
+                        await asyncio.wait_for(self._stopping.wait(), WORKER_POLL_INTERVAL)
+                    except asyncio.TimeoutError:
+                        pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # claimed items stay leased and come back after the lease expires
+                logging.error(f"[worker] batch failed: {e}")
+                await asyncio.sleep(WORKER_POLL_INTERVAL)
+            if time.perf_counter() - last_report >= WORKER_PROGRESS_EVERY:
+                last_report = time.perf_counter()
+                queue_stats = await run_blocking(self.queue.stats)
+                logging.info(f"[worker] {self.stats} queue={queue_stats}")
+        logging.info(f"[worker] stopped: {self.stats}")
+
+    def stop(self):
+        """Finishes the current batch, then returns from run()."""
+        self._stopping.set()
+
+
+def queue_metrics():
+    """Queue depth, in-flight, dead and lag for /metrics, read at scrape time."""
+    queue = existing_incident_queue()
+    if queue is None:
+        return {}
+    stats = queue.stats()
+    return {
+        ("incident_queue_depth", "gauge", "Incidents waiting or leased"): {(): stats["depth"]},
+        ("incident_queue_in_flight", "gauge", "Incidents leased to a worker"): {(): stats["in_flight"]},
+        ("incident_queue_dead", "gauge", "Incidents parked after max attempts"): {(): stats["dead"]},
+        ("incident_queue_lag_seconds", "gauge", "Age of the oldest pending incident"): {(): stats["lag_seconds"]},
+    }
+
+
+# === CLI ===
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Incident queue worker")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run", help="consume the queue until interrupted")
+    run.add_argument("--batch-size", type=int, default=WORKER_BATCH_SIZE)
+    run.add_argument("--concurrency", type=int, default=WORKER_CONCURRENCY)
+    enqueue = sub.add_parser("enqueue", help="enqueue transactions from a JSON file (object or list)")
+    enqueue.add_argument("path")
+    sub.add_parser("stats", help="print queue depth, dead items and lag")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    queue = get_incident_queue()
+    if args.command == "enqueue":
+        with open(args.path, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+        ids = queue.put(payload if isinstance(payload, list) else [payload])
+        print(json.dumps({"queued": len(ids), **queue.stats()}))
+    elif args.command == "stats":
+        print(json.dumps(queue.stats(), indent=2))
+    else:
+        async def _run():
+            worker = IncidentWorker(queue, batch_size=args.batch_size, concurrency=args.concurrency)
+            loop = asyncio.get_running_loop()
+            # SIGTERM (pod shutdown) and Ctrl-C finish the current batch before exiting
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                loop.add_signal_handler(sig, worker.stop)
+            await worker.run()
+
+        try:
+            asyncio.run(_run())
+        finally:
+            close_replay_log()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,378 @@
+import os
+import time
+import asyncio
+import hashlib
+import logging
+import argparse
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from utils.db import (
+    get_titan_embedding,
+    insert_chunks,
+    list_dataset_files,
+    read_file,
+    default_dataset_root,
+    load_file_manifest,
+    fetch_chunk_hashes,
+    fetch_embeddings_by_hash,
+    finalize_files,
+    touch_files,
+    delete_files,
+)
+from utils.chunking import chunk_document, chunk_hash
+
+# === Pipeline Config ===
+INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", "8"))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "256"))
+INGEST_READ_WORKERS = int(os.getenv("INGEST_READ_WORKERS", "4"))
+INGEST_PROGRESS_EVERY = float(os.getenv("INGEST_PROGRESS_EVERY", "5"))
+# Distinct chunk embeddings remembered for dedupe during one run
+INGEST_DEDUPE_MAX = int(os.getenv("INGEST_DEDUPE_MAX", "20000"))
+WATCH_INTERVAL = float(os.getenv("WATCH_INTERVAL", "10"))
+
+_DONE = object()
+
+
+# === Progress / Throughput ===
+class IngestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.read = 0
+        self.unchanged = 0
+        self.removed = 0
+        self.chunks = 0
+        self.embedded = 0
+        self.deduped = 0
+        self.reused = 0
+        self.written = 0
+        self.failed = 0
+        self.failed_paths = set()
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def summary(self) -> str:
+        elapsed = self.elapsed()
+        rate = self.written / elapsed if elapsed > 0 else 0.0
+        return (
+            f"read={self.read} unchanged={self.unchanged} removed={self.removed} "
+            f"chunks={self.chunks} embedded={self.embedded} deduped={self.deduped} "
+            f"reused={self.reused} written={self.written} "
+            f"failed={self.failed} elapsed={elapsed:.1f}s rate={rate:.2f} rows/s"
+        )
+
+
+async def _report_progress(stats: IngestStats, every: float):
+    while True:
+        await asyncio.sleep(every)
+        logging.info(f"[ingest] {stats.summary()}")
+
+
+# === Plan: what changed on disk ===
+def _stat_files(root):
+    disk = {}
+    for path in list_dataset_files(root):
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        disk[path] = (st.st_mtime, st.st_size)
+    return disk
+
+
+async def _plan(pool, root, incremental, executor):
+    """
+    Returns (disk, manifest, to_read, removed). Files whose mtime and size
+    match the manifest are not even opened in incremental mode.
+    """
+    loop = asyncio.get_running_loop()
+    disk = await loop.run_in_executor(executor, _stat_files, root)
+    manifest = await load_file_manifest(pool)
+    prefix = root.rstrip(os.sep) + os.sep
+    removed = [path for path in manifest if path.startswith(prefix) and path not in disk]
+    if incremental:
+        to_read = [
+            path for path, (mtime, size) in disk.items()
+            if path not in manifest or manifest[path][1:] != (mtime, size)
+        ]
+    else:
+        to_read = list(disk)
+    return disk, manifest, to_read, removed
+
+
+# === Stage 1: read + chunk files ===
+def _read_and_chunk(path):
+    content = read_file(path)
+    if content is None:
+        return None, None
+    file_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    chunks = [(index, text, chunk_hash(text)) for index, text in enumerate(chunk_document(path, content))]
+    return file_hash, chunks
+
+
+async def _read_stage(pool, paths, disk, manifest, incremental, read_q: asyncio.Queue,
+                      stats: IngestStats, workers: int, executor, pending: dict, touched: list):
+    """
+    `workers` readers each take the next path only after every chunk of the
+    previous one is queued, so at most `workers` files are held in memory
+    and a full read_q stalls reading (backpressure).
+    """
+    loop = asyncio.get_running_loop()
+    remaining = iter(paths)
+
+    async def read_one(path):
+        file_hash, chunks = await loop.run_in_executor(executor, _read_and_chunk, path)
+        if chunks is None:
+            stats.failed += 1
+            return
+        stats.read += 1
+        mtime, size = disk[path]
+        known = manifest.get(path)
+        if incremental and known and known[0] == file_hash:
+            # touched but not edited
+            stats.unchanged += 1
+            touched.append((path, mtime, size))
+            return
+        stored = await fetch_chunk_hashes(pool, path) if incremental and known else {}
+        pending[path] = (path, file_hash, mtime, size, len(chunks))
+        changed = [chunk for chunk in chunks if stored.get(chunk[0]) != chunk[2]]
+        reusable = await _lookup_embeddings(pool, {content_hash for _, _, content_hash in changed})
+        for index, text, content_hash in changed:
+            stats.chunks += 1
+            # put() blocks when the embed stage falls behind (backpressure)
+            await read_q.put((path, index, text, content_hash, reusable.get(content_hash)))
+
+    async def reader():
+        # the iterator is shared; next() never awaits, so each path goes to one reader
+        for path in remaining:
+            await read_one(path)
+
+    await asyncio.gather(*(reader() for _ in range(workers)))
+
+
+# === Stage 2: embed with bounded concurrency ===
+async def _lookup_embeddings(pool, content_hashes):
+    """Embeddings already in GrabData for a file's changed chunks, one query per file."""
+    try:
+        return await fetch_embeddings_by_hash(pool, content_hashes)
+    except Exception as e:
+        logging.warning(f"[ingest] Embedding lookup failed: {e}")
+        return {}
+
+
+async def _embed_one(text, executor, stats: IngestStats):
+    embedding = await asyncio.get_running_loop().run_in_executor(executor, get_titan_embedding, text)
+    if len(embedding):
+        stats.embedded += 1
+    return embedding
+
+
+async def _embed_worker(read_q: asyncio.Queue, write_q: asyncio.Queue, stats: IngestStats,
+                        executor, embedded: OrderedDict):
+    """
+    `embedded` maps content_hash -> Future shared by all workers, so a chunk
+    that appears in several files (or twice in one) is embedded only once.
+    It is bounded LRU-style to INGEST_DEDUPE_MAX entries. Chunks already in
+    GrabData under the same hash (looked up once per file by the read stage)
+    reuse the stored vector instead of Titan.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        item = await read_q.get()
+        if item is _DONE:
+            return
+        path, index, text, content_hash, stored = item
+        future = embedded.get(content_hash)
+        if stored is not None:
+            stats.reused += 1
+            embedding = stored
+        elif future is None:
+            future = embedded[content_hash] = loop.create_future()
+            if len(embedded) > INGEST_DEDUPE_MAX:
+                embedded.popitem(last=False)
+            embedding = []
+            try:
+                embedding = await _embed_one(text, executor, stats)
+            finally:
+                # never leave duplicate waiters hanging on a failed call
+                future.set_result(embedding)
+        else:
+            embedded.move_to_end(content_hash)
+            embedding = await future
+            stats.deduped += 1
+        if embedding is None or not len(embedding):
+            stats.failed += 1
+            stats.failed_paths.add(path)
+            continue
+        await write_q.put((path, index, text, content_hash, embedding))
+
+
+# === Stage 3: batched writes ===
+async def _write_stage(pool, write_q: asyncio.Queue, stats: IngestStats, batch_size: int, local_index=None):
+    batch = []
+    while True:
+        item = await write_q.get()
+        if item is not _DONE:
+            batch.append(item)
+        if batch and (len(batch) >= batch_size or item is _DONE):
+            try:
+                written = await insert_chunks(pool, batch)
+                stats.written += written
+                if local_index is not None:
+                    local_index.add(batch)
+                if written != len(batch):
+                    stats.failed += len(batch) - written
+                    stats.failed_paths.update(row[0] for row in batch)
+            except Exception as e:
+                logging.error(f"[ingest] Batch insert of {len(batch)} rows failed: {e}")
+                stats.failed += len(batch)
+                stats.failed_paths.update(row[0] for row in batch)
+            batch = []
+        if item is _DONE:
+            return
+
+
+# === Pipeline ===
+async def run_ingestion(pool, root=None, concurrency=None, batch_size=None, queue_size=None, incremental=False,
+                        local_index=None):
+    """
+    Streams dataset files through read/chunk -> embed -> write stages
+    connected by bounded queues. Embedding calls run on a dedicated executor
+    sized to `concurrency`, once per distinct chunk; upserts go out in
+    executemany batches of `batch_size`.
+
+    Every run records a content hash and mtime per file in GrabFiles and
+    removes rows for files deleted from disk. With incremental=True, files
+    whose mtime/size or content hash are unchanged are skipped, and only
+    chunks whose hash changed are re-embedded.
+
+    When `local_index` (utils/local_index.LocalVectorIndex) is given it gets
+    the same adds, trims and deletes as GrabData and is saved at the end.
+    """
+    root = os.path.abspath(root or default_dataset_root())
+    concurrency = concurrency or INGEST_CONCURRENCY
+    batch_size = batch_size or INGEST_BATCH_SIZE
+    queue_size = queue_size or INGEST_QUEUE_SIZE
+
+    stats = IngestStats()
+    read_q = asyncio.Queue(maxsize=queue_size)
+    write_q = asyncio.Queue(maxsize=queue_size)
+    read_executor = ThreadPoolExecutor(max_workers=INGEST_READ_WORKERS, thread_name_prefix="ingest-read")
+    embed_executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="ingest-embed")
+    progress = asyncio.create_task(_report_progress(stats, INGEST_PROGRESS_EVERY))
+    pending, touched = {}, []
+    workers = []
+
+    try:
+        disk, manifest, to_read, removed = await _plan(pool, root, incremental, read_executor)
+        logging.info(
+            f"[ingest] {len(disk)} files under {root}: {len(to_read)} to read, {len(removed)} removed"
+        )
+        await delete_files(pool, removed)
+        stats.removed = len(removed)
+        if local_index is not None:
+            local_index.remove_files(removed)
+
+        writer = asyncio.create_task(_write_stage(pool, write_q, stats, batch_size, local_index))
+        embedded = OrderedDict()
+        embedders = [
+            asyncio.create_task(_embed_worker(read_q, write_q, stats, embed_executor, embedded))
+            for _ in range(concurrency)
+        ]
+        workers = embedders + [writer]
+        await _read_stage(
+            pool, to_read, disk, manifest, incremental, read_q,
+            stats, INGEST_READ_WORKERS, read_executor, pending, touched,
+        )
+        for _ in embedders:
+            await read_q.put(_DONE)
+        await asyncio.gather(*embedders)
+        await write_q.put(_DONE)
+        await writer
+
+        # Files with a failed chunk keep their old manifest entry and are retried next run
+        finished = [e for path, e in pending.items() if path not in stats.failed_paths]
+        await finalize_files(pool, finished)
+        await touch_files(pool, touched)
+        if local_index is not None:
+            for path, _, _, _, chunk_count in finished:
+                local_index.trim_file(path, chunk_count)
+            local_index.save()
+    finally:
+        progress.cancel()
+        # a failed read or embed stage never sends _DONE; don't leave the others blocked on their queues
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        read_executor.shutdown(wait=False)
+        embed_executor.shutdown(wait=False)
+
+    logging.info(f"[ingest] done: {stats.summary()}")
+    return stats
+
+
+# === Watch Mode ===
+async def watch_dataset(root=None, concurrency=None, batch_size=None, interval=None, local_index=None):
+    """
+    Keeps GrabData in step with the dataset directory by running an
+    incremental sync every `interval` seconds. Unchanged files cost one
+    os.stat per pass. Schema setup and the vector index check run once up
+    front; later passes only re-check the index after writing rows.
+    """
+    from utils.db import embed_all_files, init_db
+    from utils.pg import get_pool
+    from utils.pg_index import ensure_vector_index
+
+    interval = interval or WATCH_INTERVAL
+    pool = await get_pool()
+    await init_db(pool)
+    await ensure_vector_index(pool)
+    logging.info(f"[ingest] watching {root or default_dataset_root()} every {interval}s")
+    while True:
+        try:
+            await embed_all_files(
+                root=root, concurrency=concurrency, batch_size=batch_size,
+                incremental=True, local_index=local_index, prepare=False,
+            )
+        except Exception as e:
+            logging.error(f"[ingest] sync pass failed: {e}")
+        await asyncio.sleep(interval)
+
+
+# === CLI ===
+def main(argv=None):
+    from utils.db import embed_all_files
+    from utils.pg import close_pool
+
+    parser = argparse.ArgumentParser(description="Embed dataset files into the GrabData table.")
+    parser.add_argument("--root", default=None, help="dataset directory (default: ../datasets)")
+    parser.add_argument("--concurrency", type=int, default=INGEST_CONCURRENCY, help="parallel Titan embedding calls")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE, help="rows per bulk insert")
+    parser.add_argument("--incremental", action="store_true", help="only re-embed new or changed files")
+    parser.add_argument("--watch", action="store_true", help="keep syncing incrementally every --interval seconds")
+    parser.add_argument("--interval", type=float, default=WATCH_INTERVAL, help="seconds between watch passes")
+    parser.add_argument("--local-index", action="store_true", help="also update the local vector index")
+    args = parser.parse_args(argv)
+
+    async def _run():
+        local_index = None
+        if args.local_index:
+            from utils.local_index import get_local_index
+            local_index = get_local_index()
+        try:
+            if args.watch:
+                await watch_dataset(args.root, args.concurrency, args.batch_size, args.interval, local_index)
+            else:
+                await embed_all_files(
+                    root=args.root, concurrency=args.concurrency, batch_size=args.batch_size,
+                    incremental=args.incremental, local_index=local_index,
+                )
+        finally:
+            await close_pool()
+
+    asyncio.run(_run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import os
+import re
+import math
+import threading
+from datetime import datetime
+from collections import Counter, defaultdict
+from utils.pg import fetch_prepared
+
+# === Lexical Search Config ===
+# Text search config of GrabData.content_tsv; 'simple' keeps ids and codes unstemmed
+TSVECTOR_CONFIG = "simple"
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+
+_TERM_RE = re.compile(r"[a-z0-9_]+")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "did", "do", "does", "for", "from", "how", "i",
+    "in", "is", "it", "me", "of", "on", "or", "show", "tell", "that", "the", "this", "to", "was",
+    "what", "when", "where", "which", "who", "why", "with",
+}
+
+
+def query_terms(text: str) -> list:
+    seen, terms = set(), []
+    for term in _TERM_RE.findall(text.lower()):
+        if term not in STOPWORDS and len(term) > 1 and term not in seen:
+            seen.add(term)
+            terms.append(term)
+    return terms
+
+
+def build_tsquery(text: str) -> str:
+    """
+    OR of the question's terms, so a chunk matching only the transaction id
+    still ranks. Terms with digits (ids, hashes, error codes) are prefix
+    matches, which also covers ids pasted truncated like 0xd35e.
+    """
+    parts = [f"{t}:*" if any(c.isdigit() for c in t) else t for t in query_terms(text)]
+    return " | ".join(parts)
+
+
+# === Metadata Filters ===
+def normalize_filters(filters) -> dict:
+    """
+    Accepts {"file_types": ["json", ".log"], "modified_after": "2025-07-01" | epoch}
+    and returns {"file_types": [...] | None, "modified_after": float | None}.
+    Raises ValueError on a malformed filter (AskRequest turns it into a 422).
+    """
+    filters = filters or {}
+    file_types = filters.get("file_types")
+    if isinstance(file_types, str):
+        file_types = [file_types]
+    if file_types and not all(isinstance(t, str) for t in file_types):
+        raise ValueError("file_types must be a string or a list of strings")
+    file_types = [t.lower().lstrip(".") for t in file_types] if file_types else None
+    modified_after = filters.get("modified_after")
+    if isinstance(modified_after, str):
+        try:
+            modified_after = datetime.fromisoformat(modified_after).timestamp()
+        except ValueError:
+            raise ValueError(f"modified_after is not an ISO date: {modified_after!r}") from None
+    elif modified_after is not None and (isinstance(modified_after, bool) or not isinstance(modified_after, (int, float))):
+        raise ValueError("modified_after must be an ISO date or an epoch timestamp")
+    return {"file_types": file_types, "modified_after": float(modified_after) if modified_after else None}
+
+
+def matches_filters(row, filters) -> bool:
+    if filters["file_types"] and row["filepath"].rsplit(".", 1)[-1].lower() not in filters["file_types"]:
+        return False
+    return True
+
+
+# Shared by the vector and lexical queries; NULL parameters disable a filter
+FILTER_SQL = (
+    "($3::text[] IS NULL OR lower(substring(filepath from '\\.([^.]+)$')) = ANY($3::text[])) "
+    "AND ($4::float8 IS NULL OR file_mtime >= $4)"
+)
+LEXICAL_SQL = (
+    "SELECT id, filepath, content, content_hash{embedding} FROM GrabData "
+    f"WHERE content_tsv @@ to_tsquery('{TSVECTOR_CONFIG}', $1) AND {FILTER_SQL} "
+    f"ORDER BY ts_rank_cd(content_tsv, to_tsquery('{TSVECTOR_CONFIG}', $1)) DESC LIMIT $2"
+)
+
+
+# === Postgres Full-Text Search ===
+class PgLexicalSearch:
+    """ts_rank_cd over the GIN-indexed GrabData.content_tsv column (see init_db)."""
+
+    async def search(self, text, limit=15, filters=None, with_embeddings=False) -> list:
+        tsquery = build_tsquery(text or "")
+        if not tsquery:
+            return []
+        filters = normalize_filters(filters)
+        sql = LEXICAL_SQL.format(embedding=", embedding" if with_embeddings else "")
+        return await fetch_prepared(sql, tsquery, limit, filters["file_types"], filters["modified_after"])
+
+
+# === Local BM25 ===
+class LocalBM25:
+    """
+    Okapi BM25 over the chunks of a LocalVectorIndex, for RETRIEVER_BACKEND
+    values that need no database. Postings are rebuilt lazily when the
+    index changes. Date filters need file mtimes, which the local index
+    does not keep, so only file_types applies here.
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self._lock = threading.Lock()
+        self._built_for = None
+        self._postings = {}
+        self._lengths = {}
+        self._avg_length = 0.0
+
+    def _ensure_built(self):
+        version = (len(self.index), self.index._next_id)
+        if self._built_for == version:
+            return
+        postings = defaultdict(list)
+        lengths = {}
+        for row_id, row in list(self.index._meta.items()):
+            terms = _TERM_RE.findall(row["content"].lower())
+            lengths[row_id] = len(terms)
+            for term, tf in Counter(terms).items():
+                postings[term].append((row_id, tf))
+        self._postings, self._lengths = dict(postings), lengths
+        self._avg_length = (sum(lengths.values()) / len(lengths)) if lengths else 0.0
+        self._built_for = version
+
+    def _expand(self, terms) -> list:
+        """Indexed terms to score; terms with digits prefix-match like build_tsquery."""
+        expanded = []
+        for term in terms:
+            if any(c.isdigit() for c in term):
+                expanded.extend(t for t in self._postings if t.startswith(term))
+            elif term in self._postings:
+                expanded.append(term)
+        return expanded
+
+    async def search(self, text, limit=15, filters=None, with_embeddings=False) -> list:
+        filters = normalize_filters(filters)
+        with self._lock:
+            self._ensure_built()
+            total = len(self._lengths)
+            scores = defaultdict(float)
+            for term in self._expand(query_terms(text or "")):
+                postings = self._postings[term]
+                idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+                for row_id, tf in postings:
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[row_id] / (self._avg_length or 1.0))
+                    scores[row_id] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        ranked = sorted(scores.items(), key=lambda item: -item[1])
+        rows = []
+        for row_id, score in ranked:
+            row = self.index._meta.get(row_id)
+            if row is None or not matches_filters(row, filters):
+                continue
+            rows.append(dict(row, score=score))
+            if len(rows) >= limit:
+                break
+        if with_embeddings and rows:
+            vectors = self.index.vectors_for([row["id"] for row in rows])
+            for row, vector in zip(rows, vectors):
+                row["embedding"] = vector
+        return rows
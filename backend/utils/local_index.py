@@ -0,0 +1,302 @@
+import os
+import json
+import asyncio
+import logging
+import argparse
+import threading
+import numpy as np
+
+try:
+    import faiss
+except ImportError:  # faiss-cpu is optional; NumPy brute force is the fallback
+    faiss = None
+
+# === Local Index Config ===
+EMBED_DIM = 1024
+LOCAL_INDEX_DIR = os.getenv(
+    "LOCAL_INDEX_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".cache", "local_index"),
+)
+# auto | faiss | numpy
+LOCAL_INDEX_ENGINE = os.getenv("LOCAL_INDEX_ENGINE", "auto").lower()
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+# === In-process Vector Index ===
+class LocalVectorIndex:
+    """
+    Exact inner-product index over unit-normalized chunk embeddings, stored
+    as `vectors.npy` / `ids.npy` / `meta.jsonl` under LOCAL_INDEX_DIR. On load
+    the vector matrix is memory-mapped; FAISS (IndexIDMap2 over IndexFlatIP)
+    is used when installed, otherwise a NumPy matrix-vector product.
+
+    With FAISS the index is also written to `faiss.index` and read back
+    memory-mapped, so a serving process pages vectors in from the file
+    instead of copying them into RAM. A mapped index is read-only; the first
+    add or delete rebuilds it in memory from `vectors.npy`.
+
+    Rows are keyed by (filepath, chunk_index) like GrabData, so ingestion can
+    add, replace and delete chunks incrementally; `save()` compacts deletes.
+    """
+
+    def __init__(self, path=LOCAL_INDEX_DIR, dim=EMBED_DIM, engine=LOCAL_INDEX_ENGINE):
+        self.path = os.path.abspath(path)
+        self.dim = dim
+        self.use_faiss = faiss is not None and engine in ("auto", "faiss")
+        if engine == "faiss" and faiss is None:
+            logging.warning("LOCAL_INDEX_ENGINE=faiss but faiss is not installed; using NumPy")
+        self._lock = threading.RLock()
+        self._vectors = np.zeros((0, dim), dtype=np.float32)
+        self._ids = np.zeros((0,), dtype=np.int64)
+        self._alive = np.zeros((0,), dtype=bool)
+        self._pending_vectors, self._pending_ids = [], []
+        self._meta = {}        # id -> row dict
+        self._by_key = {}      # (filepath, chunk_index) -> id
+        self._next_id = 0
+        self._faiss = self._new_faiss() if self.use_faiss else None
+        self._faiss_mapped = False
+
+    def _new_faiss(self):
+        return faiss.IndexIDMap2(faiss.IndexFlatIP(self.dim))
+
+    def __len__(self):
+        return len(self._meta)
+
+    # --- persistence ---
+    def _files(self):
+        return (
+            os.path.join(self.path, "vectors.npy"),
+            os.path.join(self.path, "ids.npy"),
+            os.path.join(self.path, "meta.jsonl"),
+        )
+
+    def _faiss_file(self):
+        return os.path.join(self.path, "faiss.index")
+
+    def _read_faiss(self):
+        """Memory-mapped faiss.index if present and in step with ids.npy, else None."""
+        mmap_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", None)  # faiss >= 1.10
+        if mmap_flag is None or not os.path.exists(self._faiss_file()):
+            return None
+        try:
+            index = faiss.read_index(self._faiss_file(), mmap_flag)
+        except Exception as e:
+            logging.warning(f"Could not map {self._faiss_file()}: {e}")
+            return None
+        return index if index.ntotal == len(self._ids) else None
+
+    def _materialize_faiss(self):
+        # a mapped index cannot grow or shrink, so copy it into memory before the first change
+        if self._faiss_mapped:
+            self._faiss = self._new_faiss()
+            if len(self._ids):
+                self._faiss.add_with_ids(np.ascontiguousarray(self._vectors), self._ids)
+            self._faiss_mapped = False
+
+    def load(self) -> bool:
+        vectors_path, ids_path, meta_path = self._files()
+        if not os.path.exists(meta_path):
+            return False
+        with self._lock:
+            self._vectors = np.load(vectors_path, mmap_mode="r")
+            self._ids = np.load(ids_path)
+            self._alive = np.ones(len(self._ids), dtype=bool)
+            self._meta, self._by_key = {}, {}
+            with open(meta_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    row = json.loads(line)
+                    self._meta[row["id"]] = row
+                    self._by_key[(row["filepath"], row["chunk_index"])] = row["id"]
+            self._next_id = int(self._ids.max()) + 1 if len(self._ids) else 0
+            if self.use_faiss:
+                self._faiss = self._read_faiss()
+                self._faiss_mapped = self._faiss is not None
+                if self._faiss is None:
+                    self._faiss = self._new_faiss()
+                    if len(self._ids):
+                        self._faiss.add_with_ids(np.ascontiguousarray(self._vectors), self._ids)
+        logging.info(f"Local index loaded: {len(self)} chunks from {self.path} (faiss={self.use_faiss})")
+        return True
+
+    def save(self):
+        with self._lock:
+            self._consolidate()
+            keep = self._alive
+            vectors, ids = np.ascontiguousarray(self._vectors[keep]), self._ids[keep]
+            os.makedirs(self.path, exist_ok=True)
+            vectors_path, ids_path, meta_path = self._files()
+            for target, array in ((vectors_path, vectors), (ids_path, ids)):
+                with open(target + ".tmp", "wb") as f:
+                    np.save(f, array)
+                os.replace(target + ".tmp", target)
+            with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+                for row_id in ids.tolist():
+                    f.write(json.dumps(self._meta[row_id], ensure_ascii=False) + "\n")
+            os.replace(meta_path + ".tmp", meta_path)
+            if self._faiss is not None:
+                faiss.write_index(self._faiss, self._faiss_file() + ".tmp")
+                os.replace(self._faiss_file() + ".tmp", self._faiss_file())
+            elif os.path.exists(self._faiss_file()):
+                os.remove(self._faiss_file())  # stale once saved without FAISS
+            self._vectors, self._ids = vectors, ids
+            self._alive = np.ones(len(ids), dtype=bool)
+        logging.info(f"Local index saved: {len(self)} chunks to {self.path}")
+
+    # --- mutation ---
+    def _consolidate(self):
+        if self._pending_ids:
+            self._vectors = np.concatenate([np.asarray(self._vectors)] + self._pending_vectors)
+            self._ids = np.concatenate([self._ids, np.asarray(self._pending_ids, dtype=np.int64)])
+            self._alive = np.concatenate([self._alive, np.ones(len(self._pending_ids), dtype=bool)])
+            self._pending_vectors, self._pending_ids = [], []
+
+    def _remove_ids(self, row_ids):
+        if not row_ids:
+            return
+        self._materialize_faiss()
+        for row_id in row_ids:
+            row = self._meta.pop(row_id)
+            self._by_key.pop((row["filepath"], row["chunk_index"]), None)
+        self._consolidate()
+        self._alive[np.isin(self._ids, np.asarray(row_ids, dtype=np.int64))] = False
+        if self._faiss is not None:
+            self._faiss.remove_ids(np.asarray(row_ids, dtype=np.int64))
+
+    def add(self, rows):
+        """Adds or replaces (filepath, chunk_index, content, content_hash, embedding) rows."""
+        rows = list(rows)
+        if not rows:
+            return
+        with self._lock:
+            self._materialize_faiss()
+            self._remove_ids([self._by_key[(r[0], r[1])] for r in rows if (r[0], r[1]) in self._by_key])
+            vectors = _normalize(np.stack([np.asarray(r[4], dtype=np.float32) for r in rows]))
+            ids = np.arange(self._next_id, self._next_id + len(rows), dtype=np.int64)
+            self._next_id += len(rows)
+            for row_id, (filepath, chunk_index, content, content_hash, _) in zip(ids.tolist(), rows):
+                self._meta[row_id] = {
+                    "id": row_id, "filepath": filepath, "chunk_index": chunk_index,
+                    "content": content, "content_hash": content_hash,
+                }
+                self._by_key[(filepath, chunk_index)] = row_id
+            self._pending_vectors.append(vectors)
+            self._pending_ids.extend(ids.tolist())
+            if self._faiss is not None:
+                self._faiss.add_with_ids(vectors, ids)
+
+    def remove_files(self, filepaths):
+        filepaths = set(filepaths)
+        with self._lock:
+            self._remove_ids([row_id for (path, _), row_id in self._by_key.items() if path in filepaths])
+
+    def trim_file(self, filepath, chunk_count):
+        """Drops chunks of `filepath` at or past `chunk_count` (file got shorter)."""
+        with self._lock:
+            self._remove_ids([
+                row_id for (path, index), row_id in self._by_key.items()
+                if path == filepath and index >= chunk_count
+            ])
+
+    def vectors_for(self, row_ids) -> list:
+        """Stored (unit-normalized) vectors of the given row ids."""
+        with self._lock:
+            if self._faiss is not None:
+                return [self._faiss.reconstruct(int(i)) for i in row_ids]
+            self._consolidate()
+            positions = np.searchsorted(self._ids, np.asarray(row_ids, dtype=np.int64))
+            return [np.asarray(self._vectors[p]) for p in positions]
+
+    # --- search ---
+    def search(self, query_embedding, limit=15, with_embeddings=False) -> list:
+        query = _normalize(np.asarray(query_embedding, dtype=np.float32))
+        with self._lock:
+            if not self._meta:
+                return []
+            if self._faiss is not None:
+                scores, ids = self._faiss.search(query[None, :], limit)
+                hits = [(int(i), float(s), None) for i, s in zip(ids[0], scores[0]) if i != -1]
+                if with_embeddings:
+                    hits = [(i, s, self._faiss.reconstruct(i)) for i, s, _ in hits]
+            else:
+                self._consolidate()
+                scores = np.asarray(self._vectors) @ query
+                scores[~self._alive] = -np.inf
+                k = min(limit, len(self._meta))
+                top = np.argpartition(-scores, k - 1)[:k]
+                top = top[np.argsort(-scores[top])]
+                hits = [
+                    (int(self._ids[i]), float(scores[i]), np.asarray(self._vectors[i]) if with_embeddings else None)
+                    for i in top
+                ]
+            rows = []
+            for row_id, score, vector in hits:
+                row = dict(self._meta[row_id], score=score)
+                if with_embeddings:
+                    row["embedding"] = vector
+                rows.append(row)
+            return rows
+
+
+# === Build from GrabData ===
+async def build_from_db(pool, index: LocalVectorIndex = None, batch_size=1000) -> LocalVectorIndex:
+    """Rebuilds the local index from every GrabData row and saves it."""
+    index = index or LocalVectorIndex()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            batch = []
+            async for row in conn.cursor(
+                "SELECT filepath, chunk_index, content, content_hash, embedding FROM GrabData "
+                "WHERE embedding IS NOT NULL"
+            ):
+                batch.append(tuple(row))
+                if len(batch) >= batch_size:
+                    index.add(batch)
+                    batch = []
+            index.add(batch)
+    index.save()
+    return index
+
+
+_local_index = None
+
+
+def get_local_index() -> LocalVectorIndex:
+    """Process-wide index, memory-mapped from disk on first use."""
+    global _local_index
+    if _local_index is None:
+        _local_index = LocalVectorIndex()
+        _local_index.load()
+    return _local_index
+
+
+# === CLI ===
+def main(argv=None):
+    from utils.pg import get_pool, close_pool
+
+    parser = argparse.ArgumentParser(description="Manage the local in-process vector index.")
+    parser.add_argument("command", choices=["build", "stats"], help="build: rebuild from GrabData; stats: print size")
+    args = parser.parse_args(argv)
+
+    if args.command == "stats":
+        index = get_local_index()
+        print(json.dumps({"chunks": len(index), "path": index.path, "faiss": index.use_faiss}))
+        return
+
+    async def _run():
+        try:
+            index = await build_from_db(await get_pool(), LocalVectorIndex())
+            print(json.dumps({"chunks": len(index), "path": index.path}))
+        finally:
+            await close_pool()
+
+    asyncio.run(_run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+import os
+import time
+import uuid
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# === Metrics Config ===
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+TRACE_IDS_ENABLED = os.getenv("TRACE_IDS_ENABLED", "true").lower() in ("1", "true", "yes")
+TRACE_HEADER = "X-Trace-Id"
+METRICS_PREFIX = "grab_"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_trace_id = contextvars.ContextVar("trace_id", default=None)
+
+
+# === Trace IDs ===
+def new_trace_id(incoming: str = None) -> str:
+    """Uses the caller's X-Trace-Id when present, otherwise a fresh id."""
+    trace_id = (incoming or "").strip()[:64] or uuid.uuid4().hex
+    _trace_id.set(trace_id)
+    return trace_id
+
+
+def current_trace_id():
+    return _trace_id.get()
+
+
+# === Metric Types ===
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key, extra=()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help_text):
+        self.name = METRICS_PREFIX + name
+        self.help = help_text
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = buckets
+
+    def observe(self, value, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+            state["sum"] += value
+            state["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = [(key, dict(state, counts=list(state["counts"]))) for key, state in self._values.items()]
+        for key, state in items:
+            for bound, count in zip(self.buckets, state["counts"]):
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', str(bound))])} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, [('le', '+Inf')])} {state['count']}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {round(state['sum'], 6)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {state['count']}")
+        return lines
+
+
+# === Registry ===
+http_request_seconds = Histogram("http_request_seconds", "HTTP request latency by route")
+http_in_flight = Gauge("http_requests_in_flight", "HTTP requests being served")
+stage_seconds = Histogram("stage_seconds", "Latency of pipeline stages (embed, retrieve, pack, claude, claude_ttft, parse, db)")
+bedrock_seconds = Histogram("bedrock_call_seconds", "Bedrock invoke latency by model")
+bedrock_in_flight = Gauge("bedrock_in_flight", "Bedrock calls holding a pooled connection")
+bedrock_tokens = Counter("bedrock_tokens_total", "Bedrock tokens by model and direction (input/output)")
+bedrock_errors = Counter("bedrock_errors_total", "Failed Bedrock calls by model")
+parse_failures = Counter("parse_failures_total", "Agent responses that could not be parsed, by agent")
+
+_REGISTRY = [
+    http_request_seconds, http_in_flight, stage_seconds, bedrock_seconds,
+    bedrock_in_flight, bedrock_tokens, bedrock_errors, parse_failures,
+]
+_collectors = []
+
+
+def register(metric):
+    """Adds a metric defined outside this module to /metrics; returns it."""
+    _REGISTRY.append(metric)
+    return metric
+
+
+def stage(name: str):
+    """Times a block as one stage: `with stage("embed"): ...`."""
+    return stage_seconds.time(stage=name)
+
+
+def register_collector(fn):
+    """fn() -> {(metric_name, kind, help): {label_tuple: value}}; read at scrape time."""
+    _collectors.append(fn)
+
+
+def record_bedrock_tokens(model_id, input_tokens, output_tokens):
+    if input_tokens:
+        bedrock_tokens.inc(int(input_tokens), model=model_id, direction="input")
+    if output_tokens:
+        bedrock_tokens.inc(int(output_tokens), model=model_id, direction="output")
+
+
+def render_prometheus() -> str:
+    lines = []
+    for metric in _REGISTRY:
+        lines.extend(metric.render())
+    for collect in _collectors:
+        for (name, kind, help_text), samples in collect().items():
+            full = METRICS_PREFIX + name
+            lines.append(f"# HELP {full} {help_text}")
+            lines.append(f"# TYPE {full} {kind}")
+            for key, value in samples.items():
+                lines.append(f"{full}{_format_labels(key)} {value}")
+    return "\n".join(lines) + "\n"
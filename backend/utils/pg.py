@@ -0,0 +1,159 @@
+import os
+import struct
+import asyncio
+import logging
+import numpy as np
+from dotenv import load_dotenv
+from utils.metrics import stage
+
+load_dotenv()
+
+# === PG Pool Config ===
+DB_URL = os.getenv("DATABASE_URL")
+PG_POOL_MIN_SIZE = int(os.getenv("PG_POOL_MIN_SIZE", "1"))
+PG_POOL_MAX_SIZE = int(os.getenv("PG_POOL_MAX_SIZE", "10"))
+# asyncpg prepares every query it runs and keeps the prepared statements in a
+# per-connection LRU. Set to 0 when going through a transaction-mode pooler
+# (pgbouncer) that cannot keep prepared statements across transactions.
+PG_STATEMENT_CACHE_SIZE = int(os.getenv("PG_STATEMENT_CACHE_SIZE", "100"))
+PG_COMMAND_TIMEOUT = float(os.getenv("PG_COMMAND_TIMEOUT", "30"))
+PGVECTOR_SCHEMA = os.getenv("PGVECTOR_SCHEMA", "public")
+# Session defaults for vector index scans; a query can override them (see fetch_prepared)
+PGVECTOR_IVFFLAT_PROBES = int(os.getenv("PGVECTOR_IVFFLAT_PROBES", "10"))
+PGVECTOR_HNSW_EF_SEARCH = int(os.getenv("PGVECTOR_HNSW_EF_SEARCH", "40"))
+
+_pool = None
+_pool_lock = asyncio.Lock()
+
+
+# === pgvector Binary Codec ===
+# Wire format (vector_send/vector_recv): int16 dim, int16 unused, dim x float4,
+# all big-endian. Encoding and decoding are single NumPy buffer copies instead
+# of formatting and parsing a ~20KB "[0.1,0.2,...]" literal per vector.
+_VECTOR_HEADER = struct.Struct(">HH")
+_VECTOR_DTYPE = np.dtype(">f4")
+
+
+def encode_vector(value) -> bytes:
+    vector = np.asarray(value, dtype=_VECTOR_DTYPE)
+    return _VECTOR_HEADER.pack(vector.shape[0], 0) + vector.tobytes()
+
+
+def decode_vector(data: bytes) -> np.ndarray:
+    dim, _ = _VECTOR_HEADER.unpack_from(data)
+    return np.frombuffer(data, dtype=_VECTOR_DTYPE, count=dim, offset=_VECTOR_HEADER.size).astype(np.float32)
+
+
+async def _init_connection(conn):
+    try:
+        await conn.set_type_codec(
+            "vector", schema=PGVECTOR_SCHEMA,
+            encoder=encode_vector, decoder=decode_vector, format="binary",
+        )
+    except ValueError:
+        # extension not created yet; init_db recycles connections once it is
+        logging.warning("pgvector type not found; vector codec not registered on this connection")
+
+
+def _server_settings() -> dict:
+    # sent in the startup packet, so they are the session defaults the pool's
+    # RESET ALL returns to, at no extra round trip per acquire. pgbouncer does
+    # not forward them; set them with ALTER ROLE ... SET behind a pooler
+    return {
+        "ivfflat.probes": str(PGVECTOR_IVFFLAT_PROBES),
+        "hnsw.ef_search": str(PGVECTOR_HNSW_EF_SEARCH),
+    }
+
+
+# === Shared Pool ===
+async def init_pool():
+    """
+    Creates the application-wide pool. Called once from FastAPI startup;
+    CLI scripts get it lazily through get_pool().
+    """
+    global _pool
+    if not DB_URL:
+        raise RuntimeError("DATABASE_URL is not set")
+    async with _pool_lock:
+        if _pool is None:
+            # imported here so processes that never touch Postgres skip loading asyncpg
+            import asyncpg
+
+            _pool = await asyncpg.create_pool(
+                dsn=DB_URL,
+                min_size=PG_POOL_MIN_SIZE,
+                max_size=PG_POOL_MAX_SIZE,
+                statement_cache_size=PG_STATEMENT_CACHE_SIZE,
+                command_timeout=PG_COMMAND_TIMEOUT,
+                init=_init_connection,
+                server_settings=_server_settings(),
+            )
+            logging.info(f"PG pool created (min={PG_POOL_MIN_SIZE}, max={PG_POOL_MAX_SIZE})")
+    return _pool
+
+
+async def get_pool():
+    if _pool is None:
+        return await init_pool()
+    return _pool
+
+
+async def close_pool():
+    global _pool
+    async with _pool_lock:
+        if _pool is not None:
+            await _pool.close()
+            _pool = None
+            logging.info("PG pool closed.")
+
+
+async def connect_unpooled():
+    """
+    Dedicated connection outside the pool with no command timeout, for DDL
+    that outlasts PG_COMMAND_TIMEOUT (CREATE INDEX CONCURRENTLY). On a pool
+    connection, timeout=None falls back to the pool's command_timeout.
+    """
+    if not DB_URL:
+        raise RuntimeError("DATABASE_URL is not set")
+    import asyncpg
+
+    return await asyncpg.connect(
+        dsn=DB_URL, statement_cache_size=PG_STATEMENT_CACHE_SIZE, server_settings=_server_settings()
+    )
+
+
+def get_pool_stats() -> dict:
+    if _pool is None:
+        return {"initialized": False}
+    return {
+        "initialized": True,
+        "size": _pool.get_size(),
+        "idle": _pool.get_idle_size(),
+        "min_size": _pool.get_min_size(),
+        "max_size": _pool.get_max_size(),
+    }
+
+
+# === Prepared Queries ===
+QUERY_SETTINGS = {"ivfflat.probes", "hnsw.ef_search"}
+
+async def fetch_prepared(sql: str, *args, settings: dict = None):
+    """
+    Runs a read query on a pooled connection. Callers pass a module-level SQL
+    constant, so after the first call on a connection asyncpg finds the query
+    in its statement cache and only sends Bind/Execute for the prepared plan.
+
+    `settings` (e.g. {"ivfflat.probes": 20}) are applied with SET LOCAL for
+    this query only, inside a short transaction.
+    """
+    pool = await get_pool()
+    with stage("db"):
+        async with pool.acquire() as conn:
+            if not settings:
+                return await conn.fetch(sql, *args)
+            async with conn.transaction():
+                for name, value in settings.items():
+                    if name not in QUERY_SETTINGS:
+                        raise ValueError(f"Unsupported query setting: {name}")
+                    await conn.execute(f"SET LOCAL {name} = {int(value)}")
+                return await conn.fetch(sql, *args)
@@ -0,0 +1,141 @@
+import os
+import math
+import asyncio
+import logging
+import argparse
+
+# === Vector Index Config ===
+# ivfflat | hnsw
+VECTOR_INDEX_KIND = os.getenv("VECTOR_INDEX_KIND", "ivfflat").lower()
+# Below this many rows an exact sequential scan is fast and always 100% recall
+VECTOR_INDEX_MIN_ROWS = int(os.getenv("VECTOR_INDEX_MIN_ROWS", "5000"))
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "64"))
+INDEX_BUILD_MAINTENANCE_WORK_MEM = os.getenv("INDEX_BUILD_MAINTENANCE_WORK_MEM", "512MB")
+
+INDEX_NAME = "idx_grabdata_embedding"
+# Queries and index must agree: <=> is cosine distance, served by vector_cosine_ops
+DISTANCE_OPERATOR = "<=>"
+OPERATOR_CLASS = "vector_cosine_ops"
+
+
+def ivfflat_lists(rows: int) -> int:
+    """pgvector guidance: rows / 1000 up to 1M rows, sqrt(rows) beyond."""
+    if rows <= 1_000_000:
+        return max(rows // 1000, 10)
+    return int(math.sqrt(rows))
+
+
+def ivfflat_probes(lists: int) -> int:
+    return max(int(math.sqrt(lists)), 1)
+
+
+async def _current_index(conn):
+    return await conn.fetchval(
+        "SELECT indexdef FROM pg_indexes WHERE tablename = 'grabdata' AND indexname = $1", INDEX_NAME
+    )
+
+
+def _index_ddl(name: str, kind: str, rows: int, lists: int = None) -> str:
+    if kind == "hnsw":
+        params = f"m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION}"
+    else:
+        params = f"lists = {lists or ivfflat_lists(rows)}"
+    return (
+        f"CREATE INDEX CONCURRENTLY {name} ON GrabData "
+        f"USING {kind} (embedding {OPERATOR_CLASS}) WITH ({params})"
+    )
+
+
+async def _run_ddl(*statements):
+    """
+    Runs statements on a dedicated connection without a command timeout:
+    an index build cut off by PG_COMMAND_TIMEOUT would leave an INVALID
+    index behind. A tuple of statements runs in one transaction.
+    """
+    from utils.pg import connect_unpooled
+
+    conn = await connect_unpooled()
+    try:
+        for statement in statements:
+            if isinstance(statement, tuple):
+                async with conn.transaction():
+                    for sql in statement:
+                        await conn.execute(sql)
+            else:
+                await conn.execute(statement)
+    finally:
+        await conn.close()
+
+
+# === Build / Rebuild ===
+async def ensure_vector_index(pool, kind: str = None, lists: int = None, force: bool = False) -> dict:
+    """
+    Builds the GrabData vector index once data is loaded, sized from the
+    current row count. An existing index is kept unless its kind changed,
+    its ivfflat list count is off by more than 2x (centroids trained on a
+    much smaller table), or `force` is set. The new index is built
+    CONCURRENTLY under a temporary name and swapped in, so /ask keeps
+    working during a rebuild.
+    """
+    kind = (kind or VECTOR_INDEX_KIND).lower()
+    if kind not in ("ivfflat", "hnsw"):
+        raise ValueError(f"Unknown vector index kind: {kind}")
+
+    async with pool.acquire() as conn:
+        rows = await conn.fetchval("SELECT COUNT(*) FROM GrabData WHERE embedding IS NOT NULL")
+        existing = await _current_index(conn)
+
+    wanted_lists = lists or ivfflat_lists(rows)
+    if rows < VECTOR_INDEX_MIN_ROWS and not force:
+        if existing:
+            await _run_ddl(f"DROP INDEX CONCURRENTLY IF EXISTS {INDEX_NAME}")
+        logging.info(f"Vector index skipped: {rows} rows < {VECTOR_INDEX_MIN_ROWS}, exact scan is used")
+        return {"rows": rows, "kind": "exact", "rebuilt": bool(existing)}
+
+    if existing and not force:
+        same_kind = f"USING {kind} " in existing
+        stale = False
+        if kind == "ivfflat" and "lists='" in existing:
+            current_lists = int(existing.split("lists='")[1].split("'")[0])
+            stale = not (wanted_lists / 2 <= current_lists <= wanted_lists * 2)
+        if same_kind and not stale:
+            return {"rows": rows, "kind": kind, "rebuilt": False}
+
+    logging.info(f"Building {kind} vector index over {rows} rows...")
+    await _run_ddl(
+        f"SET maintenance_work_mem = '{INDEX_BUILD_MAINTENANCE_WORK_MEM}'",
+        f"DROP INDEX CONCURRENTLY IF EXISTS {INDEX_NAME}_new",
+        _index_ddl(f"{INDEX_NAME}_new", kind, rows, wanted_lists),
+        (f"DROP INDEX IF EXISTS {INDEX_NAME}", f"ALTER INDEX {INDEX_NAME}_new RENAME TO {INDEX_NAME}"),
+        "ANALYZE GrabData",
+    )
+
+    result = {"rows": rows, "kind": kind, "rebuilt": True}
+    if kind == "ivfflat":
+        result.update(lists=wanted_lists, suggested_probes=ivfflat_probes(wanted_lists))
+    logging.info(f"✅ Vector index ready: {result}")
+    return result
+
+
+# === CLI ===
+def main(argv=None):
+    from utils.pg import get_pool, close_pool
+
+    parser = argparse.ArgumentParser(description="Build or rebuild the GrabData vector index.")
+    parser.add_argument("--kind", choices=["ivfflat", "hnsw"], default=VECTOR_INDEX_KIND)
+    parser.add_argument("--lists", type=int, default=None, help="ivfflat lists (default: derived from row count)")
+    parser.add_argument("--force", action="store_true", help="rebuild even if the current index fits")
+    args = parser.parse_args(argv)
+
+    async def _run():
+        try:
+            print(await ensure_vector_index(await get_pool(), args.kind, args.lists, args.force))
+        finally:
+            await close_pool()
+
+    asyncio.run(_run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import os
+import time
+import asyncio
+import inspect
+import logging
+from utils.bedrock_client import run_blocking
+
+# === Pipeline Config ===
+# Default per-stage deadline (seconds); a Stage can set its own
+PIPELINE_STAGE_TIMEOUT = float(os.getenv("PIPELINE_STAGE_TIMEOUT", "10"))
+
+
+class Stage:
+    """
+    One agent in a pipeline. `fn(payload)` is called once every stage in
+    `deps` has settled; stages with deps get fn(payload, {dep: result}).
+    fn may be sync (run on the Bedrock executor) or async.
+    """
+
+    def __init__(self, name, fn, deps=(), timeout=None):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.timeout = timeout
+
+
+def _check_dag(stages):
+    names = {stage.name for stage in stages}
+    if len(names) != len(stages):
+        raise ValueError("Duplicate stage names in pipeline")
+    for stage in stages:
+        missing = set(stage.deps) - names
+        if missing:
+            raise ValueError(f"Stage {stage.name} depends on unknown stages: {sorted(missing)}")
+    by_name = {stage.name: stage for stage in stages}
+    visiting, done = set(), set()
+
+    def visit(name):
+        if name in done:
+            return
+        if name in visiting:
+            raise ValueError(f"Pipeline has a cycle through {name}")
+        visiting.add(name)
+        for dep in by_name[name].deps:
+            visit(dep)
+        visiting.discard(name)
+        done.add(name)
+
+    for stage in stages:
+        visit(stage.name)
+
+
+def _critical_path(stages, timings) -> list:
+    """Walks back from the last stage to finish through its slowest dependency."""
+    by_name = {stage.name: stage for stage in stages}
+    name = max(timings, key=lambda n: timings[n]["end_ms"])
+    path = [name]
+    while by_name[name].deps:
+        name = max(by_name[name].deps, key=lambda n: timings[n]["end_ms"])
+        path.append(name)
+    return list(reversed(path))
+
+
+# === DAG Executor ===
+async def run_dag(stages, payload, default_timeout=PIPELINE_STAGE_TIMEOUT):
+    """
+    Runs every stage as soon as its dependencies have settled, so
+    independent agents overlap. A stage that exceeds its deadline or raises
+    yields {"status": "timeout" | "error", "result": ...} and its dependents
+    still run on the partial results. A sync stage that times out keeps its
+    executor thread until it returns; only the pipeline stops waiting.
+
+    Returns (results, timings): results maps stage name to output; timings
+    holds per-stage start/end/latency in ms, the total and the critical path.
+    """
+    _check_dag(stages)
+    started = time.perf_counter()
+    tasks, results, timings = {}, {}, {}
+
+    def elapsed_ms():
+        return round((time.perf_counter() - started) * 1000, 2)
+
+    async def _call(stage, dep_results):
+        args = (payload, dep_results) if stage.deps else (payload,)
+        if inspect.iscoroutinefunction(stage.fn):
+            return await stage.fn(*args)
+        return await run_blocking(stage.fn, *args)
+
+    async def _run(stage):
+        if stage.deps:
+            await asyncio.gather(*(tasks[dep] for dep in stage.deps))
+        dep_results = {dep: results[dep] for dep in stage.deps}
+        timeout = stage.timeout if stage.timeout is not None else default_timeout
+        start = elapsed_ms()
+        try:
+            results[stage.name] = await asyncio.wait_for(_call(stage, dep_results), timeout)
+            status = "ok"
+        except asyncio.TimeoutError:
+            logging.warning(f"Pipeline stage {stage.name} timed out after {timeout}s")
+            results[stage.name] = {"status": "timeout", "result": f"{stage.name} did not finish within {timeout}s"}
+            status = "timeout"
+        except Exception as e:
+            logging.error(f"Pipeline stage {stage.name} failed: {e}")
+            results[stage.name] = {"status": "error", "result": str(e)}
+            status = "error"
+        end = elapsed_ms()
+        timings[stage.name] = {"status": status, "start_ms": start, "end_ms": end, "latency_ms": round(end - start, 2)}
+
+    # stages are created in dependency order so every dep task exists first
+    pending = list(stages)
+    while pending:
+        for stage in list(pending):
+            if all(dep in tasks for dep in stage.deps):
+                tasks[stage.name] = asyncio.create_task(_run(stage))
+                pending.remove(stage)
+    await asyncio.gather(*tasks.values())
+
+    return {stage.name: results[stage.name] for stage in stages}, {
+        "stages": {stage.name: timings[stage.name] for stage in stages},
+        "total_ms": elapsed_ms(),
+        "critical_path": _critical_path(stages, timings),
+    }
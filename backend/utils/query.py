@@ -1,94 +1,187 @@
-import os
 import json
-import asyncpg
-import boto3
+import time
+import logging
+from utils.bedrock_client import invoke_model, ainvoke_model, ainvoke_model_stream
+from utils.retrieval import get_retriever
+from utils.embeddings import aget_titan_embedding
+from utils.answer_cache import ANSWER_CACHE_ENABLED, answer_cache
+from utils.context_packer import CONTEXT_PACKING_ENABLED, CONTEXT_CANDIDATES, pack_context, build_context
+from utils.metrics import stage, stage_seconds
 from dotenv import load_dotenv
 
 load_dotenv()
 
 # AWS
-AWS_REGION = os.getenv("AWS_REGION")
-AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
-AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
-AWS_SESSION_TOKEN = os.getenv("AWS_SESSION_TOKEN")
 CLAUDE_MODEL_ID = "anthropic.claude-3-5-sonnet-20240620-v1:0"
 
-# PGVECTOR
-DB_URL = os.getenv("DATABASE_URL")
-
-# === Bedrock Claude Client ===
-def get_bedrock_client():
-    return boto3.client(
-        "bedrock-runtime",
-        region_name=AWS_REGION,
-        aws_access_key_id=AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-        aws_session_token=AWS_SESSION_TOKEN,
+# === Search similar context (pgvector or local index, see utils/retrieval.py) ===
+async def fetch_similar_rows(query_embedding: list, limit=15, with_embeddings=False, query_text=None, filters=None):
+    return await get_retriever().search(
+        query_embedding, limit, with_embeddings=with_embeddings, query_text=query_text, filters=filters
     )
 
-# === Search similar context from DB ===
 async def fetch_similar_chunks(query_embedding: list, limit=15):
-    import asyncpg
-    embedding_str = "[" + ",".join(str(x) for x in query_embedding) + "]"
-    pool = await asyncpg.create_pool(dsn=DB_URL)
-    async with pool.acquire() as conn:
-        rows = await conn.fetch(
-            "SELECT content FROM GrabData ORDER BY embedding <-> $1::vector LIMIT $2",
-            embedding_str, limit
-        )
-    await pool.close()
+    rows = await fetch_similar_rows(query_embedding, limit)
     return [row['content'] for row in rows]
 
-# === Get Titan Embedding for user query ===
-def get_titan_embedding(text: str) -> list:
-    try:
-        client = get_bedrock_client()
-        body = {"inputText": text[:2000]}
-        response = client.invoke_model(
-            modelId="amazon.titan-embed-text-v2:0",
-            body=json.dumps(body),
-            accept="application/json",
-            contentType="application/json",
-        )
+# === Call Claude to answer using retrieved context ===
+def _claude_body(context: str, question: str) -> str:
+    return json.dumps({
+        "messages": [
+            {"role": "user", "content": f"Use the following context to answer:\n\n{context}\n\nQuestion: {question}"}
+        ],
+        "anthropic_version": "bedrock-2023-05-31",
+        "max_tokens": 1024
+    })
+
+def _claude_request(context: str, question: str) -> dict:
+    return {
+        "modelId": CLAUDE_MODEL_ID,
+        "body": _claude_body(context, question),
+        "contentType": "application/json",
+        "accept": "application/json",
+    }
+
+def _claude_text(response) -> str:
+    with stage("parse"):
         result = json.loads(response["body"].read())
-        return result["embedding"]
-    except Exception as e:
-        print(f"[ERROR] Embedding failed: {e}")
-        return []
+        return result["content"][0]["text"]
 
-# === Call Claude to answer using retrieved context ===
 def call_claude(context: str, question: str) -> str:
     try:
-        client = get_bedrock_client()
-        body = {
-            "messages": [
-                {"role": "user", "content": f"Use the following context to answer:\n\n{context}\n\nQuestion: {question}"}
-            ],
-            "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 1024
-        }
-        response = client.invoke_model(
-            modelId=CLAUDE_MODEL_ID,
-            body=json.dumps(body),
-            contentType="application/json",
-            accept="application/json"
-        )
-        result = json.loads(response["body"].read())
-        return result["content"][0]["text"]
-    except Exception as e:
-        print(f"[ERROR] Claude call failed: {e}")
+        with stage("claude"):
+            response = invoke_model(**_claude_request(context, question))
+        return _claude_text(response)
+    except Exception:
+        logging.exception("Claude call failed")
         return "❌ Claude model failed to respond."
 
-# === Final function for /ask ===
-async def ask_question_from_db(question: str) -> str:
-    query_embedding = get_titan_embedding(question)
+async def acall_claude(context: str, question: str) -> str:
+    """Async call_claude; rate-limit waits stay on the event loop (see ainvoke_model)."""
+    try:
+        with stage("claude"):
+            response = await ainvoke_model(**_claude_request(context, question))
+        return _claude_text(response)
+    except Exception:
+        logging.exception("Claude call failed")
+        return "❌ Claude model failed to respond."
+
+# === Retrieval shared by /ask and /ask-stream ===
+async def _retrieve(question: str, filters=None):
+    """
+    Returns (query_embedding, rows, packing, error). With context packing on,
+    CONTEXT_CANDIDATES rows are fetched and packed (utils/context_packer.py)
+    and `packing` holds its stats; error is the user-facing message on failure.
+    """
+    with stage("embed"):
+        query_embedding = await aget_titan_embedding(question)
     if not query_embedding:
-        return "❌ Could not generate embedding for your question."
+        return None, None, None, "❌ Could not generate embedding for your question."
+
+    if CONTEXT_PACKING_ENABLED:
+        with stage("retrieve"):
+            candidates = await fetch_similar_rows(
+                query_embedding, CONTEXT_CANDIDATES, with_embeddings=True, query_text=question, filters=filters
+            )
+        with stage("pack"):
+            rows, packing = pack_context(query_embedding, candidates)
+        logging.info(
+            f"Context packed: {packing['selected']}/{packing['candidates']} rows, "
+            f"{packing['tokens_packed']} tokens ({packing['tokens_saved']} saved)"
+        )
+    else:
+        with stage("retrieve"):
+            rows, packing = await fetch_similar_rows(query_embedding, query_text=question, filters=filters), None
+    if not rows:
+        return query_embedding, None, packing, "❌ No relevant information found in the database."
+    return query_embedding, rows, packing, None
+
+# === Final function for /ask ===
+async def ask_question_from_db(question: str, filters=None) -> str:
+    query_embedding, rows, _, error = await _retrieve(question, filters)
+    if error:
+        return error
 
-    chunks = await fetch_similar_chunks(query_embedding)
-    if not chunks:
-        return "❌ No relevant information found in the database."
+    if ANSWER_CACHE_ENABLED:
+        cached = answer_cache.lookup(query_embedding, rows)
+        if cached is not None:
+            return cached
 
-    combined_context = "\n---\n".join(chunks)
-    return call_claude(combined_context, question)
+    combined_context = build_context(rows)
+    answer = await acall_claude(combined_context, question)
+    if ANSWER_CACHE_ENABLED and not answer.startswith("❌"):
+        answer_cache.store(query_embedding, rows, answer)
+    return answer
+
+# === Streaming variant for /ask-stream ===
+async def stream_question_from_db(question: str, filters=None):
+    """
+    Yields event dicts for one question: "metadata" (retrieved sources and
+    retrieval time) first, then "token" events as Claude generates, then
+    "done" with time-to-first-token and total latency. Failures end the
+    stream with an "error" event carrying the same message /ask returns.
+    """
+    start = time.perf_counter()
+    query_embedding, rows, packing, error = await _retrieve(question, filters)
+    if error:
+        yield {"type": "error", "message": error}
+        return
+
+    retrieval_ms = round((time.perf_counter() - start) * 1000, 1)
+    cached = answer_cache.lookup(query_embedding, rows) if ANSWER_CACHE_ENABLED else None
+    yield {
+        "type": "metadata",
+        "sources": [{"id": row["id"], "filepath": row["filepath"]} for row in rows],
+        "retrieval_ms": retrieval_ms,
+        "packing": packing,
+        "cached": cached is not None,
+    }
+
+    ttft_ms = None
+    parts = []
+    if cached is not None:
+        ttft_ms = round((time.perf_counter() - start) * 1000, 1)
+        parts.append(cached)
+        yield {"type": "token", "text": cached}
+    else:
+        events = ainvoke_model_stream(
+            modelId=CLAUDE_MODEL_ID,
+            body=_claude_body(build_context(rows), question),
+            contentType="application/json",
+            accept="application/json",
+        )
+        # the claude stage counts only time spent waiting on Bedrock, not on the client reading tokens
+        request_start = time.perf_counter()
+        claude_seconds = 0.0
+        try:
+            while True:
+                read_start = time.perf_counter()
+                try:
+                    event = await events.__anext__()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    claude_seconds += time.perf_counter() - read_start
+                if event.get("type") != "content_block_delta":
+                    continue
+                text = event.get("delta", {}).get("text", "")
+                if not text:
+                    continue
+                if ttft_ms is None:
+                    ttft_ms = round((time.perf_counter() - start) * 1000, 1)
+                    stage_seconds.observe(time.perf_counter() - request_start, stage="claude_ttft")
+                parts.append(text)
+                yield {"type": "token", "text": text}
+        except Exception:
+            logging.exception("Claude stream failed")
+            yield {"type": "error", "message": "❌ Claude model failed to respond."}
+            return
+        finally:
+            stage_seconds.observe(claude_seconds, stage="claude")
+            await events.aclose()
+        if ANSWER_CACHE_ENABLED and parts:
+            answer_cache.store(query_embedding, rows, "".join(parts))
 
+    total_ms = round((time.perf_counter() - start) * 1000, 1)
+    logging.info(f"/ask-stream retrieval={retrieval_ms}ms ttft={ttft_ms}ms total={total_ms}ms")
+    yield {"type": "done", "retrieval_ms": retrieval_ms, "ttft_ms": ttft_ms, "total_ms": total_ms}
@@ -0,0 +1,448 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from functools import partial
+from utils import metrics
+
+# === Rate Governor Config ===
+BEDROCK_GOVERNOR_ENABLED = os.getenv("BEDROCK_GOVERNOR_ENABLED", "true").lower() in ("1", "true", "yes")
+# Token bucket per model: "model-id=rps,other-model=rps"; models not listed use BEDROCK_DEFAULT_RPS (0 = no limit)
+BEDROCK_RATE_LIMITS = os.getenv("BEDROCK_RATE_LIMITS", "")
+BEDROCK_DEFAULT_RPS = float(os.getenv("BEDROCK_DEFAULT_RPS", "0"))
+# Bucket size as seconds of rate: 2 lets a quiet model burst 2s worth of calls
+BEDROCK_RATE_BURST_SECONDS = float(os.getenv("BEDROCK_RATE_BURST_SECONDS", "2"))
+# AIMD concurrency per model: starts at the max, halves on throttling, grows ~1 per window of successes
+BEDROCK_AIMD_MAX = int(os.getenv("BEDROCK_AIMD_MAX", os.getenv("BEDROCK_MAX_POOL_CONNECTIONS", "50")))
+BEDROCK_AIMD_MIN = int(os.getenv("BEDROCK_AIMD_MIN", "1"))
+BEDROCK_AIMD_BACKOFF = float(os.getenv("BEDROCK_AIMD_BACKOFF", "0.5"))
+# Total time a call may spend queued, retrying and backing off
+BEDROCK_CALL_DEADLINE = float(os.getenv("BEDROCK_CALL_DEADLINE", "30"))
+BEDROCK_RETRY_BASE = float(os.getenv("BEDROCK_RETRY_BASE", "0.25"))
+BEDROCK_RETRY_CAP = float(os.getenv("BEDROCK_RETRY_CAP", "8"))
+# Consecutive transient (non-throttle) failures that open the circuit, and how long it stays open
+BEDROCK_BREAKER_FAILURES = int(os.getenv("BEDROCK_BREAKER_FAILURES", "10"))
+BEDROCK_BREAKER_COOLDOWN = float(os.getenv("BEDROCK_BREAKER_COOLDOWN", "30"))
+
+THROTTLE_CODES = {"ThrottlingException", "TooManyRequestsException"}
+TRANSIENT_CODES = {
+    "ServiceUnavailableException", "InternalServerException", "ModelNotReadyException", "ModelTimeoutException",
+}
+# botocore network errors, matched by name so botocore is not imported here
+TRANSIENT_ERRORS = {"ReadTimeoutError", "ConnectTimeoutError", "EndpointConnectionError", "ConnectionClosedError"}
+
+throttles = metrics.register(metrics.Counter("bedrock_throttles_total", "Throttled Bedrock attempts by model"))
+retries = metrics.register(metrics.Counter("bedrock_retries_total", "Bedrock attempts retried by model and reason"))
+queue_wait = metrics.register(
+    metrics.Histogram("bedrock_queue_wait_seconds", "Time a call waited for a concurrency slot and rate token")
+)
+circuit_rejections = metrics.register(
+    metrics.Counter("bedrock_circuit_rejections_total", "Calls failed fast while a model's circuit was open")
+)
+
+
+class BedrockUnavailable(Exception):
+    """Raised without calling Bedrock: the circuit is open or the call deadline ran out while queued."""
+
+
+def classify(error) -> str:
+    """'throttle', 'transient' (retry, counts toward the breaker) or 'fatal' (raise now)."""
+    response = getattr(error, "response", None)
+    code = response.get("Error", {}).get("Code") if isinstance(response, dict) else None
+    if code in THROTTLE_CODES:
+        return "throttle"
+    if code in TRANSIENT_CODES or type(error).__name__ in TRANSIENT_ERRORS:
+        return "transient"
+    return "fatal"
+
+
+def _parse_limits(spec: str) -> dict:
+    limits = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        model_id, _, rps = part.rpartition("=")
+        try:
+            limits[model_id.strip()] = float(rps)
+        except ValueError:
+            logging.warning(f"Ignoring BEDROCK_RATE_LIMITS entry {part!r}")
+    return limits
+
+
+def _resolve(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+# === Per-model State ===
+class _ModelGovernor:
+    def __init__(self, model_id, rps):
+        self.model_id = model_id
+        self.cond = threading.Condition()
+        # token bucket
+        self.rps = rps
+        self.capacity = max(rps * BEDROCK_RATE_BURST_SECONDS, 1.0)
+        self.tokens = self.capacity
+        self.refilled = time.monotonic()
+        # AIMD
+        self.limit = float(BEDROCK_AIMD_MAX)
+        self.in_flight = 0
+        self._async_waiters = []  # (loop, future) of aacquire() callers
+        # bumped on every decrease; throttles of calls admitted before it don't decrease again
+        self.epoch = 0
+        # circuit breaker
+        self.failures = 0
+        self.open_until = 0.0
+        self.probing = None  # token of the half-open probe in flight
+        self.stats = {"calls": 0, "throttles": 0, "retries": 0, "rejected": 0, "wait_seconds": 0.0}
+
+    def _take_token(self, now) -> float:
+        """0 if a token was taken, else seconds until the next one. Caller holds cond."""
+        if self.rps <= 0:
+            return 0.0
+        self.tokens = min(self.capacity, self.tokens + (now - self.refilled) * self.rps)
+        self.refilled = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rps
+
+    def admit(self):
+        """
+        Circuit breaker check: raises while open, lets one probe through once
+        the cooldown is over. Returns the probe's token (None for a normal
+        call); pass it to abort_probe() when the call ends without a result.
+        """
+        with self.cond:
+            now = time.monotonic()
+            if not self.open_until:
+                return None
+            if self.open_until > now:
+                reason = f"circuit open for {self.open_until - now:.1f}s after repeated failures"
+            elif self.probing:
+                reason = "circuit half-open, probe in flight"
+            else:
+                self.probing = object()
+                return self.probing
+            self.stats["rejected"] += 1
+            circuit_rejections.inc(model=self.model_id)
+            raise BedrockUnavailable(f"Bedrock {self.model_id}: {reason}")
+
+    def _try_acquire(self, deadline):
+        """(epoch, 0) once a slot and a token are taken, else (None, seconds to wait). Caller holds cond."""
+        now = time.monotonic()
+        if self.in_flight < max(int(self.limit), BEDROCK_AIMD_MIN):
+            wait = self._take_token(now)
+            if wait == 0:
+                self.in_flight += 1
+                return self.epoch, 0
+        else:
+            wait = deadline - now
+        if now + wait > deadline:
+            raise BedrockUnavailable(f"Bedrock {self.model_id}: call deadline passed while queued")
+        return None, wait
+
+    def acquire(self, deadline) -> int:
+        """Blocks the calling thread for a concurrency slot under the AIMD limit and a rate token; returns the AIMD epoch."""
+        with self.cond:
+            while True:
+                epoch, wait = self._try_acquire(deadline)
+                if epoch is not None:
+                    return epoch
+                self.cond.wait(wait)
+
+    async def aacquire(self, deadline) -> int:
+        """acquire() that waits on the event loop, so queued calls hold no executor thread."""
+        loop = asyncio.get_running_loop()
+        while True:
+            with self.cond:
+                epoch, wait = self._try_acquire(deadline)
+                if epoch is not None:
+                    return epoch
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            try:
+                await asyncio.wait_for(waiter, wait)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                with self.cond:
+                    if (loop, waiter) in self._async_waiters:
+                        self._async_waiters.remove((loop, waiter))
+
+    def _wake(self):
+        # caller holds cond; every waiter re-checks, so waking all never loses a slot
+        self.cond.notify_all()
+        for loop, waiter in self._async_waiters:
+            try:
+                loop.call_soon_threadsafe(_resolve, waiter)
+            except RuntimeError:
+                pass  # that event loop is already closed
+        self._async_waiters.clear()
+
+    def release(self):
+        with self.cond:
+            self.in_flight -= 1
+            self._wake()
+
+    def abort_probe(self, probe):
+        """A probe that was cancelled or never got a slot recorded nothing; let the next call probe."""
+        if probe is None:
+            return
+        with self.cond:
+            if self.probing is probe:
+                self.probing = None
+
+    def on_success(self, increase=True):
+        """Bedrock answered. `increase` is off for client errors, which say nothing about capacity."""
+        with self.cond:
+            if increase:
+                self.limit = min(float(BEDROCK_AIMD_MAX), self.limit + 1.0 / max(self.limit, 1.0))
+            self.failures = 0
+            if self.open_until:
+                logging.info(f"Bedrock {self.model_id}: circuit closed")
+            self.open_until = 0.0
+            self.probing = None
+            self._wake()
+
+    def on_throttle(self, epoch):
+        with self.cond:
+            self.stats["throttles"] += 1
+            # one decrease per window: the other calls throttled by the same overload were admitted under the old limit
+            if epoch == self.epoch and self.limit > BEDROCK_AIMD_MIN:
+                self.limit = max(float(BEDROCK_AIMD_MIN), self.limit * BEDROCK_AIMD_BACKOFF)
+                self.epoch += 1
+                logging.warning(f"Bedrock {self.model_id} throttled; concurrency limit now {int(self.limit)}")
+            # the model is up, only busy: the next call may probe again
+            self.probing = None
+
+    def on_failure(self):
+        with self.cond:
+            self.failures += 1
+            if self.probing or self.failures >= BEDROCK_BREAKER_FAILURES:
+                self.open_until = time.monotonic() + BEDROCK_BREAKER_COOLDOWN
+                self.probing = None
+                logging.error(
+                    f"Bedrock {self.model_id}: circuit open for {BEDROCK_BREAKER_COOLDOWN}s "
+                    f"after {self.failures} consecutive failures"
+                )
+
+    def snapshot(self) -> dict:
+        with self.cond:
+            return {
+                **self.stats,
+                "wait_seconds": round(self.stats["wait_seconds"], 3),
+                "concurrency_limit": int(self.limit),
+                "in_flight": self.in_flight,
+                "rps": self.rps,
+                "circuit": "open" if self.open_until > time.monotonic() else ("half_open" if self.open_until else "closed"),
+            }
+
+
+# === Governor ===
+class RateGovernor:
+    """
+    Shared admission control for every Bedrock call (agents, call_claude,
+    Titan embeddings) in front of the client in utils/bedrock_client.py.
+    Per model: a token bucket caps the request rate, an AIMD limit caps
+    concurrency and halves when Bedrock throttles, throttled and transient
+    attempts are retried with full-jitter backoff until the call deadline,
+    and a circuit breaker fails fast after repeated transient failures.
+    Throttles thus slow callers down instead of surfacing as agent errors.
+    """
+
+    def __init__(self, limits=None, default_rps=BEDROCK_DEFAULT_RPS, deadline=BEDROCK_CALL_DEADLINE):
+        self.limits = _parse_limits(BEDROCK_RATE_LIMITS) if limits is None else limits
+        self.default_rps = default_rps
+        self.deadline = deadline
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def _model(self, model_id) -> _ModelGovernor:
+        state = self._models.get(model_id)
+        if state is None:
+            with self._lock:
+                state = self._models.setdefault(
+                    model_id, _ModelGovernor(model_id, self.limits.get(model_id, self.default_rps))
+                )
+        return state
+
+    def _admitted(self, state, model_id, queued):
+        waited = time.monotonic() - queued
+        queue_wait.observe(waited, model=model_id)
+        with state.cond:
+            state.stats["calls"] += 1
+            state.stats["wait_seconds"] += waited
+
+    def _record_failure(self, state, model_id, error, epoch) -> str:
+        """Feeds a failed attempt to AIMD and the breaker; returns its kind."""
+        kind = classify(error)
+        if kind == "fatal":
+            state.on_success(increase=False)
+        elif kind == "throttle":
+            throttles.inc(model=model_id)
+            state.on_throttle(epoch)
+        else:
+            state.on_failure()
+        return kind
+
+    def _backoff(self, state, model_id, error, epoch, attempt, deadline) -> float:
+        """Records a failed attempt; returns the retry delay or re-raises."""
+        state.release()
+        if self._record_failure(state, model_id, error, epoch) == "fatal":
+            raise error
+        backoff = random.uniform(0, min(BEDROCK_RETRY_CAP, BEDROCK_RETRY_BASE * 2 ** attempt))
+        if time.monotonic() + backoff >= deadline:
+            raise error
+        retries.inc(model=model_id, reason=kind)
+        with state.cond:
+            state.stats["retries"] += 1
+        return backoff
+
+    def run(self, model_id, fn, hold=False):
+        """
+        Calls fn() under the model's limits and retries it within the
+        deadline, waiting in the calling thread. With hold=True the
+        concurrency slot stays taken after a successful call (a response
+        stream still being read); the caller must call release(model_id).
+        """
+        state = self._model(model_id)
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            probe = state.admit()
+            try:
+                queued = time.monotonic()
+                epoch = state.acquire(deadline)
+                self._admitted(state, model_id, queued)
+                try:
+                    result = fn()
+                except Exception as e:
+                    attempt += 1
+                    delay = self._backoff(state, model_id, e, epoch, attempt, deadline)
+                else:
+                    state.on_success()
+                    if not hold:
+                        state.release()
+                    return result
+            finally:
+                # no-op once the attempt recorded a result
+                state.abort_probe(probe)
+            time.sleep(delay)
+
+    async def arun(self, model_id, afn, hold=False, discard=None):
+        """
+        run() for the event loop: queueing and backoff are awaited, so only
+        the attempt itself (`await afn()`, which offloads the Bedrock call)
+        takes an executor thread. A throttled model then cannot starve other
+        models of threads.
+
+        A caller cancelled mid-attempt cannot stop the thread, so the attempt
+        keeps its slot until it finishes; a held result nobody will read is
+        then passed to `discard`.
+        """
+        state = self._model(model_id)
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            probe = state.admit()
+            try:
+                queued = time.monotonic()
+                epoch = await state.aacquire(deadline)
+                self._admitted(state, model_id, queued)
+                task = asyncio.ensure_future(afn())
+                try:
+                    result = await asyncio.shield(task)
+                except asyncio.CancelledError:
+                    task.add_done_callback(partial(self._abandoned, state, model_id, epoch, probe, hold, discard))
+                    probe = None  # settled by _abandoned
+                    raise
+                except Exception as e:
+                    attempt += 1
+                    delay = self._backoff(state, model_id, e, epoch, attempt, deadline)
+                else:
+                    state.on_success()
+                    if not hold:
+                        state.release()
+                    return result
+            finally:
+                # no-op once the attempt recorded a result
+                state.abort_probe(probe)
+            await asyncio.sleep(delay)
+
+    def _abandoned(self, state, model_id, epoch, probe, hold, discard, task):
+        """Settles an attempt whose caller was cancelled, once its thread is done."""
+        try:
+            if task.cancelled():
+                return
+            error = task.exception()
+            if error is not None:
+                self._record_failure(state, model_id, error, epoch)
+                return
+            state.on_success()
+            if hold and discard is not None:
+                discard(task.result())
+        except Exception:
+            logging.exception(f"Bedrock {model_id}: cleanup of an abandoned call failed")
+        finally:
+            state.release()
+            state.abort_probe(probe)
+
+    def release(self, model_id):
+        self._model(model_id).release()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            models = list(self._models.values())
+        return {state.model_id: state.snapshot() for state in models}
+
+
+_governor = RateGovernor()
+
+
+def governed_call(model_id, fn, hold=False):
+    """fn() through the shared governor, or directly when BEDROCK_GOVERNOR_ENABLED is off."""
+    if not BEDROCK_GOVERNOR_ENABLED:
+        return fn()
+    return _governor.run(model_id, fn, hold=hold)
+
+
+async def agoverned_call(model_id, afn, hold=False, discard=None):
+    """
+    await afn() through the shared governor; admission and backoff wait on
+    the event loop. `discard` gets a held result whose caller was cancelled
+    before it arrived (see RateGovernor.arun).
+    """
+    if BEDROCK_GOVERNOR_ENABLED:
+        return await _governor.arun(model_id, afn, hold=hold, discard=discard)
+    task = asyncio.ensure_future(afn())
+    try:
+        return await asyncio.shield(task)
+    except asyncio.CancelledError:
+        if hold and discard is not None:
+            task.add_done_callback(lambda t: t.cancelled() or t.exception() or discard(t.result()))
+        raise
+
+
+def release(model_id):
+    if BEDROCK_GOVERNOR_ENABLED:
+        _governor.release(model_id)
+
+
+def get_governor_stats() -> dict:
+    return _governor.get_stats() if BEDROCK_GOVERNOR_ENABLED else {"enabled": False}
+
+
+def governor_metrics():
+    """Per-model concurrency limit and circuit state for /metrics."""
+    stats = get_governor_stats()
+    if stats.get("enabled") is False:
+        return {}
+    return {
+        ("bedrock_concurrency_limit", "gauge", "AIMD concurrency limit by model"): {
+            (("model", model_id),): s["concurrency_limit"] for model_id, s in stats.items()
+        },
+        ("bedrock_circuit_open", "gauge", "1 while a model's circuit breaker is open"): {
+            (("model", model_id),): int(s["circuit"] == "open") for model_id, s in stats.items()
+        },
+    }
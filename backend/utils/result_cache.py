@@ -0,0 +1,155 @@
+import os
+import copy
+import json
+import time
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# === Agent Result Cache Config ===
+AGENT_CACHE_ENABLED = os.getenv("AGENT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+AGENT_CACHE_TTL = float(os.getenv("AGENT_CACHE_TTL", "3600"))
+AGENT_CACHE_MAX_ENTRIES = int(os.getenv("AGENT_CACHE_MAX_ENTRIES", "5000"))
+
+
+def fingerprint(agent: str, model_id: str, prompt_version: str, summary, payload) -> str:
+    """
+    Stable key for one agent call: key order and whitespace in the payload do
+    not matter. `summary` is None for agents whose prompt ignores it; others
+    should build it from canonical JSON (utils.dispatch.transaction_summary).
+    """
+    canonical = json.dumps(
+        {"agent": agent, "model": model_id, "prompt": prompt_version, "summary": summary, "payload": payload},
+        sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _is_cacheable(result) -> bool:
+    # agents mark unparsable output with "raw" and Bedrock/parse failures with ERROR
+    return isinstance(result, dict) and "raw" not in result and result.get("updated_status") != "ERROR"
+
+
+# === Agent Result Cache ===
+class AgentResultCache:
+    """
+    Caches deterministic (temperature 0) agent results by fingerprint with a
+    TTL and LRU bound. Concurrent calls for the same fingerprint are
+    coalesced: the first caller runs the Bedrock call, later ones wait on
+    its Future, from threads or from the event loop alike. Error results
+    are handed to the waiters but never stored.
+    """
+
+    def __init__(self, ttl=AGENT_CACHE_TTL, max_entries=AGENT_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, result)
+        self._in_flight = {}           # key -> Future
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0, "expirations": 0}
+
+    def _claim(self, key):
+        """Returns ("hit", result), ("wait", future) or ("run", future)."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return "hit", copy.deepcopy(entry[1])
+                del self._entries[key]
+                self.stats["expirations"] += 1
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.stats["coalesced"] += 1
+                return "wait", future
+            self.stats["misses"] += 1
+            future = self._in_flight[key] = Future()
+            return "run", future
+
+    def _finish(self, key, future, result=None, error=None):
+        with self._lock:
+            self._in_flight.pop(key, None)
+            if error is None and _is_cacheable(result):
+                self._entries[key] = (time.time() + self.ttl, result)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.stats["evictions"] += 1
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def get_or_compute(self, key, compute):
+        state, value = self._claim(key)
+        if state == "hit":
+            return value
+        if state == "wait":
+            return copy.deepcopy(value.result())
+        try:
+            result = compute()
+        except BaseException as e:
+            self._finish(key, value, error=e)
+            raise
+        self._finish(key, value, result)
+        return copy.deepcopy(result)
+
+    async def aget_or_compute(self, key, acompute):
+        state, value = self._claim(key)
+        if state == "hit":
+            return value
+        if state == "wait":
+            return copy.deepcopy(await asyncio.wrap_future(value))
+        # shielded: a leader cancelled by its deadline or a client disconnect
+        # leaves the call running, so coalesced waiters still get the result
+        task = asyncio.ensure_future(self._arun(key, value, acompute))
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return copy.deepcopy(await asyncio.shield(task))
+
+    async def _arun(self, key, future, acompute):
+        try:
+            result = await acompute()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._entries)
+            stats["in_flight"] = len(self._in_flight)
+        lookups = stats["hits"] + stats["misses"] + stats["coalesced"]
+        stats["hit_rate"] = round((stats["hits"] + stats["coalesced"]) / lookups, 3) if lookups else 0.0
+        return stats
+
+
+agent_cache = AgentResultCache()
+
+
+# === Agent Helpers ===
+def cached_call(agent, model_id, prompt_version, summary, payload, compute):
+    if not AGENT_CACHE_ENABLED:
+        return compute()
+    key = fingerprint(agent, model_id, prompt_version, summary, payload)
+    return agent_cache.get_or_compute(key, compute)
+
+
+async def acached_call(agent, model_id, prompt_version, summary, payload, acompute):
+    if not AGENT_CACHE_ENABLED:
+        return await acompute()
+    key = fingerprint(agent, model_id, prompt_version, summary, payload)
+    return await agent_cache.aget_or_compute(key, acompute)
+
+
+def get_cache_stats() -> dict:
+    return agent_cache.get_stats() if AGENT_CACHE_ENABLED else {"enabled": False}
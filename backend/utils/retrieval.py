@@ -0,0 +1,142 @@
+import os
+import asyncio
+import logging
+from utils.pg import fetch_prepared
+from utils.lexical import FILTER_SQL, PgLexicalSearch, LocalBM25, normalize_filters, matches_filters
+
+# === Retriever Config ===
+# pgvector | local | hybrid (pgvector + full-text) | hybrid_local (local index + BM25)
+RETRIEVER_BACKEND = os.getenv("RETRIEVER_BACKEND", "pgvector").lower()
+# Reciprocal rank fusion constant; larger values flatten the rank weighting
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+# Each side of a hybrid search fetches limit * this many candidates
+HYBRID_FETCH_MULTIPLIER = int(os.getenv("HYBRID_FETCH_MULTIPLIER", "2"))
+
+SIMILARITY_SQL = (
+    "SELECT id, filepath, content, content_hash FROM GrabData "
+    "ORDER BY embedding <=> $1::vector LIMIT $2"
+)
+# Same ranking, plus the stored vectors for reranking (utils/context_packer.py)
+SIMILARITY_WITH_EMBEDDINGS_SQL = (
+    "SELECT id, filepath, content, content_hash, embedding FROM GrabData "
+    "ORDER BY embedding <=> $1::vector LIMIT $2"
+)
+# With metadata filters ($3 file types, $4 minimum file mtime)
+SIMILARITY_FILTERED_SQL = (
+    "SELECT id, filepath, content, content_hash{embedding} FROM GrabData "
+    f"WHERE {FILTER_SQL} ORDER BY embedding <=> $1::vector LIMIT $2"
+)
+
+
+# === Retriever Interface ===
+class Retriever:
+    """
+    Returns the `limit` chunks closest to a query embedding. Each row
+    supports row['id'], row['filepath'], row['content'] and
+    row['content_hash'], plus row['embedding'] when with_embeddings=True.
+    `query_text` is used by lexical/hybrid retrievers; `filters` takes
+    {"file_types": [...], "modified_after": date} (see utils/lexical.py).
+    """
+    name = "base"
+
+    async def search(self, query_embedding, limit=15, with_embeddings=False, query_text=None, filters=None) -> list:
+        raise NotImplementedError
+
+
+class PgVectorRetriever(Retriever):
+    name = "pgvector"
+
+    def __init__(self, settings=None):
+        # per-query overrides, e.g. {"ivfflat.probes": 20}; pool defaults otherwise
+        self.settings = settings
+
+    async def search(self, query_embedding, limit=15, with_embeddings=False, query_text=None, filters=None) -> list:
+        # the pool's vector codec sends the embedding in pgvector's binary format
+        if filters:
+            filters = normalize_filters(filters)
+            sql = SIMILARITY_FILTERED_SQL.format(embedding=", embedding" if with_embeddings else "")
+            return await fetch_prepared(
+                sql, query_embedding, limit, filters["file_types"], filters["modified_after"], settings=self.settings
+            )
+        sql = SIMILARITY_WITH_EMBEDDINGS_SQL if with_embeddings else SIMILARITY_SQL
+        return await fetch_prepared(sql, query_embedding, limit, settings=self.settings)
+
+
+class LocalIndexRetriever(Retriever):
+    """In-process search over utils/local_index.py; needs no database."""
+    name = "local"
+
+    def __init__(self, index=None):
+        from utils.local_index import get_local_index
+        self.index = index or get_local_index()
+
+    async def search(self, query_embedding, limit=15, with_embeddings=False, query_text=None, filters=None) -> list:
+        if not filters:
+            return self.index.search(query_embedding, limit, with_embeddings=with_embeddings)
+        # post-filter an over-fetched result; only file_types applies locally
+        filters = normalize_filters(filters)
+        rows = self.index.search(query_embedding, limit * 4, with_embeddings=with_embeddings)
+        return [row for row in rows if matches_filters(row, filters)][:limit]
+
+
+# === Hybrid Retrieval ===
+def rrf_fuse(result_lists, limit, k=HYBRID_RRF_K) -> list:
+    """Reciprocal rank fusion: score(row) = sum over lists of 1 / (k + rank)."""
+    scores, rows = {}, {}
+    for results in result_lists:
+        for rank, row in enumerate(results, start=1):
+            key = row["id"]
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            # keep the copy that carries an embedding, if either does
+            if key not in rows or "embedding" not in rows[key]:
+                rows[key] = row
+    ranked = sorted(scores, key=lambda key: -scores[key])[:limit]
+    return [rows[key] for key in ranked]
+
+
+class HybridRetriever(Retriever):
+    """
+    Runs vector and lexical search concurrently and fuses them with RRF,
+    so exact identifiers (transaction ids, gateway names, error codes) that
+    embeddings blur still surface. Without query text it is plain vector
+    search.
+    """
+
+    def __init__(self, vector=None, lexical=None, name="hybrid"):
+        self.vector = vector or PgVectorRetriever()
+        self.lexical = lexical or PgLexicalSearch()
+        self.name = name
+
+    async def search(self, query_embedding, limit=15, with_embeddings=False, query_text=None, filters=None) -> list:
+        if not query_text:
+            return await self.vector.search(query_embedding, limit, with_embeddings, filters=filters)
+        fetch = limit * HYBRID_FETCH_MULTIPLIER
+        vector_rows, lexical_rows = await asyncio.gather(
+            self.vector.search(query_embedding, fetch, with_embeddings, filters=filters),
+            self.lexical.search(query_text, fetch, filters, with_embeddings),
+        )
+        return rrf_fuse([vector_rows, lexical_rows], limit)
+
+
+def _local_hybrid():
+    vector = LocalIndexRetriever()
+    return HybridRetriever(vector, LocalBM25(vector.index), name="hybrid_local")
+
+
+_RETRIEVERS = {
+    "pgvector": PgVectorRetriever,
+    "local": LocalIndexRetriever,
+    "hybrid": HybridRetriever,
+    "hybrid_local": _local_hybrid,
+}
+_retriever = None
+
+
+def get_retriever() -> Retriever:
+    global _retriever
+    if _retriever is None:
+        if RETRIEVER_BACKEND not in _RETRIEVERS:
+            logging.warning(f"Unknown RETRIEVER_BACKEND={RETRIEVER_BACKEND}; using pgvector")
+        _retriever = _RETRIEVERS.get(RETRIEVER_BACKEND, PgVectorRetriever)()
+        logging.info(f"Retriever backend: {_retriever.name}")
+    return _retriever
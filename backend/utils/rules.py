@@ -0,0 +1,206 @@
+import os
+import re
+import json
+import logging
+import threading
+
+# === Rule Engine Config ===
+AGENT_RULES_ENABLED = os.getenv("AGENT_RULES_ENABLED", "true").lower() in ("1", "true", "yes")
+# Optional JSON file with a list of rules replacing DEFAULT_RULES
+AGENT_RULES_PATH = os.getenv("AGENT_RULES_PATH", "")
+# Rules below this confidence never short-circuit the LLM
+AGENT_RULES_MIN_CONFIDENCE = float(os.getenv("AGENT_RULES_MIN_CONFIDENCE", "0.9"))
+
+FRAUD_SIGNALS = [
+    r"\bstolen\b", r"\bblacklist(ed)?\b", r"\bfraud(ulent)?\b", r"\bsuspicious\b", r"\bchargebacks?\b",
+    r"\bdeclined attempts\b", r"\bcard testing\b", r"\bflagged\b",
+]
+HEALING_SIGNALS = [
+    r"\bserver (is )?down\b", r"\bserver error\b", r"\b(timeout|timed out)\b", r"\bgateway (error|down|unavailable)\b",
+    r"\boutage\b", r"\b5\d\d\b", r"\bconnection (refused|reset)\b", r"\bnetwork\b",
+]
+# Hedged, contradicting or negated signals are left to the LLM
+AMBIGUOUS_SIGNALS = [
+    r"\bbut\b", r"\bpossible\b", r"\bmaybe\b", r"\bconfirmed\b", r"\bunclear\b",
+    r"\bno\b", r"\bnot\b", r"\bwithout\b", r"\bnever\b", r"n't\b",
+]
+EMPTY_SIGNALS = [r"^\s*(none|ok|n/?a)?\s*$"]
+
+# First matching rule wins. Every pattern is a case-insensitive regex over
+# metadata.error_detection_signal; "all" must all match, "any" needs one,
+# "none" must not match. "status" and the amount bounds are optional.
+DEFAULT_RULES = [
+    {
+        "name": "healing_and_fraud_signal", "decision": "healing_and_fraud", "confidence": 0.95,
+        "all": ["|".join(HEALING_SIGNALS), "|".join(FRAUD_SIGNALS)], "none": AMBIGUOUS_SIGNALS,
+        "resolution": "Run healing and fraud agents",
+    },
+    {
+        "name": "fraud_signal", "decision": "fraud", "confidence": 0.95,
+        "any": FRAUD_SIGNALS, "none": AMBIGUOUS_SIGNALS,
+        "resolution": "Hold the transaction and send it for fraud review",
+    },
+    {
+        "name": "healing_signal", "decision": "healing", "confidence": 0.95,
+        "any": HEALING_SIGNALS, "none": AMBIGUOUS_SIGNALS + FRAUD_SIGNALS,
+        "resolution": "Retry through a failover route once the upstream recovers",
+    },
+    {
+        "name": "clean_success", "decision": "approved", "confidence": 0.95,
+        "status": ["SUCCEEDED"], "any": EMPTY_SIGNALS,
+        "resolution": "No action needed",
+    },
+]
+
+
+def _compile(patterns):
+    return [re.compile(p, re.IGNORECASE) for p in patterns or []]
+
+
+class Rule:
+    def __init__(self, spec: dict):
+        self.name = spec["name"]
+        self.decision = spec["decision"]
+        self.confidence = float(spec.get("confidence", 1.0))
+        self.resolution = spec.get("resolution", "")
+        self.status = {s.upper() for s in spec.get("status", [])}
+        self.min_amount = spec.get("min_amount")
+        self.max_amount = spec.get("max_amount")
+        self.all = _compile(spec.get("all"))
+        self.any = _compile(spec.get("any"))
+        self.none = _compile(spec.get("none"))
+
+    def matches(self, status: str, signal: str, amount) -> bool:
+        if self.status and status not in self.status:
+            return False
+        if self.min_amount is not None and (amount is None or amount < self.min_amount):
+            return False
+        if self.max_amount is not None and (amount is None or amount > self.max_amount):
+            return False
+        if any(p.search(signal) for p in self.none):
+            return False
+        if not all(p.search(signal) for p in self.all):
+            return False
+        return not self.any or any(p.search(signal) for p in self.any)
+
+
+def _signal_fields(payload):
+    if not isinstance(payload, dict):
+        return None
+    metadata = payload.get("metadata")
+    signal = metadata.get("error_detection_signal") if isinstance(metadata, dict) else None
+    if signal is None:
+        return None
+    try:
+        amount = float(payload.get("amount"))
+    except (TypeError, ValueError):
+        amount = None
+    return str(payload.get("status", "")).upper(), str(signal), amount
+
+
+# === Rule Engine ===
+class RuleEngine:
+    """
+    Precompiled rules over a transaction's status, amount and
+    metadata.error_detection_signal. A confident match answers triage,
+    fraud and healing requests without calling Bedrock; anything else falls
+    through to the LLM. Per-rule hit counters show how much traffic the
+    fast path takes off the model.
+    """
+
+    def __init__(self, specs=None, min_confidence=AGENT_RULES_MIN_CONFIDENCE):
+        self.rules = [Rule(spec) for spec in (specs or DEFAULT_RULES)]
+        self.min_confidence = min_confidence
+        self._lock = threading.Lock()
+        self.stats = {"evaluated": 0, "fallthrough": 0, "rules": {rule.name: 0 for rule in self.rules}}
+
+    def match(self, payload, decisions=None):
+        """
+        Returns (rule, signal) for the first confident matching rule, else
+        (None, None). A match whose decision is not in `decisions` cannot
+        answer the calling agent and counts as a fallthrough.
+        """
+        fields = _signal_fields(payload)
+        rule = None
+        if fields is not None:
+            rule = next(
+                (r for r in self.rules if r.confidence >= self.min_confidence and r.matches(*fields)), None
+            )
+            if rule is not None and decisions is not None and rule.decision not in decisions:
+                rule = None
+        with self._lock:
+            self.stats["evaluated"] += 1
+            if rule is None:
+                self.stats["fallthrough"] += 1
+            else:
+                self.stats["rules"][rule.name] += 1
+        return (rule, fields[1]) if rule else (None, None)
+
+    def triage(self, payload):
+        rule, signal = self.match(payload)
+        if rule is None:
+            return None
+        return {
+            "triage_decision": rule.decision,
+            "reason": f"Matched rule '{rule.name}' on signal: {signal}",
+            "suggested_resolution": rule.resolution,
+            "source": "rule",
+            "rule": rule.name,
+        }
+
+    def fraud(self, payload):
+        # a healing-only rule says nothing about fraud; let the LLM decide
+        rule, signal = self.match(payload, ("fraud", "healing_and_fraud", "approved"))
+        if rule is None:
+            return None
+        fraud = rule.decision != "approved"
+        return {
+            "fraud_detected": fraud,
+            "fraud_result": "fraud" if fraud else "not_fraud",
+            "reason": f"Matched rule '{rule.name}' on signal: {signal}",
+            "resolution": "Fraud detected" if fraud else "No fraud detected",
+            "updated_status": "FRAUD" if fraud else "CLEAN",
+            "agent": "Fraud Agent running",
+            "source": "rule",
+            "rule": rule.name,
+        }
+
+    def healing(self, payload):
+        rule, signal = self.match(payload, ("healing", "healing_and_fraud", "approved"))
+        if rule is None:
+            return None
+        healing = rule.decision != "approved"
+        return {
+            "healing_needed": healing,
+            "recommended_action": rule.resolution,
+            "resolution": f"Recommended action: {rule.resolution}",
+            "updated_status": "PENDING_REVIEW" if healing else "NO_ACTION",
+            "agent": "Healing Agent running",
+            "source": "rule",
+            "rule": rule.name,
+        }
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = {**self.stats, "rules": dict(self.stats["rules"])}
+        hits = stats["evaluated"] - stats["fallthrough"]
+        stats["hit_rate"] = round(hits / stats["evaluated"], 3) if stats["evaluated"] else 0.0
+        return stats
+
+
+def _load_rules():
+    if not AGENT_RULES_PATH:
+        return None
+    try:
+        with open(AGENT_RULES_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        logging.error(f"Could not load AGENT_RULES_PATH={AGENT_RULES_PATH}: {e}; using default rules")
+        return None
+
+
+rule_engine = RuleEngine(_load_rules())
+
+
+def get_rule_stats() -> dict:
+    return rule_engine.get_stats() if AGENT_RULES_ENABLED else {"enabled": False}
@@ -0,0 +1,55 @@
+import os
+import time
+import logging
+import threading
+
+# === Warm-up Config ===
+# Build the Bedrock client, agents and retriever during startup instead of on
+# the first request. Off = faster process start, slower first request.
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+
+_stats_lock = threading.Lock()
+_stats = {"enabled": WARMUP_ON_STARTUP, "warmed": False, "steps_ms": {}, "total_ms": 0.0}
+
+
+def _steps():
+    from utils.bedrock_client import get_bedrock_client
+    from utils.retrieval import get_retriever
+    from src.TriageAgent import get_triage_agent
+    from src.FraudAgent import get_fraud_detector
+    from src.HealingAgent import get_healing_agent
+
+    return [
+        # imports boto3 and loads the bedrock-runtime service model
+        ("bedrock_client", get_bedrock_client),
+        ("agents", lambda: (get_triage_agent(), get_fraud_detector(), get_healing_agent())),
+        # with RETRIEVER_BACKEND=local this memory-maps the index
+        ("retriever", get_retriever),
+    ]
+
+
+def warm_up() -> dict:
+    """
+    Builds everything the first request would otherwise pay for and returns
+    per-step timings. Blocking; call it off the event loop. A failing step
+    is logged and skipped, the first request then retries it lazily.
+    """
+    started = time.perf_counter()
+    steps = {}
+    for name, step in _steps():
+        step_started = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            logging.error(f"Warm-up step {name} failed: {e}")
+        steps[name] = round((time.perf_counter() - step_started) * 1000, 1)
+    total = round((time.perf_counter() - started) * 1000, 1)
+    with _stats_lock:
+        _stats.update(warmed=True, steps_ms=steps, total_ms=total)
+    logging.info(f"Warm-up done in {total}ms: {steps}")
+    return steps
+
+
+def get_startup_stats() -> dict:
+    with _stats_lock:
+        return {**_stats, "steps_ms": dict(_stats["steps_ms"])}
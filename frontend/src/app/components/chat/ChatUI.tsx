@@ -14,7 +14,7 @@ export default function ChatUI() {
   const [loading, setLoading] = useState(false);
   const [showButtons, setShowButtons] = useState(false);
 
-  const { messages, addMessage, reset } = useChatStore();
+  const { messages, addMessage, appendToLast, reset } = useChatStore();
   const scrollRef = useRef<HTMLDivElement>(null);
 
   useEffect(() => {
@@ -75,8 +75,39 @@ const handleChatSend = async () => {
     }
   } else {
     try {
-      const res = await axios.post("http://localhost:8080/ask", { question: chatInput });
-      addMessage({ type: "bot", text: res.data.response });
+      // Stream the answer: SSE events are metadata, token..., then done or error
+      const res = await fetch("http://localhost:8080/ask-stream", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ question: chatInput }),
+      });
+      if (!res.ok || !res.body) throw new Error("Backend error");
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffered = "";
+      let started = false;
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffered += decoder.decode(value, { stream: true });
+        const events = buffered.split("\n\n");
+        buffered = events.pop() || "";
+        for (const raw of events) {
+          const dataLine = raw.split("\n").find((line) => line.startsWith("data: "));
+          if (!dataLine) continue;
+          const event = JSON.parse(dataLine.slice(6));
+          if (event.type === "token") {
+            if (!started) {
+              started = true;
+              setLoading(false);
+              addMessage({ type: "bot", text: "" });
+            }
+            appendToLast(event.text);
+          } else if (event.type === "error") {
+            addMessage({ type: "bot", text: event.message });
+          }
+        }
+      }
     } catch (err) {
       addMessage({ type: "bot", text: "❌ Something went wrong." });
     } finally {
@@ -15,27 +15,31 @@ export default function GTADashboardPage() {
     setError(null);
     setTriageResponses({});
     try {
-      // Run triage for all incidents sequentially with 1s delay between requests
-      const responseMap = {};
-      for (let i = 0; i < IncidentData.length; i++) {
-        const incident = IncidentData[i];
-        try {
-          const res = await fetch('http://localhost:8080/run-triage', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify(incident),
-          });
-          const data = await res.json();
-          responseMap[incident.transaction_id || i] = data;
-        } catch (e) {
-          responseMap[incident.transaction_id || i] = { error: 'Failed to connect to backend.' };
-        }
-        // Wait 1s before next request (rate limit)
-        if (i < IncidentData.length - 1) {
-          await new Promise(res => setTimeout(res, 1000));
+      // Triage all incidents in one request; results stream back as NDJSON as each one finishes
+      const res = await fetch('http://localhost:8080/run-triage-batch', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(IncidentData),
+      });
+      if (!res.ok || !res.body) throw new Error('Backend error');
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffered = '';
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffered += decoder.decode(value, { stream: true });
+        const lines = buffered.split('\n');
+        buffered = lines.pop();
+        for (const line of lines) {
+          if (!line.trim()) continue;
+          const record = JSON.parse(line);
+          if (record.done) continue;
+          const key = record.transaction_id || record.index;
+          const data = record.error ? { error: record.error } : record.result;
+          setTriageResponses(prev => ({ ...prev, [key]: data }));
         }
       }
-      setTriageResponses(responseMap);
     } catch (e) {
       setError('Failed to run triage for all incidents.');
     } finally {
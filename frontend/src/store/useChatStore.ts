@@ -5,11 +5,19 @@ type Message = { type: "user" | "bot"; text: string };
 interface ChatStore {
   messages: Message[];
   addMessage: (msg: Message) => void;
+  appendToLast: (text: string) => void;
   reset: () => void;
 }
 
 export const useChatStore = create<ChatStore>((set) => ({
   messages: [],
   addMessage: (msg) => set((state) => ({ messages: [...state.messages, msg] })),
+  appendToLast: (text) =>
+    set((state) => {
+      const messages = [...state.messages];
+      const last = messages[messages.length - 1];
+      if (last) messages[messages.length - 1] = { ...last, text: last.text + text };
+      return { messages };
+    }),
   reset: () => set({ messages: [] }),
 }));
\ No newline at end of file